@@ -0,0 +1,17 @@
+"""Macro model of the LUSD / LQTY economy
+
+    from macroModel import SimulationConfig, run
+    result = run(SimulationConfig(n_sim=2000))
+    result.data  # one row per simulated hour
+
+Figures live in macroModel.reporting and HTML reports in macroModel.report;
+plotly and matplotlib are only imported by those two.
+"""
+
+from .macro_model import SimulationConfig, SimulationResult, Simulation, run, run_lockstep, exogenous_paths
+from .policies import FeePolicy, FixedFee, BaseRate
+from .troves import TroveStore
+from .stability import DepositorPool
+from .recorder import StepRecorder
+from .checkpoint import save_checkpoint, load_checkpoint, resume
+from .profiler import PhaseProfiler
@@ -0,0 +1,219 @@
+"""Command line entry point: python -m macroModel [command]"""
+
+import argparse
+import os
+
+from .macro_model import SimulationConfig, run_lockstep, time_steps
+from .policies import FixedFee, BaseRate
+
+
+def compare(args):
+  [result, result2] = run_lockstep(SimulationConfig(n_sim=args.n_sim), [FixedFee(), BaseRate()])
+  print(result.data.describe())
+  print(result2.data.describe())
+
+  if not args.no_report:
+    from . import reporting
+    reporting.exhibit(result)
+    reporting.exhibit_troves(result)
+    reporting.exhibit_comparison(result, result2)
+    reporting.exhibit_troves(result2)
+
+
+def single(args):
+  profiler = None
+  if args.profile or args.trace:
+    from .profiler import PhaseProfiler
+    profiler = PhaseProfiler(allocations=args.profile_allocations)
+  if args.resume:
+    from .checkpoint import resume
+    result = resume(args.resume, checkpoint_every=args.checkpoint_every, profiler=profiler)
+  else:
+    from .macro_model import run
+    from .sink import formats
+    options = dict(n_sim=args.n_sim, fee_policy=args.fee_policy, seed=args.seed, initial_troves=args.initial_troves,
+                   price_scenario=args.price_scenario, price_history=args.price_history, history_start=args.history_start,
+                   time_step=args.time_step)
+    if args.trove_snapshot:
+      #at the ether price, base rate and LQTY price of the snapshot
+      from .snapshot import snapshot_config
+      config = snapshot_config(args.trove_snapshot, **options)
+    else:
+      config = SimulationConfig(**options)
+    out = args.out if args.out and args.out.endswith(tuple(formats)) else None
+    result = run(config, checkpoint_every=args.checkpoint_every, checkpoint_path=args.checkpoint, out=out, profiler=profiler,
+                 precision=args.precision, spill=args.spill, drop_derived=args.drop_derived)
+  if profiler is not None:
+    print(profiler.summary().to_string(float_format="{:.2f}".format))
+    if args.trace:
+      profiler.write_trace(args.trace)
+  if result.data is None:
+    return
+  if args.out:
+    result.data.to_csv(args.out, index_label="step")
+  else:
+    print(result.data.describe())
+
+
+def ensemble(args):
+  from .ensemble import run_ensemble
+  config = SimulationConfig(n_sim=args.n_sim, fee_policy=args.fee_policy)
+  result = run_ensemble(config, n_runs=args.runs, seed=args.seed, workers=args.workers)
+  frame = result.quantiles()
+  if args.save:
+    result.save(args.save)
+  if args.out:
+    frame.to_csv(args.out, index_label="step")
+  else:
+    print(frame.iloc[::month_steps(args.n_sim)])
+
+
+def sweep(args):
+  from .sweep import grid, parse_value, run_sweep
+  base = SimulationConfig(n_sim=args.n_sim)
+  params = {}
+  for spec in args.param:
+    name, _, values = spec.partition("=")
+    params[name] = [parse_value(base, name, value) for value in values.split(",")]
+  frame = run_sweep(grid(**params), base=base, workers=args.workers, cache_dir=args.cache_dir)
+  if args.out:
+    frame.to_csv(args.out, index=False)
+  else:
+    print(frame.to_string())
+
+
+def report(args):
+  from .report import write_report
+  write_report(args.run, args.out, compare=args.compare, n_out=args.max_points, workers=args.workers)
+
+
+def bench(args):
+  import pandas as pd
+  from . import benchmark
+  baseline = args.baseline or benchmark.baseline_path
+  names = args.sizes.split(",") if args.sizes else None
+  results = benchmark.run_benchmarks(names)
+  if args.save_baseline:
+    benchmark.save_baseline(results, baseline)
+  frame = pd.DataFrame(results).T[["troves", "steps", "troves_final", "setup_s", "steps_per_sec", "peak_rss_mb"]]
+  print(frame.to_string())
+  if args.save_baseline or not os.path.exists(baseline):
+    return
+  report = benchmark.compare(results, benchmark.load_baseline(baseline))
+  print(report.to_string(float_format="{:.3f}".format))
+  if report["regression"].any():
+    raise SystemExit("performance regression against " + baseline)
+
+
+def history(args):
+  from .history import convert
+  prices = convert(args.csv, args.out, interval=args.interval, time_column=args.time_column, price_column=args.price_column)
+  print(f"{len(prices)} prices every {prices.interval}s from {prices.start} to {prices.end} (unix seconds) in {args.out}")
+
+
+def surrogate(args):
+  import pandas as pd
+  from .surrogate import train_on_sweeps, train_on_ensembles
+  targets = args.targets.split(",") if args.targets else None
+  if args.ensembles:
+    model = train_on_ensembles(args.ensembles, targets)
+  else:
+    model = train_on_sweeps(args.cache_dir, targets)
+  print(f"features: {', '.join(model.numeric + list(model.categorical)) or 'none'}")
+  print(pd.DataFrame.from_dict(model.validation, orient="index").to_string())
+  model.save(args.out)
+
+
+def month_steps(n_sim):
+  from .macro_model import month
+  return max(1, min(month, n_sim // 12))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m macroModel")
+  parser.add_argument("--n-sim", type=int, default=SimulationConfig.n_sim, help="number of hourly steps")
+  parser.set_defaults(command=compare, no_report=False)
+  commands = parser.add_subparsers()
+
+  command = commands.add_parser("compare", help="simulate the baseline fixed fee and the base rate policy and plot both runs (default)")
+  command.add_argument("--no-report", action="store_true", help="only print summary statistics")
+  command.set_defaults(command=compare)
+
+  command = commands.add_parser("run", help="a single run, optionally checkpointed or resumed from a checkpoint")
+  command.add_argument("--seed", type=int, default=0)
+  command.add_argument("--fee-policy", default="fixed")
+  command.add_argument("--initial-troves", type=int, default=0, metavar="N", help="start from a steady-state population of N troves")
+  command.add_argument("--price-scenario", default="", metavar="NAME|PATH",
+                       help="ether price regimes: a scenario of macroModel.scenarios or a .json/.yaml file")
+  command.add_argument("--trove-snapshot", default="", metavar="PATH",
+                       help="start from the troves, ether price and pools of a snapshot of the deployed system")
+  command.add_argument("--price-history", default="", metavar="PATH", help="replay ether prices converted with the history command")
+  command.add_argument("--history-start", default="", metavar="DATE", help="first replayed date (default: start of the history)")
+  command.add_argument("--time-step", choices=time_steps, default="hourly",
+                       help="adaptive skips the trove checks while no trove can cross a threshold and liquidates "
+                            "along minute substeps of large price moves")
+  command.add_argument("--checkpoint", default="macroModel.ckpt.npz", help="checkpoint file (default: %(default)s)")
+  command.add_argument("--checkpoint-every", type=int, default=None, metavar="K", help="save a checkpoint every K steps")
+  command.add_argument("--resume", metavar="CHECKPOINT", help="continue the run saved in this checkpoint")
+  command.add_argument("--out", help="write the recorded steps to this CSV file instead of summarizing them; "
+                                     ".parquet and .arrow files are streamed while the run goes on")
+  command.add_argument("--precision", choices=("float64", "float32"), default="float64", help="of the recorded float metrics")
+  command.add_argument("--spill", metavar="DIR", help="move recorded steps to raw files in DIR one row group at a time")
+  command.add_argument("--drop-derived", action="store_true", help="do not record Price_Ether and MC_LQTY, which can be recomputed")
+  command.add_argument("--profile", action="store_true", help="time every phase of every step and print a summary")
+  command.add_argument("--profile-allocations", action="store_true", help="also track memory allocated per phase (slow)")
+  command.add_argument("--trace", metavar="PATH", help="write the per-step phase timings as a Chrome trace (implies --profile)")
+  command.set_defaults(command=single)
+
+  command = commands.add_parser("ensemble", help="per-step quantiles over many independently seeded runs")
+  command.add_argument("--runs", type=int, default=100, help="number of trajectories")
+  command.add_argument("--seed", type=int, default=0, help="seed of the first trajectory")
+  command.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+  command.add_argument("--fee-policy", default="fixed")
+  command.add_argument("--out", help="write the quantiles to this CSV file instead of printing them")
+  command.add_argument("--save", metavar="PATH", help="also store the sketches in this .npz file, e.g. for the surrogate")
+  command.set_defaults(command=ensemble)
+
+  command = commands.add_parser("sweep", help="run a parameter grid, reusing cached runs")
+  command.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2,...",
+                       help="SimulationConfig field and the values to sweep; repeat for a grid")
+  command.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+  command.add_argument("--cache-dir", default=None, help="result cache directory (default: ~/.cache/macroModel)")
+  command.add_argument("--out", help="write the summaries to this CSV file instead of printing them")
+  command.set_defaults(command=sweep)
+
+  command = commands.add_parser("report", help="render a stored run into a self-contained, downsampled HTML report")
+  command.add_argument("run", help="recorded steps: .csv, .parquet, .arrow or a sweep series .npz")
+  command.add_argument("--compare", help="a second run drawn dotted on the same figures")
+  command.add_argument("--out", default="report.html", help="output file (default: %(default)s)")
+  command.add_argument("--max-points", type=int, default=1000, help="points per series after downsampling")
+  command.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+  command.set_defaults(command=report)
+
+  command = commands.add_parser("bench", help="fixed-seed benchmarks at 1k to 1M troves, compared with a stored baseline")
+  command.add_argument("--sizes", help="comma separated scenarios out of 1k,10k,100k,1M (default: all)")
+  command.add_argument("--baseline", default=None, help="baseline file (default: macroModel/benchmark_baseline.json)")
+  command.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+  command.set_defaults(command=bench)
+
+  command = commands.add_parser("history", help="convert a CSV of ether prices into a memory-mappable replay file")
+  command.add_argument("csv", help="rows of timestamp (unix s or ms, or a date) and price")
+  command.add_argument("out", help="output .npy file; its metadata goes to OUT.json")
+  command.add_argument("--interval", type=int, default=60, help="grid interval in seconds (default: %(default)s)")
+  command.add_argument("--time-column", default=0, type=lambda v: int(v) if v.isdigit() else v, help="name or index")
+  command.add_argument("--price-column", default=1, type=lambda v: int(v) if v.isdigit() else v, help="name or index")
+  command.set_defaults(command=history)
+
+  command = commands.add_parser("surrogate", help="train a fast emulator on cached sweep runs or saved ensembles")
+  command.add_argument("ensembles", nargs="*", help="ensembles saved with `ensemble --save` (default: the sweep cache)")
+  command.add_argument("--cache-dir", default=None, help="sweep cache directory (default: ~/.cache/macroModel)")
+  command.add_argument("--targets", help="comma separated summary metrics (default: all)")
+  command.add_argument("--out", default="surrogate.npz", help="output file (default: %(default)s)")
+  command.set_defaults(command=surrogate)
+
+  args = parser.parse_args(argv)
+  args.command(args)
+
+
+if __name__ == "__main__":
+  main()
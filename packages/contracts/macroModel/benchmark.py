@@ -0,0 +1,99 @@
+"""Benchmarks
+
+Fixed-seed scenarios of the macro model at 1k, 10k, 100k and 1M troves, each
+run for a fixed number of steps in a fresh process so that peak memory is
+measured per scenario. A benchmark reports steps per second, the peak
+resident set size and the time per step of every phase, and compare() checks
+them against a stored baseline with relative thresholds. Only steps per
+second and peak memory gate a run: time that moves from one phase to another
+is reported, and a phase is flagged only as the cause of a slower step.
+
+    python -m macroModel bench                  # compare with benchmark_baseline.json
+    python -m macroModel bench --save-baseline  # after an intended change
+
+Timings depend on the machine: save a baseline on the machine that runs the
+comparisons.
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+from multiprocessing import get_context
+
+from .macro_model import SimulationConfig, Simulation
+from .profiler import PhaseProfiler
+
+#name -> (steady-state troves at step 0, steps)
+scenarios = {"1k": (1_000, 2000), "10k": (10_000, 1000), "100k": (100_000, 200), "1M": (1_000_000, 50)}
+#largest relative change that does not count as a regression
+thresholds = {"steps_per_sec": 0.25, "peak_rss_mb": 0.25, "phase": 0.5}
+#phases below this share of the step time are never flagged
+min_phase_share = 0.05
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def peak_rss_mb():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  #kilobytes on Linux, bytes on macOS
+  return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_scenario(name):
+  n_troves, n_steps = scenarios[name]
+  config = SimulationConfig(n_sim=n_steps + 1, initial_troves=n_troves, seed=0)
+  profiler = PhaseProfiler()
+  start = time.perf_counter()
+  sim = Simulation(config, profiler=profiler)
+  setup = time.perf_counter() - start
+  start = time.perf_counter()
+  while not sim.done:
+    sim.step()
+  elapsed = time.perf_counter() - start
+  summary = profiler.summary()
+  return {"troves": n_troves, "steps": sim.index, "troves_final": len(sim.troves), "setup_s": setup,
+          "steps_per_sec": sim.index / elapsed, "peak_rss_mb": peak_rss_mb(),
+          "phase_ms": {phase: row["total_ms"] / sim.index for phase, row in summary.iterrows()},
+          "phase_share": summary["share"].to_dict()}
+
+
+def run_benchmarks(names=None):
+  #one fresh interpreter per scenario, so that peak RSS is not inherited from the previous one
+  names = list(scenarios) if names is None else names
+  with get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+    return dict(zip(names, pool.map(run_scenario, names, chunksize=1)))
+
+
+def load_baseline(path=baseline_path):
+  with open(path) as f:
+    return json.load(f)
+
+
+def save_baseline(results, path=baseline_path):
+  with open(path, "w") as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+    f.write("\n")
+
+
+def compare(results, baseline, thresholds=thresholds):
+  #one row per scenario and metric; change is relative, positive meaning worse
+  import pandas as pd
+  rows = []
+  for name, current in results.items():
+    if name not in baseline:
+      continue
+    base = baseline[name]
+    change = base["steps_per_sec"] / current["steps_per_sec"] - 1
+    slower = change > thresholds["steps_per_sec"]
+    rows.append((name, "steps_per_sec", base["steps_per_sec"], current["steps_per_sec"], change, slower))
+    change = current["peak_rss_mb"] / base["peak_rss_mb"] - 1
+    rows.append((name, "peak_rss_mb", base["peak_rss_mb"], current["peak_rss_mb"], change,
+                 change > thresholds["peak_rss_mb"]))
+    for phase, ms in current["phase_ms"].items():
+      if phase not in base["phase_ms"] or base["phase_ms"][phase] <= 0:
+        continue
+      change = ms / base["phase_ms"][phase] - 1
+      flagged = slower and change > thresholds["phase"] and current["phase_share"][phase] >= min_phase_share
+      rows.append((name, f"{phase}_ms", base["phase_ms"][phase], ms, change, flagged))
+  return pd.DataFrame(rows, columns=["scenario", "metric", "baseline", "current", "change", "regression"])
@@ -0,0 +1,98 @@
+"""Checkpoints
+
+Saves the state of a running Simulation to a single compressed .npz file and
+restores it. A checkpoint holds the trove store, the stability pool
+depositors when they are tracked, the recorded steps with the rolling-window
+rings, the fee rates, the LQTY price history, the step index and the age of
+the system at step 0. The random streams are counter-based, so the seed and
+the step index are all they need; the exogenous paths are regenerated from
+the config, or passed again when the run was started with its own paths.
+
+    sim.run(checkpoint_every=720, checkpoint_path="run.npz")
+    result = resume("run.npz")  # same trajectory as the uninterrupted run
+"""
+
+import json
+import os
+from dataclasses import asdict
+
+import numpy as np
+
+from .macro_model import SimulationConfig, Simulation, exogenous_paths, columns, window_columns, day, month, watch_width
+from .policies import fee_policies
+from .profiler import call_phase
+from .recorder import StepRecorder
+from .rng import Streams
+from .troves import TroveStore, BandWatch
+from .stability import DepositorPool
+
+version = 1
+
+
+def save_checkpoint(sim, path):
+  if sim.data.sink is not None:
+    raise ValueError("runs that stream their steps to a file cannot be checkpointed")
+  arrays = {f"troves/{name}": array for name, array in sim.troves.state().items()}
+  arrays.update({f"data/{name}": array for name, array in sim.data.state().items()})
+  if sim.depositors is not None:
+    arrays.update({f"depositors/{name}": array for name, array in sim.depositors.state().items()})
+  arrays["price_LQTY"] = np.asarray(sim.price_LQTY, dtype=np.float64)
+  arrays["rates"] = np.array([sim.rate_issuance, sim.rate_redemption, sim.price_ether_current])
+  meta = {"version": version, "config": asdict(sim.config), "index": sim.index, "age": sim.age, "stopped": sim.stopped,
+          "policy": {"name": sim.policy.name, "params": vars(sim.policy)},
+          "recording": {"columns": list(sim.data.columns), "precision": sim.data.precision}}
+  arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+  #write next to the target and rename, so an interrupted save never leaves a truncated checkpoint
+  tmp = f"{path}.{os.getpid()}.tmp.npz"
+  np.savez_compressed(tmp, **arrays)
+  os.replace(tmp, path)
+
+
+def load_checkpoint(path, paths=None, policy=None, profiler=None):
+  #paths and policy are only needed when the run did not use the defaults derived from its config
+  with np.load(path) as f:
+    arrays = {name: f[name] for name in f.files}
+  meta = json.loads(arrays.pop("meta").tobytes().decode())
+  if meta["version"] != version:
+    raise ValueError(f"unsupported checkpoint version {meta['version']}")
+  config = SimulationConfig(**meta["config"])
+  if policy is None:
+    policy = fee_policies[meta["policy"]["name"]](**meta["policy"]["params"])
+  if paths is None:
+    paths = exogenous_paths(config, lazy=True)
+
+  sim = Simulation.__new__(Simulation)
+  sim.config = config
+  sim.policy = policy
+  sim.paths = paths
+  sim.streams = Streams(config.seed)
+  sim.price_ether = paths["price_ether"]
+  sim.natural_rate = paths["natural_rate"]
+  sim.price_LQTY = list(arrays["price_LQTY"])
+  sim.rate_issuance, sim.rate_redemption, sim.price_ether_current = (float(x) for x in arrays["rates"])
+  sim.troves = TroveStore.from_state({name[7:]: a for name, a in arrays.items() if name.startswith("troves/")})
+  sim.watch = BandWatch(watch_width(config))
+  sim.quiet_liquidate = sim.quiet_adjust = False
+  sim.bounds, sim.quiet_steps = None, 0
+  sim.depositors = None
+  if config.n_depositors:
+    sim.depositors = DepositorPool.from_state({name[11:]: a for name, a in arrays.items() if name.startswith("depositors/")})
+  recording = meta.get("recording", {"columns": columns, "precision": "float64"})
+  sim.data = StepRecorder(config.n_sim, recording["columns"], windows=(day, month), tracked=window_columns,
+                          precision=recording["precision"])
+  sim.data.restore({name[5:]: a for name, a in arrays.items() if name.startswith("data/")})
+  sim.index = meta["index"]
+  sim.age = meta["age"]
+  sim.stopped = meta["stopped"]
+  sim.profiler = profiler
+  sim.call = call_phase
+  if profiler is not None:
+    profiler.attach(sim)
+    sim.call = profiler.call
+  return sim
+
+
+def resume(path, paths=None, policy=None, checkpoint_every=None, profiler=None):
+  #continue a checkpointed run to the end, optionally writing further checkpoints to the same file
+  sim = load_checkpoint(path, paths, policy, profiler)
+  return sim.run(checkpoint_every=checkpoint_every, checkpoint_path=path if checkpoint_every else None)
@@ -0,0 +1,205 @@
+"""Monte Carlo ensembles
+
+Runs many independently seeded trajectories of the macro model over a
+process pool and streams their per-step values into QuantileSketch
+aggregates, so memory depends on the number of steps and on the spread of the
+values but not on the number of runs. The sketches only hold counts and the
+extremes of each bucket, which combine the same in any order, so the result
+is bit-for-bit identical whatever the worker count. A run that stops early,
+because a pool was depleted, keeps its last values in the quantiles of the
+later steps; n_stopped counts those runs per step.
+
+Every run draws its own exogenous paths from its seed. A replayed price
+history is the same for all of them: it is resampled once and published in
+shared memory, and the workers read the ether path from there.
+"""
+
+import json
+import math
+from dataclasses import asdict, replace
+from multiprocessing import Pool
+
+import numpy as np
+
+from .macro_model import SimulationConfig, Simulation, exogenous_paths, history_path
+from .shared import SharedArrays, attach
+
+quantiles = (0.01, 0.05, 0.5, 0.95, 0.99)
+#metric -> relative accuracy of its quantiles; LUSD stays close to the peg so it needs finer buckets
+ensemble_metrics = {"Price_LUSD": 0.0005, "n_troves": 0.005, "stability": 0.005, "supply_LUSD": 0.005}
+#bucket key of non-positive values, below every other key
+zero_key = -2**31
+
+
+class QuantileSketch:
+  #log-spaced buckets per step, in the spirit of DDSketch, stored sparsely: only the (step, bucket) pairs that
+  #were hit are kept, as sorted codes with a count and the smallest and largest value seen. A quantile is the
+  #estimate of its bucket clamped to those, so it is within relative_accuracy of a value seen at that step and
+  #exact when the bucket only ever held one value. Non-positive values share a zero bucket, NaN is skipped, and
+  #a trajectory shorter than n_steps is carried forward at its last value and counted in stopped.
+  def __init__(self, n_steps, relative_accuracy, buffer=64):
+    self.n_steps = n_steps
+    self.relative_accuracy = relative_accuracy
+    self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    self.log_gamma = math.log(self.gamma)
+    self.codes = np.zeros(0, dtype=np.int64)
+    self.counts = np.zeros(0, dtype=np.int64)
+    self.lo = np.zeros(0)
+    self.hi = np.zeros(0)
+    #trajectories that had stopped by each step
+    self.stopped = np.zeros(n_steps, dtype=np.int64)
+    #(codes, values) of trajectories added since the last merge, merged every buffer trajectories
+    self.buffer = buffer
+    self.pending = []
+
+  def bucket(self, values):
+    #bucket keys of the values, zero_key for non-positive ones
+    values = np.asarray(values, dtype=np.float64)
+    keys = np.full(len(values), zero_key, dtype=np.int64)
+    positive = values > 0
+    keys[positive] = np.ceil(np.log(values[positive]) / self.log_gamma).astype(np.int64)
+    return np.clip(keys, zero_key, -zero_key - 1)
+
+  def add(self, values):
+    #values of one trajectory, one per step from step 0 onwards
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+      return
+    if len(values) < self.n_steps:
+      self.stopped[len(values):] += 1
+      values = np.concatenate((values, np.full(self.n_steps - len(values), values[-1])))
+    values = values[:self.n_steps]
+    steps = np.flatnonzero(~np.isnan(values))
+    values = values[steps]
+    self.pending.append(((steps << 32) | (self.bucket(values) - zero_key), values))
+    if len(self.pending) >= self.buffer:
+      self._merge()
+
+  def _merge(self):
+    if not self.pending:
+      return
+    codes = np.concatenate([self.codes] + [p[0] for p in self.pending])
+    counts = np.concatenate([self.counts] + [np.ones(len(p[0]), dtype=np.int64) for p in self.pending])
+    lo = np.concatenate([self.lo] + [p[1] for p in self.pending])
+    hi = np.concatenate([self.hi] + [p[1] for p in self.pending])
+    self.pending = []
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    self.codes = codes[starts]
+    self.counts = np.add.reduceat(counts[order], starts)
+    self.lo = np.minimum.reduceat(lo[order], starts)
+    self.hi = np.maximum.reduceat(hi[order], starts)
+
+  @property
+  def n(self):
+    #number of trajectories with a value at each step, stopped ones included
+    self._merge()
+    return np.bincount(self.codes >> 32, self.counts, minlength=self.n_steps).astype(np.int64)
+
+  def quantile(self, q):
+    n = self.n
+    if not len(self.codes):
+      return np.full(self.n_steps, np.nan)
+    rank = np.floor(q * (n - 1)).astype(np.int64)
+    before = np.concatenate(([0], np.cumsum(n)[:-1]))
+    #the first entry of the step whose cumulative count passes the rank
+    entry = np.minimum(np.searchsorted(np.cumsum(self.counts), before + rank, side='right'), len(self.codes) - 1)
+    key = (self.codes[entry] & 0xffffffff) + zero_key
+    values = np.where(key == zero_key, 0.0, 2 * self.gamma ** key.astype(np.float64) / (self.gamma + 1))
+    values = np.clip(values, self.lo[entry], self.hi[entry])
+    return np.where(n > 0, values, np.nan)
+
+  def state(self):
+    self._merge()
+    return {"codes": self.codes, "counts": self.counts, "lo": self.lo, "hi": self.hi, "stopped": self.stopped}
+
+  @classmethod
+  def from_state(cls, relative_accuracy, arrays):
+    sketch = cls(len(arrays["stopped"]), relative_accuracy)
+    for name in ("codes", "counts", "lo", "hi", "stopped"):
+      setattr(sketch, name, arrays[name])
+    return sketch
+
+
+class EnsembleResult:
+  def __init__(self, config, seeds, sketches):
+    self.config = config
+    self.seeds = seeds
+    self.sketches = sketches
+
+  @property
+  def n_stopped(self):
+    #trajectories that had stopped by each step, because a pool was depleted; their last values stay in the quantiles
+    return next(iter(self.sketches.values())).stopped
+
+  @property
+  def n_runs(self):
+    #trajectories still running at each step
+    return len(self.seeds) - self.n_stopped
+
+  def save(self, path):
+    #the sketches and the config in one .npz file, e.g. as training data for macroModel.surrogate
+    meta = {"config": asdict(self.config), "seeds": self.seeds,
+            "metrics": {metric: sketch.relative_accuracy for metric, sketch in self.sketches.items()}}
+    arrays = {"meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)}
+    for metric, sketch in self.sketches.items():
+      arrays.update({f"{metric}/{name}": array for name, array in sketch.state().items()})
+    np.savez_compressed(path, **arrays)
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as f:
+      arrays = {name: f[name] for name in f.files}
+    meta = json.loads(arrays["meta"].tobytes().decode())
+    sketches = {}
+    for metric, accuracy in meta["metrics"].items():
+      prefix = f"{metric}/"
+      sketches[metric] = QuantileSketch.from_state(accuracy, {name[len(prefix):]: a for name, a in arrays.items()
+                                                              if name.startswith(prefix)})
+    return cls(SimulationConfig(**meta["config"]), meta["seeds"], sketches)
+
+  def quantiles(self, qs=quantiles):
+    import pandas as pd
+    frame = {(metric, f"p{round(100*q):g}"): sketch.quantile(q) for metric, sketch in self.sketches.items() for q in qs}
+    frame = pd.DataFrame(frame)
+    frame["n_runs"] = self.n_runs
+    frame["n_stopped"] = self.n_stopped
+    return frame
+
+
+def ensemble_member(args):
+  #args may end with the handle of an ether price path published in shared memory
+  config, seed, metrics, *shared = args
+  config = replace(config, seed=seed)
+  paths = exogenous_paths(config, attach(*shared)["price_ether"]) if shared else None
+  sim = Simulation(config, paths)
+  while not sim.done:
+    sim.step()
+  return {metric: np.array(sim.data[metric], dtype=np.float64) for metric in metrics}
+
+
+def run_ensemble(config=None, n_runs=100, seed=0, workers=None, metrics=ensemble_metrics):
+  #runs use seeds seed, seed+1, ..., seed+n_runs-1; workers=1 runs in this process
+  if config is None:
+    config = SimulationConfig()
+  seeds = list(range(seed, seed + n_runs))
+  sketches = {metric: QuantileSketch(config.n_sim, accuracy) for metric, accuracy in metrics.items()}
+  tasks = [(config, s, metrics) for s in seeds]
+
+  def collect(members):
+    for values in members:
+      for metric, sketch in sketches.items():
+        sketch.add(values[metric])
+
+  if workers == 1:
+    collect(map(ensemble_member, tasks))
+  elif config.price_history:
+    with SharedArrays({"history": {"price_ether": history_path(config)}}) as shared:
+      tasks = [task + (shared.handle, "history") for task in tasks]
+      with Pool(workers) as pool:
+        collect(pool.imap_unordered(ensemble_member, tasks))
+  else:
+    with Pool(workers) as pool:
+      collect(pool.imap_unordered(ensemble_member, tasks))
+  return EnsembleResult(config, seeds, sketches)
@@ -0,0 +1,113 @@
+"""Historical prices
+
+Replays recorded ETH/USD history in place of the synthetic ether random walk.
+convert() turns a CSV of (timestamp, price) rows into a regular grid of
+float64 prices, one every interval seconds with gaps carried forward, stored
+as a .npy file next to a small JSON file with the grid's start and interval.
+The CSV is read in chunks and the grid written through a memory map, so
+neither step holds the whole series in memory.
+
+PriceHistory memory-maps a converted file. resample() returns the price at
+each simulation step as a strided view of the map whenever the step is a
+multiple of the interval, so a replay starts instantly and only the pages
+holding the sampled prices are ever read.
+
+    python -m macroModel history ethusd_minutes.csv ethusd.npy
+    run(SimulationConfig(price_history="ethusd.npy", history_start="2021-01-01"))
+"""
+
+import json
+
+import numpy as np
+
+
+def metadata_path(path):
+  return str(path) + ".json"
+
+
+def to_seconds(values):
+  #unix seconds from unix seconds, unix milliseconds or date strings
+  values = np.asarray(values)
+  if values.dtype.kind in "iuf":
+    values = values.astype(np.int64)
+    return np.where(values > 10**11, values // 1000, values)
+  return np.asarray(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def convert(csv_path, out_path, interval=60, time_column=0, price_column=1, chunk_rows=1_000_000):
+  #one pass for the time range, one to fill the grid; later rows win within an interval
+  import pandas as pd
+  #columns are given by name or by position
+  header = pd.read_csv(csv_path, nrows=0).columns
+  time_column, price_column = (header[c] if isinstance(c, int) else c for c in (time_column, price_column))
+
+  def chunks():
+    return pd.read_csv(csv_path, usecols=[time_column, price_column], chunksize=chunk_rows)
+
+  first, last = None, None
+  for chunk in chunks():
+    seconds = to_seconds(chunk[time_column].to_numpy())
+    first = seconds.min() if first is None else min(first, seconds.min())
+    last = seconds.max() if last is None else max(last, seconds.max())
+  if first is None:
+    raise ValueError(f"{csv_path} has no price rows")
+  start = int(first) // interval * interval
+  n = (int(last) - start) // interval + 1
+
+  prices = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float64, shape=(n,))
+  prices[:] = np.nan
+  for chunk in chunks():
+    seconds = to_seconds(chunk[time_column].to_numpy())
+    values = chunk[price_column].to_numpy(dtype=np.float64)
+    order = np.argsort(seconds, kind="stable")
+    prices[(seconds[order] - start) // interval] = values[order]
+
+  #carry the last known price over gaps, block by block
+  carry = np.nan
+  for lo in range(0, n, chunk_rows):
+    block = np.array(prices[lo:lo + chunk_rows])
+    known = ~np.isnan(block)
+    index = np.where(known, np.arange(len(block)), -1)
+    np.maximum.accumulate(index, out=index)
+    filled = np.where(index >= 0, block[np.maximum(index, 0)], carry)
+    prices[lo:lo + chunk_rows] = filled
+    carry = filled[-1]
+  prices.flush()
+  del prices
+
+  with open(metadata_path(out_path), "w") as f:
+    json.dump({"start": start, "interval": interval, "length": n, "source": str(csv_path)}, f)
+  return PriceHistory(out_path)
+
+
+class PriceHistory:
+  def __init__(self, path):
+    self.path = str(path)
+    with open(metadata_path(path)) as f:
+      meta = json.load(f)
+    self.start = meta["start"]
+    self.interval = meta["interval"]
+    self.prices = np.load(self.path, mmap_mode="r")
+
+  def __len__(self):
+    return len(self.prices)
+
+  @property
+  def end(self):
+    return self.start + (len(self) - 1) * self.interval
+
+  def resample(self, step, n, start=None):
+    #price at start, start+step, ... (n values): the last price recorded in the grid interval holding each time
+    begin = self.start if start is None else int(to_seconds([start])[0])
+    if begin < self.start:
+      raise ValueError(f"{self.path} starts at {np.datetime64(self.start, 's')}, after {np.datetime64(begin, 's')}")
+    offset = (begin - self.start) // self.interval
+    if step % self.interval == 0:
+      stride = step // self.interval
+      path = self.prices[offset:offset + (n - 1) * stride + 1:stride]
+    else:
+      index = (begin - self.start + np.arange(n, dtype=np.int64) * step) // self.interval
+      path = self.prices[index[index < len(self)]]
+    if len(path) < n:
+      raise ValueError(f"{self.path} covers {len(path)} steps of {step}s from {np.datetime64(begin, 's')}, {n} are needed")
+    return path
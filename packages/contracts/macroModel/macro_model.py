@@ -1,277 +1,532 @@
 # -*- coding: utf-8 -*-
-"""Baseline vs Alternative V2 Copy
+"""Baseline vs Alternative V2
 
-Automatically generated by Colaboratory.
-
-Original file is located at
+Originally exported from Colaboratory:
     https://colab.research.google.com/drive/1NNPdiKfO3950MuAGyIXTNrr4OMliINKb
 
-# Parameters and Initialization
-"""
-
-import random
-import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import matplotlib.pyplot as plt
-import scipy.stats
-from plotly.subplots import make_subplots
-
-#policy functions
-rate_issuance = 0.01
-rate_redemption = 0.01
-base_rate_initial = 0
-
-#global variables
-period = 24*365
-month=24*30
-day=24
-
-#ether price
-price_ether_initial = 1000
-price_ether = [price_ether_initial]
-sd_ether=0.02
-drift_ether = 0
-
-#LQTY price & airdrop
-price_LQTY_initial = 1
-price_LQTY = [price_LQTY_initial]
-sd_LQTY=0.005
-drift_LQTY = 0.0035
-#reduced for now. otherwise the initial return too high
-quantity_LQTY_airdrop = 500
-supply_LQTY=[0]
-LQTY_total_supply=100000000
-
-#PE ratio
-PE_ratio = 50
-
-#natural rate
-natural_rate_initial = 0.2
-natural_rate = [natural_rate_initial]
-sd_natural_rate=0.002
-
-#stability pool
-initial_return=0.2
-return_stability=[initial_return]
-sd_return=0.001
-sd_stability=0.001
-drift_stability=1.002
-theta=0.001
-
-#liquidity pool & redemption pool
-sd_liquidity=0.001
-sd_redemption=0.001
-drift_liquidity=1.0003
-redemption_star = 0.8
-delta = -20
-
-#close troves
-sd_closetroves=0.5
-#sensitivity to LUSD price
-beta = 0.2
+Agent-based model of the LUSD market. Every hour (one step) troves are
+liquidated, closed, adjusted and opened, the stability and liquidity pools
+react, the LUSD price is stabilized by arbitrageurs and the LQTY price is
+derived from the protocol earnings. With time_step="adaptive" the steps
+in which the ether price cannot liquidate or adjust any trove skip those
+checks, and steps with a large price move liquidate along minute substeps.
 
-#open troves
-distribution_parameter1_ether_quantity=10
-distribution_parameter2_ether_quantity=500
-distribution_parameter1_CR = 1.1
-distribution_parameter2_CR = 0.1
-distribution_parameter3_CR = 16
-distribution_parameter1_inattention = 4
-distribution_parameter2_inattention = 0.08
-sd_opentroves=0.5
-n_steady=0.5
-initial_open=10
-
-#sensitivity to LUSD price & issuance fee
-alpha = 0.3
-
-#number of runs in simulation
-n_sim= 8640
-
-"""# Exogenous Factors
-
-Ether Price
+Importing this module has no side effects; use run(SimulationConfig(...))
+to simulate and the reporting module to plot the results.
 """
 
-#ether price
-for i in range(1, period):
-  random.seed(2019375+10000*i)
-  shock_ether = random.normalvariate(0,sd_ether)
-  price_ether.append(price_ether[i-1]*(1+shock_ether)*(1+drift_ether))
-
-"""Natural Rate"""
-
-#natural rate
-for i in range(1, period):
-  random.seed(201597+10*i)
-  shock_natural = random.normalvariate(0,sd_natural_rate)
-  natural_rate.append(natural_rate[i-1]*(1+shock_natural))
+import multiprocessing
+import os
+from copy import deepcopy
+from dataclasses import dataclass, replace
 
-"""LQTY Price - First Month"""
-
-#LQTY price
-for i in range(1, month):
-  random.seed(2+13*i)
-  shock_LQTY = random.normalvariate(0,sd_LQTY)  
-  price_LQTY.append(price_LQTY[i-1]*(1+shock_LQTY)*(1+drift_LQTY))
-
-"""# Troves
+import numpy as np
 
-Liquidate Troves
-"""
+from .troves import TroveStore, BandWatch, quiet_prices
+from .stability import DepositorPool, initial_deposits, deposit_flows
+from .recorder import StepRecorder, step_schema
+from .rng import Streams
+from .scenarios import price_paths
+from .policies import fee_policies, make_policy
+from .profiler import call_phase
 
-def liquidate_troves(troves, index, data):
-  troves['CR_current'] = troves['Ether_Price']*troves['Ether_Quantity']/troves['Supply']
-  price_LUSD_previous = data.loc[index-1,'Price_LUSD']
-  price_LQTY_previous = data.loc[index-1,'price_LQTY']
-  stability_pool_previous = data.loc[index-1, 'stability']
-
-  troves_liquidated = troves[troves.CR_current < 1.1]
-  troves = troves[troves.CR_current >= 1.1]
-  debt_liquidated = troves_liquidated['Supply'].sum()
-  ether_liquidated = troves_liquidated['Ether_Quantity'].sum()
-  n_liquidate = troves_liquidated.shape[0]
-  troves = troves.reset_index(drop = True)
-
-  liquidation_gain = ether_liquidated*price_ether_current - debt_liquidated*price_LUSD_previous
-  airdrop_gain = price_LQTY_previous * quantity_LQTY_airdrop
-  
-  np.random.seed(2+index)
-  shock_return = np.random.normal(0,sd_return)
-  if index <= day:
-   return_stability = initial_return*(1+shock_return)
-  elif index<=month:
+#global variables
+period = 24*365
+month = 24*30
+day = 24
+#seconds per step
+hour = 3600
+
+columns = ("Price_LUSD", "Price_Ether", "n_open", "n_close", "n_liquidate", "n_redempt",
+           "n_troves", "stability", "liquidity", "redemption_pool",
+           "supply_LUSD", "return_stability", "airdrop_gain", "liquidation_gain", "issuance_fee", "redemption_fee",
+           "price_LQTY", "MC_LQTY", "annualized_earning", "base_rate")
+#values of SimulationConfig.time_step
+time_steps = ("hourly", "adaptive")
+#metrics read back over trailing windows
+window_columns = ("liquidation_gain", "airdrop_gain", "issuance_fee", "redemption_fee")
+#metrics that derived_columns recomputes from the others, not recorded with drop_derived
+derived = ("Price_Ether", "MC_LQTY")
+
+
+@dataclass
+class SimulationConfig:
+  #policy functions, see policies.fee_policies
+  fee_policy: str = "fixed"
+  rate_issuance: float = 0.01
+  rate_redemption: float = 0.01
+  base_rate_initial: float = 0
+
+  #ether price
+  price_ether_initial: float = 1000
+  sd_ether: float = 0.02
+  drift_ether: float = 0
+  #regimes of macroModel.scenarios instead of a single drift: a scenario name or a .json/.yaml file
+  price_scenario: str = ""
+  #replay a history converted by macroModel.history instead, from history_start (a date, default its beginning)
+  price_history: str = ""
+  history_start: str = ""
+
+  #LQTY price & airdrop
+  price_LQTY_initial: float = 1
+  sd_LQTY: float = 0.005
+  drift_LQTY: float = 0.0035
+  #reduced for now. otherwise the initial return too high
+  quantity_LQTY_airdrop: float = 500
+  LQTY_total_supply: float = 100000000
+
+  #PE ratio
+  PE_ratio: float = 50
+
+  #natural rate
+  natural_rate_initial: float = 0.2
+  sd_natural_rate: float = 0.002
+
+  #stability pool
+  initial_return: float = 0.2
+  sd_return: float = 0.001
+  sd_stability: float = 0.001
+  drift_stability: float = 1.002
+  theta: float = 0.001
+  #liquidated debt beyond the stability pool is redistributed to the other troves, as in TroveManager;
+  #otherwise the pool absorbs every liquidation whatever its size
+  redistribution: bool = True
+  #track this many depositors with macroModel.stability, depositor_flow of them deposit or withdraw each step
+  n_depositors: int = 0
+  depositor_flow: int = 16
+
+  #liquidity pool & redemption pool
+  sd_liquidity: float = 0.001
+  sd_redemption: float = 0.001
+  drift_liquidity: float = 1.0003
+  redemption_star: float = 0.8
+  delta: float = -20
+
+  #close troves
+  sd_closetroves: float = 0.5
+  #sensitivity to LUSD price
+  beta: float = 0.2
+
+  #open troves
+  distribution_parameter1_ether_quantity: float = 10
+  distribution_parameter2_ether_quantity: float = 500
+  distribution_parameter1_CR: float = 1.1
+  distribution_parameter2_CR: float = 0.1
+  distribution_parameter3_CR: float = 16
+  distribution_parameter1_inattention: float = 4
+  distribution_parameter2_inattention: float = 0.08
+  sd_opentroves: float = 0.5
+  n_steady: float = 0.5
+  initial_open: int = 10
+  #start from a steady-state population of this many troves instead of opening initial_open and burning in
+  initial_troves: int = 0
+  #or from the troves of a snapshot of the deployed system, see macroModel.snapshot
+  trove_snapshot: str = ""
+
+  #sensitivity to LUSD price & issuance fee
+  alpha: float = 0.3
+
+  #"adaptive" steps skip the trove checks of liquidate_troves and adjust_troves while the ether price cannot
+  #cross the threshold of any trove, see Simulation.quiet_step, and leave CR_current as of the last step that checked them;
+  #a step whose ether price moves by more than refine_move (in log) liquidates along substeps of the hour
+  time_step: str = "hourly"
+  refine_move: float = 0.03
+  substeps: int = 60
+
+  #number of runs in simulation
+  n_sim: int = 8640
+  #every seed gives an independent, reproducible trajectory
+  seed: int = 0
+
+  def __post_init__(self):
+    if self.fee_policy not in fee_policies:
+      raise ValueError(f"unknown fee policy {self.fee_policy!r}, expected one of {tuple(fee_policies)}")
+    if self.time_step not in time_steps:
+      raise ValueError(f"unknown time step {self.time_step!r}, expected one of {time_steps}")
+
+
+class SimulationResult:
+  def __init__(self, config, data, troves, policy, depositors=None):
+    self.config = config
+    self.policy = policy
+    #one row per simulated hour, None when the steps were streamed to a Parquet or Arrow file
+    #and memory-mapped from its files when they were spilled
+    self.data = data
+    #trove pool at the end of the run
+    self.troves = troves
+    #stability pool depositors at the end of the run, when config.n_depositors is set
+    self.depositors = depositors
+
+
+# Exogenous Factors
+
+#config fields that exogenous_paths depends on
+path_fields = ("seed", "price_scenario", "price_history", "history_start", "price_ether_initial", "sd_ether", "drift_ether",
+               "natural_rate_initial", "sd_natural_rate", "price_LQTY_initial", "sd_LQTY", "drift_LQTY",
+               "sd_return", "sd_closetroves", "sd_opentroves", "sd_stability", "sd_liquidity", "sd_redemption")
+
+
+def derived_columns(config, data, paths=None):
+  #the derived metrics of the recorded steps of a run with drop_derived, e.g. data.assign(**derived_columns(...));
+  #paths are needed when the run did not use the ones of its config
+  if paths is None:
+    paths = exogenous_paths(config)
+  price_LQTY = np.asarray(data["price_LQTY"], dtype=np.float64)
+  n = len(price_LQTY)
+  return {"Price_Ether": paths["price_ether"][:n], "MC_LQTY": price_LQTY * quantity_LQTY(start_age(config) + np.arange(n))}
+
+
+def start_age(config):
+  #steps the system had been running at step 0: those of a trove snapshot, otherwise none
+  if not config.trove_snapshot:
+    return 0
+  from .snapshot import load_snapshot, snapshot_age
+  return snapshot_age(load_snapshot(config.trove_snapshot)[0])
+
+
+def path_key(config):
+  #configs with equal keys have identical exogenous paths
+  return (max(period, config.n_sim),) + tuple(getattr(config, name) for name in path_fields)
+
+
+def history_path(config):
+  #the replayed ether price of config.price_history, one value per step of the run
+  from .history import PriceHistory
+  return PriceHistory(config.price_history).resample(hour, config.n_sim, config.history_start or None)
+
+
+def shock_draws(config):
+  #name -> (stream, Generator method, arguments) of the per-step shocks of the exogenous paths
+  return {"shock_return": ("return", "normal", (0, config.sd_return)),
+          "shock_closetroves": ("close", "normal", (0, config.sd_closetroves)),
+          "uniform_closetroves": ("close_uniform", "uniform", (0, 1)),
+          "shock_opentroves": ("open", "normal", (0, config.sd_opentroves)),
+          "ratio_adjust": ("adjust_ratio", "uniform", (0, 1)),
+          "shock_stability": ("stability", "normal", (0, config.sd_stability)),
+          "shock_liquidity": ("liquidity", "normal", (0, config.sd_liquidity)),
+          "shock_redemption": ("redemption", "normal", (0, config.sd_redemption)),
+          "earning_LQTY": ("LQTY_earning", "normal", (200000000, 500000))}
+
+
+class ShockPath:
+  #a per-step shock drawn block by block from its stream as a run reads it, so that a long run does not hold
+  #the whole path. Draws from one stream do not depend on how they are split, so the values are those of the
+  #whole path; slicing it or np.asarray() draws the whole path
+  block = 8192
+
+  def __init__(self, streams, phase, method, args, n):
+    self.streams, self.phase, self.method, self.args, self.n = streams, phase, method, args, n
+    self.rng = None
+    self.start = 0
+    self.values = np.empty(0)
+
+  def __len__(self):
+    return self.n
+
+  def __array__(self, dtype=None, copy=None):
+    return np.asarray(getattr(self.streams.path(self.phase), self.method)(*self.args, self.n), dtype=dtype)
+
+  def __getitem__(self, index):
+    if not isinstance(index, (int, np.integer)):
+      return np.asarray(self)[index]
+    index = int(index) + self.n if index < 0 else int(index)
+    if not 0 <= index < self.n:
+      raise IndexError("step out of range")
+    if self.rng is None or index < self.start:
+      #a step before the current block, e.g. of a branch that shares the path: draw again from the start
+      self.rng, self.start, self.values = self.streams.path(self.phase), 0, np.empty(0)
+    while index >= self.start + len(self.values):
+      self.start += len(self.values)
+      self.values = getattr(self.rng, self.method)(*self.args, min(self.block, self.n - self.start))
+    return self.values[index - self.start]
+
+
+def exogenous_paths(config, price_ether=None, lazy=False):
+  #whole paths and every per-step shock that does not depend on the state of the run;
+  #price_ether replaces the ether path, e.g. a replayed history resampled once for many seeds.
+  #With lazy the shocks are ShockPaths, which a simulation reads in order without holding them
+  n = max(period, config.n_sim)
+  streams = Streams(config.seed)
+
+  #ether price
+  if price_ether is None and config.price_history:
+    price_ether = history_path(config)
+  elif price_ether is None:
+    price_ether = price_paths(config.price_scenario or "random_walk", n, streams.path("ether"),
+                              initial=config.price_ether_initial, sd=config.sd_ether, drift=config.drift_ether)
+
+  #natural rate
+  #in place, the same values as config.natural_rate_initial*np.cumprod(np.concatenate(([1.0], 1+shocks)))
+  natural_rate = np.empty(n)
+  natural_rate[0] = 1.0
+  shocks = streams.path("natural_rate").standard_normal(out=natural_rate[1:])
+  shocks *= config.sd_natural_rate
+  shocks += 1
+  np.cumprod(natural_rate, out=natural_rate)
+  natural_rate *= config.natural_rate_initial
+
+  #LQTY price - first month
+  shock_LQTY = streams.path("LQTY").normal(0, config.sd_LQTY, month-1)
+  price_LQTY = config.price_LQTY_initial*np.cumprod(np.concatenate(([1.0], (1+shock_LQTY)*(1+config.drift_LQTY))))
+
+  paths = {"price_ether": price_ether, "natural_rate": natural_rate, "price_LQTY": price_LQTY}
+  for name, (phase, method, args) in shock_draws(config).items():
+    path = ShockPath(streams, phase, method, args, n)
+    paths[name] = path if lazy else np.asarray(path)
+  return paths
+
+
+#paths that are levels rather than shocks; a branch rescales them to continue from the parent's level
+level_paths = ("price_ether", "natural_rate", "price_LQTY")
+#paths indexed by the age of the system rather than by the step of the run, which a branch does not shift
+age_paths = ("price_LQTY",)
+
+
+def splice_paths(paths, new, index):
+  #paths up to and including step index, new ones after it. The new paths start at the branch step, so that
+  #their step 0 (e.g. the first regime of a scenario) is step index of the spliced ones
+  spliced = {}
+  for name, path in paths.items():
+    if index + 1 >= len(path):
+      spliced[name] = path
+      continue
+    start = index if name in age_paths else 0
+    tail = new[name][start+1:start+len(path)-index]
+    if name in level_paths:
+      tail = tail * (path[index] / new[name][start])
+    spliced[name] = np.concatenate((path[:index+1], tail))
+  return spliced
+
+
+# Troves
+
+def first_crossing(price, start, low, high, move, block=256):
+  #the first step from start whose price is not strictly between low and high or, with move, differs from
+  #the previous one by more than move in log; len(price) if there is none
+  while start < len(price):
+    p = price[start-1:start+block]
+    out = (p[1:] <= low) | (p[1:] >= high)
+    if move:
+      out |= np.abs(np.diff(np.log(p))) > move
+    hit = np.flatnonzero(out)
+    if len(hit):
+      return start + int(hit[0])
+    start += block
+    block *= 2
+  return len(price)
+
+
+def bridge_prices(start, end, sd, n, rng):
+  #n prices at the substeps of a step from start to end, the last one end: a Brownian bridge in log price
+  #whose increments over the whole step have standard deviation sd
+  t = np.arange(1, n + 1) / n
+  walk = np.cumsum(rng.standard_normal(n)) * (sd / np.sqrt(n))
+  return start * np.exp(t * np.log(end / start) + walk - t * walk[-1])
+
+
+def watch_width(config):
+  #a few hourly standard deviations of the ether price, so that the BandWatch window lasts several steps
+  return max(3*config.sd_ether, 0.01)
+
+
+def liquidate_troves(sim, index):
+  c = sim.config
+  troves = sim.troves
+  data = sim.data
+  price_ether_current = sim.price_ether_current
+  price_LUSD_previous = data.last('Price_LUSD')
+  price_LQTY_previous = data.last('price_LQTY')
+  stability_pool_previous = data.last('stability')
+
+  bridge = None if sim.quiet_liquidate else sim.bridge(index)
+  if sim.quiet_liquidate:
+    troves_liquidated = np.empty(0, dtype=np.int64)
+  elif bridge is not None:
+    #a trove is liquidated at the first substep whose price is below its liquidation price
+    lowest = np.minimum.accumulate(bridge)
+    troves_liquidated = troves.liquidatable(lowest[-1])
+  else:
+    troves_liquidated = troves.liquidatable(price_ether_current)
+  ether_trove, debt_trove = troves.entire(troves_liquidated)
+  price_liquidated = price_ether_current
+  if bridge is not None and len(troves_liquidated):
+    first = np.searchsorted(-lowest, -1.1*debt_trove/ether_trove, side="right")
+    price_liquidated = (ether_trove*bridge[np.minimum(first, len(bridge)-1)]).sum()/ether_trove.sum()
+  debt_liquidated = debt_trove.sum()
+  ether_liquidated = ether_trove.sum()
+  n_liquidate = len(troves_liquidated)
+  troves.remove(troves_liquidated)
+
+  #the stability pool offsets what it can, the rest goes to the remaining troves
+  if c.redistribution and debt_liquidated > stability_pool_previous and len(troves):
+    offset = max(0.0, stability_pool_previous) / debt_liquidated
+    troves.redistribute(debt_liquidated*(1-offset), ether_liquidated*(1-offset))
+    debt_liquidated, ether_liquidated = debt_liquidated*offset, ether_liquidated*offset
+  if sim.depositors is not None:
+    sim.depositors.offset(debt_liquidated, ether_liquidated)
+    sim.depositors.issue(c.quantity_LQTY_airdrop)
+
+  liquidation_gain = ether_liquidated*price_liquidated - debt_liquidated*price_LUSD_previous
+  airdrop_gain = price_LQTY_previous * c.quantity_LQTY_airdrop
+
+  shock_return = sim.paths["shock_return"][index]
+  age = sim.age + index
+  if age <= day:
+    return_stability = c.initial_return*(1+shock_return)
+  elif age<=month:
     #min function to rule out the large fluctuation caused by the large but temporary liquidation gain in a particular period
-    return_stability = min(0.5, 365*(data.loc[index-day:index, 'liquidation_gain'].sum()+data.loc[index-day:index, 'airdrop_gain'].sum())/(price_LUSD_previous*stability_pool_previous))
+    return_stability = min(0.5, 365*(data.window_sum('liquidation_gain', day)+data.window_sum('airdrop_gain', day))/(price_LUSD_previous*stability_pool_previous))
   else:
-    return_stability = (365/30)*(data.loc[index-month:index, 'liquidation_gain'].sum()+data.loc[index-month:index, 'airdrop_gain'].sum())/(price_LUSD_previous*stability_pool_previous)
-  
-  return[troves, return_stability, debt_liquidated, ether_liquidated, liquidation_gain, airdrop_gain, n_liquidate]
+    return_stability = (365/30)*(data.window_sum('liquidation_gain', month)+data.window_sum('airdrop_gain', month))/(price_LUSD_previous*stability_pool_previous)
+
+  return[return_stability, debt_liquidated, ether_liquidated, liquidation_gain, airdrop_gain, n_liquidate]
 
-"""Close Troves"""
 
-def close_troves(troves, index2, price_LUSD_previous):
-  np.random.seed(208+index2)
-  shock_closetroves = np.random.normal(0,sd_closetroves)
-  n_troves = troves.shape[0]
+def close_troves(sim, index2, price_LUSD_previous):
+  c = sim.config
+  troves = sim.troves
+  shock_closetroves = sim.paths["shock_closetroves"][index2]
+  n_troves = len(troves)
 
-  if index2 <= 240:
-    number_closetroves = np.random.uniform(0,1)
+  if sim.age + index2 <= 240 and not c.initial_troves:
+    number_closetroves = sim.paths["uniform_closetroves"][index2]
   elif price_LUSD_previous >=1:
-    number_closetroves = max(0, n_steady * (1+shock_closetroves))
+    number_closetroves = max(0, c.n_steady * (1+shock_closetroves))
   else:
-    number_closetroves = max(0, n_steady * (1+shock_closetroves)) + beta*(1-price_LUSD_previous)*n_troves
-  
+    number_closetroves = max(0, c.n_steady * (1+shock_closetroves)) + c.beta*(1-price_LUSD_previous)*n_troves
+
   number_closetroves = int(round(number_closetroves))
-  
-  random.seed(293+100*index2)
-  drops = list(random.sample(range(len(troves)), number_closetroves))
-  troves = troves.drop(drops)
-  troves = troves.reset_index(drop=True)
-  if len(troves) < number_closetroves:
-    number_closetroves = -999
-
-  return[troves, number_closetroves]
-
-"""Adjust Troves"""
-
-def adjust_troves(troves, index):
-  issuance_LUSD_adjust = 0
-  random.seed(57984-3*index)
-  ratio = random.uniform(0,1)
-  for i in range(0, troves.shape[0]):
-    random.seed(187*index + 3*i)
-    working_trove = troves.iloc[i,:]
-    p = random.uniform(0,1)
-    check = (working_trove['CR_current']-working_trove['CR_initial'])/(working_trove['CR_initial']*working_trove['Rational_inattention'])
+
+  #-999 flags a step that wanted to close more troves than there were
+  if number_closetroves > n_troves:
+    troves.remove(np.arange(n_troves))
+    return[-999]
+  drops = sim.streams.step("close_sample", index2).choice(n_troves, size=number_closetroves, replace=False)
+  troves.remove(drops)
+
+  return[number_closetroves]
+
+
+def adjust_troves(sim, index):
+  if sim.quiet_adjust:
+    return[0.0]
+  troves = sim.troves
+  price_ether_current = sim.price_ether_current
+  ratio = sim.paths["ratio_adjust"][index]
+  n = len(troves)
+  ether_quantity = troves['Ether_Quantity']
+  supply = troves['Supply']
+  CR_initial = troves['CR_initial']
+  CR_current = troves.update_CR(price_ether_current)
+  #only the troves whose band ends near the price can be out of it
+  watched = sim.watch.candidates(troves, price_ether_current)
+  check = (CR_current[watched]-CR_initial[watched])/(CR_initial[watched]*troves['Rational_inattention'][watched])
+  out_of_band = (check < -1) | (check > 2)
+  if not out_of_band.any():
+    return[0.0]
+  troves.apply_pending(watched[out_of_band])
+  p = sim.streams.step("adjust", index).random(n)[watched]
 
   #A part of the troves are adjusted by adjusting debt
-    if p >= ratio:
-      if check<-1:
-        working_trove['Supply'] = working_trove['Ether_Price']*working_trove['Ether_Quantity']/working_trove['CR_initial']
-      if check>2:
-        supply_new = working_trove['Ether_Price']*working_trove['Ether_Quantity']/working_trove['CR_initial']
-        issuance_LUSD_adjust = issuance_LUSD_adjust + rate_issuance * (supply_new - working_trove['Supply'])
-        working_trove['Supply'] = supply_new
+  debt = out_of_band & (p >= ratio)
+  by_debt = watched[debt]
+  supply_new = price_ether_current*ether_quantity[by_debt]/CR_initial[by_debt]
+  increased = check[debt] > 2
+  issuance_LUSD_adjust = sim.rate_issuance * (supply_new[increased] - supply[by_debt][increased]).sum()
+  troves.set_supply(by_debt, supply_new)
   #Another part of the troves are adjusted by adjusting collaterals
-    if p < ratio and (check < -1 or check > 2):
-      working_trove['Ether_Quantity'] = working_trove['CR_initial']*working_trove['Supply']/working_trove['Ether_Price']
-    
-    troves.loc[i] = working_trove
-  return[troves, issuance_LUSD_adjust]
+  by_coll = watched[out_of_band & (p < ratio)]
+  troves.set_ether(by_coll, CR_initial[by_coll]*supply[by_coll]/price_ether_current)
 
-"""Open Troves"""
+  return[issuance_LUSD_adjust]
 
-def open_troves(troves, index1, price_LUSD_previous):
-  random.seed(2019*index1)  
-  issuance_LUSD_open = 0
-  shock_opentroves = random.normalvariate(0,sd_opentroves)
-  n_troves = troves.shape[0]
+
+def open_troves(sim, index1, price_LUSD_previous):
+  c = sim.config
+  troves = sim.troves
+  rate_issuance = sim.rate_issuance
+  shock_opentroves = sim.paths["shock_opentroves"][index1]
+  n_troves = len(troves)
 
   if index1<=0:
-    number_opentroves = initial_open
+    number_opentroves = c.initial_open
   elif price_LUSD_previous <=1 + rate_issuance:
-    number_opentroves = max(0, n_steady * (1+shock_opentroves))
+    number_opentroves = max(0, c.n_steady * (1+shock_opentroves))
   else:
-    number_opentroves = max(0, n_steady * (1+shock_opentroves)) + alpha*(price_LUSD_previous-rate_issuance-1)*n_troves
-  
+    number_opentroves = max(0, c.n_steady * (1+shock_opentroves)) + c.alpha*(price_LUSD_previous-rate_issuance-1)*n_troves
+
   number_opentroves = int(round(float(number_opentroves)))
 
-  for i in range(0, number_opentroves):
-    price_ether_current = price_ether[index1]
-    
-    np.random.seed(2033 + index1 + i*i)
-    CR_ratio = distribution_parameter1_CR + distribution_parameter2_CR * np.random.chisquare(df=distribution_parameter3_CR)
-    
-    np.random.seed(20 + 10 * i + index1)
-    quantity_ether = np.random.gamma(distribution_parameter1_ether_quantity, scale=distribution_parameter2_ether_quantity)
-    
-    np.random.seed(209870- index1 + i*i)
-    rational_inattention = np.random.gamma(distribution_parameter1_inattention, scale=distribution_parameter2_inattention)
-    
-    supply_trove = price_ether_current * quantity_ether / CR_ratio
-    issuance_LUSD_open = issuance_LUSD_open + rate_issuance * supply_trove
-
-    new_row = {"Ether_Price": price_ether_current, "Ether_Quantity": quantity_ether, 
-               "CR_initial": CR_ratio, "Supply": supply_trove, 
-               "Rational_inattention": rational_inattention, "CR_current": CR_ratio}
-    troves = troves.append(new_row, ignore_index=True)
-
-  return[troves, number_opentroves, issuance_LUSD_open]
-
-"""# LUSD Market
-
-Stability Pool
-"""
+  if number_opentroves <= 0:
+    return[number_opentroves, 0]
+
+  price_ether_current = sim.price_ether[index1]
+  rng = sim.streams.step("open_troves", index1)
+  CR_ratio = c.distribution_parameter1_CR + c.distribution_parameter2_CR * rng.chisquare(c.distribution_parameter3_CR, number_opentroves)
+  quantity_ether = rng.gamma(c.distribution_parameter1_ether_quantity, c.distribution_parameter2_ether_quantity, number_opentroves)
+  rational_inattention = rng.gamma(c.distribution_parameter1_inattention, c.distribution_parameter2_inattention, number_opentroves)
+
+  supply_trove = price_ether_current * quantity_ether / CR_ratio
+  issuance_LUSD_open = rate_issuance * supply_trove.sum()
+
+  troves.extend(Ether_Quantity=quantity_ether, Supply=supply_trove, CR_initial=CR_ratio,
+                Rational_inattention=rational_inattention, CR_current=CR_ratio)
+  #the index changes of the step so far, mostly these troves, are merged here rather than by the next reader
+  troves.sorted.merge()
+
+  return[number_opentroves, issuance_LUSD_open]
+
+
+def steady_population(c, n, price_ether_current, rng, MCR=1.1):
+  #n troves drawn in one shot from the distributions of open_troves, each placed uniformly inside its
+  #rational inattention band, where adjust_troves leaves it alone, and above the MCR
+  CR_ratio = c.distribution_parameter1_CR + c.distribution_parameter2_CR * rng.chisquare(c.distribution_parameter3_CR, n)
+  quantity_ether = rng.gamma(c.distribution_parameter1_ether_quantity, c.distribution_parameter2_ether_quantity, n)
+  rational_inattention = rng.gamma(c.distribution_parameter1_inattention, c.distribution_parameter2_inattention, n)
 
-def stability_update(stability_pool_previous, return_previous, index):
-  np.random.seed(27+3*index)
-  shock_stability = np.random.normal(0,sd_stability)
-  natural_rate_current = natural_rate[index]
-  if index <= month:
-    stability_pool = stability_pool_previous* (drift_stability+shock_stability)* (1+ return_previous- natural_rate_current)**theta
+  lowest = np.maximum(-1, (MCR/CR_ratio - 1)/rational_inattention)
+  band = lowest + (2 - lowest) * rng.random(n)
+  CR_current = CR_ratio * (1 + rational_inattention*band)
+  supply_trove = price_ether_current * quantity_ether / CR_current
+
+  return {"Ether_Quantity": quantity_ether, "Supply": supply_trove, "CR_initial": CR_ratio,
+          "Rational_inattention": rational_inattention, "CR_current": CR_current}
+
+
+# LUSD Market
+
+def stability_update(sim, stability_pool_previous, return_previous, index):
+  c = sim.config
+  shock_stability = sim.paths["shock_stability"][index]
+  natural_rate_current = sim.natural_rate[index]
+  if sim.age + index <= month:
+    stability_pool = stability_pool_previous* (c.drift_stability+shock_stability)* (1+ return_previous- natural_rate_current)**c.theta
   else:
-    stability_pool = stability_pool_previous* (1+shock_stability)* (1+ return_previous- natural_rate_current)**theta
+    stability_pool = stability_pool_previous* (1+shock_stability)* (1+ return_previous- natural_rate_current)**c.theta
+  if sim.depositors is not None:
+    deposit_flows(sim.depositors, stability_pool, sim.streams.step("depositors", index), c.depositor_flow)
   return[stability_pool]
 
-"""LUSD Price, liquidity pool, and redemption"""
 
-def price_stabilizer(troves, index, data, stability_pool, n_open):
+#LUSD Price, liquidity pool, and redemption
+def price_stabilizer(sim, index, stability_pool, n_open):
+  c = sim.config
+  troves = sim.troves
+  data = sim.data
+  price_ether_current = sim.price_ether_current
+  rate_issuance = sim.rate_issuance
+  rate_redemption = sim.rate_redemption
   issuance_LUSD_stabilizer = 0
   redemption_fee = 0
   n_redempt = 0
   redempted = 0
-  redemption_pool = 0  
+  redemption_pool = 0
 #Calculating Price
-  supply = troves['Supply'].sum()
-  np.random.seed(20*index)
-  shock_liquidity = np.random.normal(0,sd_liquidity)
-  liquidity_pool_previous = float(data['liquidity'][index-1])
-  price_LUSD_previous = float(data['Price_LUSD'][index-1])
-  price_LUSD_current= price_LUSD_previous*((supply-stability_pool)/(liquidity_pool_previous*(drift_liquidity+shock_liquidity)))**(1/delta)
-  
+  supply = troves.total_supply
+  shock_liquidity = sim.paths["shock_liquidity"][index]
+  liquidity_pool_previous = float(data.last('liquidity'))
+  price_LUSD_previous = float(data.last('Price_LUSD'))
+  price_LUSD_current= price_LUSD_previous*((supply-stability_pool)/(liquidity_pool_previous*(c.drift_liquidity+shock_liquidity)))**(1/c.delta)
 
 #Liquidity Pool
   liquidity_pool = supply-stability_pool
@@ -279,8 +534,7 @@ def price_stabilizer(troves, index, data, stability_pool, n_open):
 #Stabilizer
   #Ceiling Arbitrageurs
   if price_LUSD_current > 1.1 + rate_issuance:
-    #supply_current = sum(troves['Supply'])
-    supply_wanted=stability_pool+liquidity_pool_previous*(drift_liquidity+shock_liquidity)*((1.1+rate_issuance)/price_LUSD_previous)**delta
+    supply_wanted=stability_pool+liquidity_pool_previous*(c.drift_liquidity+shock_liquidity)*((1.1+rate_issuance)/price_LUSD_previous)**c.delta
     supply_trove = supply_wanted - supply
 
     CR_ratio = 1.1
@@ -288,720 +542,380 @@ def price_stabilizer(troves, index, data, stability_pool, n_open):
     quantity_ether = supply_trove * CR_ratio / price_ether_current
     issuance_LUSD_stabilizer = rate_issuance * supply_trove
 
-    new_row = {"Ether_Price": price_ether_current, "Ether_Quantity": quantity_ether, "CR_initial": CR_ratio,
-               "Supply": supply_trove, "Rational_inattention": rational_inattention, "CR_current": CR_ratio}
-    troves = troves.append(new_row, ignore_index=True)
+    troves.append(Ether_Quantity=quantity_ether, Supply=supply_trove, CR_initial=CR_ratio,
+                  Rational_inattention=rational_inattention, CR_current=CR_ratio)
     price_LUSD_current = 1.1 + rate_issuance
-    #missing in the previous version  
+    #missing in the previous version
     liquidity_pool = supply_wanted-stability_pool
     n_open=n_open+1
-    
 
   #Floor Arbitrageurs
   if price_LUSD_current < 1 - rate_redemption:
-    np.random.seed(30*index)
-    shock_redemption = np.random.normal(0,sd_redemption)
-    redemption_ratio = redemption_star * (1+shock_redemption)
+    shock_redemption = sim.paths["shock_redemption"][index]
+    redemption_ratio = c.redemption_star * (1+shock_redemption)
 
-    #supply_current = sum(troves['Supply'])
-    supply_target=stability_pool+liquidity_pool_previous*(drift_liquidity+shock_liquidity)*((1-rate_redemption)/price_LUSD_previous)**delta
+    supply_target=stability_pool+liquidity_pool_previous*(c.drift_liquidity+shock_liquidity)*((1-rate_redemption)/price_LUSD_previous)**c.delta
     supply_diff = supply - supply_target
     if supply_diff < redemption_ratio * liquidity_pool:
       redemption_pool=supply_diff
-      #liquidity_pool = liquidity_pool - redemption_pool
       price_LUSD_current = 1 - rate_redemption
     else:
       redemption_pool=redemption_ratio * liquidity_pool
-      #liquidity_pool = (1-redemption_ratio)*liquidity_pool
-      price_LUSD_current= price_LUSD_previous * (liquidity_pool/(liquidity_pool_previous*(drift_liquidity+shock_liquidity)))**(1/delta)
-    
+      price_LUSD_current= price_LUSD_previous * (liquidity_pool/(liquidity_pool_previous*(c.drift_liquidity+shock_liquidity)))**(1/c.delta)
+
     #Shutting down the riskiest troves
-    troves = troves.sort_values(by='CR_current', ascending = True)
-    quantity_working_trove = troves['Supply'][troves.index[0]]
+    riskiest = troves.riskiest()
+    position = troves.position
+    quantity_working_trove = troves.entire(position[riskiest[0]])[1]
     redempted = quantity_working_trove
-    while redempted <= redemption_pool:
-      troves = troves.drop(troves.index[0])
-      quantity_working_trove = troves['Supply'][troves.index[0]]
-      redempted = redempted + quantity_working_trove
+    while redempted <= redemption_pool and n_redempt < len(riskiest)-1:
       n_redempt = n_redempt + 1
-    
+      quantity_working_trove = troves.entire(position[riskiest[n_redempt]])[1]
+      redempted = redempted + quantity_working_trove
+    redeemed = position[riskiest[:n_redempt]]
+
     #Residuals
     redempted = redempted - quantity_working_trove
     residual = redemption_pool - redempted
-    wk = troves.index[0]
-    troves['Supply'][wk] = troves['Supply'][wk] - residual
-    troves['Ether_Quantity'][wk] = troves['Ether_Quantity'][wk] - residual/price_ether_current
+    wk = position[riskiest[n_redempt]]
+    troves.apply_pending(wk)
+    troves.set_supply(wk, troves['Supply'][wk] - residual)
+    troves.set_ether(wk, troves['Ether_Quantity'][wk] - residual/price_ether_current)
     troves['CR_current'][wk] = price_ether_current * troves['Ether_Quantity'][wk] / troves['Supply'][wk]
+    troves.remove(redeemed)
 
     #Redemption Fee
     redemption_fee = rate_redemption * redemption_pool
-    
+  troves.sorted.merge()
 
-  troves = troves.reset_index(drop=True)
-  return[price_LUSD_current, liquidity_pool, troves, issuance_LUSD_stabilizer, redemption_fee, n_redempt, redemption_pool, n_open]
+  return[price_LUSD_current, liquidity_pool, issuance_LUSD_stabilizer, redemption_fee, n_redempt, redemption_pool, n_open]
 
-"""# LQTY Market"""
 
+# LQTY Market
 
+def quantity_LQTY(age):
+  #LQTY issued by the time the system is age steps old
+  return (100000000/3)*(1-0.5**(age/period))
 
-def LQTY_market(index, data):
-  quantity_LQTY = (100000000/3)*(1-0.5**(index/period))
-  np.random.seed(2+3*index)
-  if index <= month: 
-    price_LQTY_current = price_LQTY[index-1]
-    annualized_earning = (index/month)**0.5*np.random.normal(200000000,500000)
+
+def LQTY_market(sim, index):
+  c = sim.config
+  age = sim.age + index
+  quantity = quantity_LQTY(age)
+  if age <= month:
+    price_LQTY_current = sim.price_LQTY[index-1]
+    annualized_earning = (age/month)**0.5*sim.paths["earning_LQTY"][index]
   else:
-    revenue_issuance = data.loc[index-month:index, 'issuance_fee'].sum()
-    revenue_redemption = data.loc[index-month:index, 'redemption_fee'].sum()
+    revenue_issuance = sim.data.window_sum('issuance_fee', month)
+    revenue_redemption = sim.data.window_sum('redemption_fee', month)
     annualized_earning = 365*(revenue_issuance+revenue_redemption)/30
     #discountin factor to factor in the risk in early days
-    discount=index/period
-    price_LQTY_current = discount*PE_ratio*annualized_earning/LQTY_total_supply
-  
-  MC_LQTY_current = price_LQTY_current * quantity_LQTY
-  return[price_LQTY_current, annualized_earning, MC_LQTY_current]
-
-"""# Simulation Program"""
-
-#Defining Initials
-initials = {"Price_LUSD":[1.00], "Price_Ether":[price_ether_initial], "n_open":[initial_open], "n_close":[0], "n_liquidate": [0], "n_redempt":[0], 
-            "n_troves":[initial_open], "stability":[0], "liquidity":[0], "redemption_pool":[0],
-            "supply_LUSD":[0],  "return_stability":[initial_return], "airdrop_gain":[0], "liquidation_gain":[0],  "issuance_fee":[0], "redemption_fee":[0],
-            "price_LQTY":[price_LQTY_initial], "MC_LQTY":[0], "annualized_earning":[0]}
-data = pd.DataFrame(initials)
-troves= pd.DataFrame({"Ether_Price":[], "Ether_Quantity":[], "CR_initial":[], 
-              "Supply":[], "Rational_inattention":[], "CR_current":[]})
-result_open = open_troves(troves, 0, data['Price_LUSD'][0])
-troves = result_open[0]
-issuance_LUSD_open = result_open[2]
-data.loc[0,'issuance_fee'] = issuance_LUSD_open * initials["Price_LUSD"][0]
-data.loc[0,'supply_LUSD'] = troves["Supply"].sum()
-data.loc[0,'liquidity'] = 0.5*troves["Supply"].sum()
-data.loc[0,'stability'] = 0.5*troves["Supply"].sum()
-
-#Simulation Process
-for index in range(1, n_sim):
-#exogenous ether price input
-  price_ether_current = price_ether[index]
-  troves['Ether_Price'] = price_ether_current
-  price_LUSD_previous = data.loc[index-1,'Price_LUSD']
-  price_LQTY_previous = data.loc[index-1,'price_LQTY']
-
-#trove liquidation & return of stability pool
-  result_liquidation = liquidate_troves(troves, index, data)
-  troves = result_liquidation[0]
-  return_stability = result_liquidation[1]
-  debt_liquidated = result_liquidation[2]
-  ether_liquidated = result_liquidation[3]
-  liquidation_gain = result_liquidation[4]
-  airdrop_gain = result_liquidation[5]
-  n_liquidate = result_liquidation[6]
-
-#close troves
-  result_close = close_troves(troves, index, price_LUSD_previous)
-  troves = result_close[0]
-  n_close = result_close[1]
-  #if n_close<0:
-  #  break
-
-#adjust troves
-  result_adjustment = adjust_troves(troves, index)
-  troves = result_adjustment[0]
-  issuance_LUSD_adjust = result_adjustment[1]
-
-#open troves
-  result_open = open_troves(troves, index, price_LUSD_previous)
-  troves = result_open[0]
-  n_open = result_open[1]  
-  issuance_LUSD_open = result_open[2]
-
-#Stability Pool
-  stability_pool = stability_update(data.loc[index-1,'stability'], return_stability, index)[0]
+    discount=age/period
+    price_LQTY_current = discount*c.PE_ratio*annualized_earning/c.LQTY_total_supply
 
-#Calculating Price, Liquidity Pool, and Redemption
-  result_price = price_stabilizer(troves, index, data, stability_pool, n_open)
-  price_LUSD_current = result_price[0]
-  liquidity_pool = result_price[1]
-  troves = result_price[2]
-  issuance_LUSD_stabilizer = result_price[3]
-  redemption_fee = result_price[4]
-  n_redempt = result_price[5]
-  redemption_pool = result_price[6]
-  n_open=result_price[7]
-  if liquidity_pool<0:
-    break
+  MC_LQTY_current = price_LQTY_current * quantity
+  return[price_LQTY_current, annualized_earning, MC_LQTY_current]
 
-#LQTY Market
-  result_LQTY = LQTY_market(index, data)
-  price_LQTY_current = result_LQTY[0]
-  annualized_earning = result_LQTY[1]
-  MC_LQTY_current = result_LQTY[2]
 
-#Summary
-  issuance_fee = price_LUSD_current * (issuance_LUSD_adjust + issuance_LUSD_open + issuance_LUSD_stabilizer)
-  n_troves = troves.shape[0]
-  supply_LUSD = troves['Supply'].sum()
-  if index >= month:
-    price_LQTY.append(price_LQTY_current)
-
-  new_row = {"Price_LUSD":float(price_LUSD_current), "Price_Ether":float(price_ether_current), "n_open":float(n_open), "n_close":float(n_close), 
-             "n_liquidate":float(n_liquidate), "n_redempt": float(n_redempt), "n_troves":float(n_troves),
-              "stability":float(stability_pool), "liquidity":float(liquidity_pool), "redemption_pool":float(redemption_pool), "supply_LUSD":float(supply_LUSD),
-             "issuance_fee":float(issuance_fee), "redemption_fee":float(redemption_fee),
-             "airdrop_gain":float(airdrop_gain), "liquidation_gain":float(liquidation_gain), "return_stability":float(return_stability), 
-             "annualized_earning":float(annualized_earning), "MC_LQTY":float(MC_LQTY_current), "price_LQTY":float(price_LQTY_current)
-             }
-  data = data.append(new_row, ignore_index=True)
-  if price_LUSD_current < 0:
-    break
-
-"""#**Exhibition**"""
-
-data
-
-def linevis(data, measure):
-  fig = px.line(data, x=data.index/720, y=measure, title= measure+' dynamics')
-  fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['Price_LUSD'], name="LUSD Price"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['Price_Ether'], name="Ether Price"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Price Dynamics of LUSD and Ether"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="LUSD Price", secondary_y=False)
-fig.update_yaxes(title_text="Ether Price", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_troves'], name="Number of Troves"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['supply_LUSD'], name="LUSD Supply"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Trove Numbers and LUSD Supply"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Number of Troves", secondary_y=False)
-fig.update_yaxes(title_text="LUSD Supply", secondary_y=True)
-fig.show()
-
-fig = make_subplots(rows=2, cols=1)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_open'], name="Number of Troves Opened", mode='markers'),
-    row=1, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_close'], name="Number of Troves Closed", mode='markers'),
-    row=2, col=1, secondary_y=False
-)
-fig.update_layout(
-    title_text="Dynamics of Number of Troves Opened and Closed"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Troves Opened", row=1, col=1)
-fig.update_yaxes(title_text="Troves Closed", row=2, col=1)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_liquidate'], name="Number of Liquidated Troves", mode='markers'),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_redempt'], name="Number of Redempted Troves", mode='markers'),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Dynamics of Number of Liquidated and Redempted Troves"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Number of Liquidated Troves", secondary_y=False)
-fig.update_yaxes(title_text="Number of Redempted Troves", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['liquidity'], name="Liquidity Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['stability'], name="Stability Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=100*data['redemption_pool'], name="100*Redemption Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['return_stability'], name="Return of Stability Pool"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Size of Pools", secondary_y=False)
-fig.update_yaxes(title_text="Return", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['airdrop_gain'], name="Airdrop Gain"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['liquidation_gain'], name="Liquidation Gain"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Airdrop and Liquidation Gain"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Airdrop Gain", secondary_y=False)
-fig.update_yaxes(title_text="Liquidation Gain", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['issuance_fee'], name="Issuance Fee"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['redemption_fee'], name="Redemption Fee"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Issuance Fee and Redemption Fee"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Issuance Fee", secondary_y=False)
-fig.update_yaxes(title_text="Redemption Fee", secondary_y=True)
-fig.show()
-
-#linevis(data, 'annualized_earning')
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['price_LQTY'], name="LQTY Price"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['MC_LQTY'], name="LQTY Market Cap"),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of the Price and Market Cap of LQTY"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="LQTY Price", secondary_y=False)
-fig.update_yaxes(title_text="LQTY Market Cap", secondary_y=True)
-fig.show()
-
-def trove_histogram(measure):
-  fig = px.histogram(troves, x=measure, title='Distribution of '+measure, nbins=25)
-  fig.show()
-
-troves
-
-trove_histogram('Ether_Quantity')
-trove_histogram('CR_initial')
-trove_histogram('Supply')
-trove_histogram('Rational_inattention')
-trove_histogram('CR_current')
-
-import matplotlib.pyplot as plt
-plt.plot(troves["Ether_Quantity"])
-plt.show()
-
-plt.plot(troves["CR_initial"])
-plt.show()
-
-plt.plot(troves["Supply"])
-plt.show()
-
-plt.plot(troves["CR_current"])
-plt.show()
-
-data.describe()
-
-"""new policy function
-
-issuance fee = redemption fee = base rate
-
-#**Simulation with Policy Function**
-"""
-
-#Defining Initials
-initials = {"Price_LUSD":[1.00], "Price_Ether":[price_ether_initial], "n_open":[initial_open], "n_close":[0], "n_liquidate": [0], "n_redempt":[0], 
-            "n_troves":[initial_open], "stability":[0], "liquidity":[0], "redemption_pool":[0],
-            "supply_LUSD":[0],  "return_stability":[initial_return], "airdrop_gain":[0], "liquidation_gain":[0],  "issuance_fee":[0], "redemption_fee":[0],
-            "price_LQTY":[price_LQTY_initial], "MC_LQTY":[0], "annualized_earning":[0], "base_rate":[base_rate_initial]}
-data2 = pd.DataFrame(initials)
-troves2= pd.DataFrame({"Ether_Price":[], "Ether_Quantity":[], "CR_initial":[], 
-              "Supply":[], "Rational_inattention":[], "CR_current":[]})
-result_open = open_troves(troves2, 0, data2['Price_LUSD'][0])
-troves2 = result_open[0]
-issuance_LUSD_open = result_open[2]
-data2.loc[0,'issuance_fee'] = issuance_LUSD_open * initials["Price_LUSD"][0]
-data2.loc[0,'supply_LUSD'] = troves2["Supply"].sum()
-data2.loc[0,'liquidity'] = 0.5*troves2["Supply"].sum()
-data2.loc[0,'stability'] = 0.5*troves2["Supply"].sum()
-
-#Simulation Process
-for index in range(1, n_sim):
+# Simulation Program
+
+class Simulation:
+  def __init__(self, config, paths=None, policy=None, out=None, row_group=4096, profiler=None,
+               precision="float64", spill=None, drop_derived=False):
+    #with out (a .parquet or .arrow path) the steps are streamed there in row groups instead of kept in memory,
+    #with spill (a directory) likewise to raw files that the result maps back, see sink.SpillSink.
+    #precision float32 halves the float metrics and drop_derived leaves out the derived ones
+    #with a PhaseProfiler every phase of every step is timed
+    self.config = config
+    self.policy = make_policy(config) if policy is None else policy
+    if paths is None:
+      paths = exogenous_paths(config, lazy=True)
+    self.paths = paths
+    self.streams = Streams(config.seed)
+    self.price_ether = paths["price_ether"]
+    self.natural_rate = paths["natural_rate"]
+    #the exogenous LQTY price of the first month; the endogenous one after it is only recorded
+    self.price_LQTY = list(paths["price_LQTY"])
+    self.rate_issuance = config.rate_issuance
+    self.rate_redemption = config.rate_redemption
+    self.price_ether_current = self.price_ether[0]
+    self.troves = TroveStore(capacity=max(1024, config.initial_troves))
+    self.watch = BandWatch(watch_width(config))
+    #adaptive time steps, see quiet_step
+    self.quiet_liquidate = self.quiet_adjust = False
+    self.bounds = None
+    self.quiet_steps = 0
+    self.index = 0
+    #steps the system had been running at step 0, past the bootstrap branches when warm-started from a snapshot
+    self.age = 0
+    self.stopped = False
+    self.profiler = profiler
+    self.call = call_phase
+    if profiler is not None:
+      profiler.attach(self)
+      profiler.begin(0)
+      self.call = profiler.call
+
+    #Defining Initials
+    base_rate = self.policy.initial(self)
+    snapshot = None
+    if config.trove_snapshot:
+      from .snapshot import load_snapshot, snapshot_age, snapshot_population
+      snapshot, troves = load_snapshot(config.trove_snapshot)
+      self.age = snapshot_age(snapshot)
+      self.troves.extend(**snapshot_population(config, troves, self.price_ether[0], self.streams.path("snapshot")))
+      n_open, issuance_LUSD_open = 0, 0
+    elif config.initial_troves:
+      population = steady_population(config, config.initial_troves, self.price_ether[0], self.streams.path("population"))
+      self.troves.extend(**population)
+      n_open, issuance_LUSD_open = 0, 0
+    else:
+      n_open, issuance_LUSD_open = self.call("open", open_troves, self, 0, 1.00)
+    supply = self.troves.total_supply
+    stability = 0.5*supply if snapshot is None else min(supply, float(snapshot.get("stability_pool", 0.5*supply)))
+    initials = {"Price_LUSD": 1.00, "Price_Ether": self.price_ether[0], "n_open": n_open,
+                "n_close": 0, "n_liquidate": 0, "n_redempt": 0, "n_troves": len(self.troves),
+                "stability": stability, "liquidity": supply - stability, "redemption_pool": 0, "supply_LUSD": supply,
+                "return_stability": config.initial_return, "airdrop_gain": 0, "liquidation_gain": 0,
+                "issuance_fee": issuance_LUSD_open * 1.00, "redemption_fee": 0,
+                "price_LQTY": config.price_LQTY_initial, "MC_LQTY": config.price_LQTY_initial * quantity_LQTY(self.age),
+                "annualized_earning": 0, "base_rate": base_rate}
+    recorded = [name for name in columns if not (drop_derived and name in derived)]
+    sink = None
+    if out is not None:
+      from .sink import StepSink
+      sink = StepSink(out, step_schema(recorded, precision), row_group=row_group)
+    elif spill is not None:
+      from .sink import SpillSink
+      sink = SpillSink(spill, step_schema(recorded, precision), row_group=row_group)
+    self.data = StepRecorder(config.n_sim, recorded, windows=(day, month), tracked=window_columns, sink=sink,
+                             precision=precision)
+    if config.initial_troves or snapshot is not None:
+      #a history of stability pool gains that earns the initial return, so the return does not collapse after a day
+      airdrop = config.price_LQTY_initial * config.quantity_LQTY_airdrop
+      gain = config.initial_return * initials["stability"] / (365*day)
+      self.data.seed_window("airdrop_gain", airdrop)
+      self.data.seed_window("liquidation_gain", max(0.0, gain - airdrop))
+    if self.age >= month:
+      #a month of fees whose earnings price LQTY at its initial price, which is endogenous from the first step
+      earning = config.price_LQTY_initial * config.LQTY_total_supply / (config.PE_ratio * (self.age + 1) / period)
+      self.data.seed_window("issuance_fee", earning * 30 / (365*month))
+    self.data.record(initials)
+    self.depositors = None
+    if config.n_depositors:
+      self.depositors = DepositorPool(capacity=config.n_depositors)
+      self.depositors.add(initial_deposits(initials["stability"], config.n_depositors, self.streams.path("depositors")))
+
+  @property
+  def done(self):
+    return self.stopped or self.index >= self.config.n_sim - 1
+
+  def quiet_step(self, index):
+    #sets quiet_liquidate and quiet_adjust: whether no trove can be liquidated, or leave its band, at step index.
+    #The ether prices that keep the troves quiet are computed from the whole store after every step that was not
+    #quiet and narrowed by the troves opened or changed since; they hold up to the first step whose price leaves
+    #them, or for liquidations that is refined, so the steps before it do not scan the store
+    troves = self.troves
+    if self.bounds is None or self.redistributions != troves.redistributions:
+      self.bounds = list(quiet_prices(troves))
+      self.redistributions = troves.redistributions
+      self.horizons = [self.quiet_until(index, self.bounds[0], np.inf, True), self.quiet_until(index, *self.bounds[1:])]
+    else:
+      changed = troves.recent[self.seen:] if troves.recent is self.recent else troves.recent
+      if changed:
+        positions = troves.position[np.concatenate(changed)]
+        floor, low, high = quiet_prices(troves, positions[positions >= 0])
+        if floor > self.bounds[0]:
+          self.bounds[0] = floor
+          self.horizons[0] = self.quiet_until(index, floor, np.inf, True)
+        if low > self.bounds[1] or high < self.bounds[2]:
+          self.bounds[1:] = max(low, self.bounds[1]), min(high, self.bounds[2])
+          self.horizons[1] = self.quiet_until(index, *self.bounds[1:])
+    #troves.recent is replaced when the BandWatch takes it
+    self.recent, self.seen = troves.recent, len(troves.recent)
+    self.quiet_liquidate = index < self.horizons[0]
+    self.quiet_adjust = index < self.horizons[1]
+    self.quiet_steps += self.quiet_liquidate and self.quiet_adjust
+    if not (self.quiet_liquidate and self.quiet_adjust):
+      self.bounds = None
+
+  def quiet_until(self, index, low, high, refined=False):
+    #the first step from index whose ether price is not strictly between low and high or, with refined, is refined
+    c = self.config
+    return first_crossing(self.price_ether[:c.n_sim], index, low*(1 + BandWatch.margin), high*(1 - BandWatch.margin),
+                          c.refine_move if refined and c.substeps > 1 else 0)
+
+  def bridge(self, index):
+    #the ether prices at the substeps of step index when an adaptive simulation refines it, otherwise None;
+    #sd_ether is taken as the volatility within the hour
+    c = self.config
+    if c.time_step != "adaptive" or c.substeps <= 1:
+      return None
+    start, end = self.price_ether[index-1], self.price_ether[index]
+    if abs(np.log(end/start)) <= c.refine_move:
+      return None
+    return bridge_prices(start, end, c.sd_ether, c.substeps, self.streams.step("bridge", index))
+
+  def step(self):
+    index = self.index + 1
+    data = self.data
+    troves = self.troves
+    call = self.call
+    if self.profiler is not None:
+      self.profiler.begin(index)
+    if self.config.time_step == "adaptive":
+      self.quiet_step(index)
 #exogenous ether price input
-  price_ether_current = price_ether[index]
-  troves2['Ether_Price'] = price_ether_current
-  price_LUSD_previous = data2.loc[index-1,'Price_LUSD']
-  price_LQTY_previous = data2.loc[index-1,'price_LQTY']
+    price_ether_current = self.price_ether[index]
+    self.price_ether_current = price_ether_current
+    price_LUSD_previous = data.last('Price_LUSD')
 
 #policy function determines base rate
-  base_rate_current = 0.98 * data2.loc[index-1,'base_rate'] + 0.5*(data2.loc[index-1,'redemption_pool']/troves2['Supply'].sum())
-  rate_issuance = base_rate_current
-  rate_redemption = base_rate_current
+    base_rate_current = call("policy", self.policy.update, self, index)
 
 #trove liquidation & return of stability pool
-  result_liquidation = liquidate_troves(troves2, index, data2)
-  troves2 = result_liquidation[0]
-  return_stability = result_liquidation[1]
-  debt_liquidated = result_liquidation[2]
-  ether_liquidated = result_liquidation[3]
-  liquidation_gain = result_liquidation[4]
-  airdrop_gain = result_liquidation[5]
-  n_liquidate = result_liquidation[6]
+    [return_stability, debt_liquidated, ether_liquidated, liquidation_gain, airdrop_gain, n_liquidate] = call("liquidate", liquidate_troves, self, index)
 
 #close troves
-  result_close = close_troves(troves2, index, price_LUSD_previous)
-  troves2 = result_close[0]
-  n_close = result_close[1]
-  #if n_close<0:
-  #  break
+    [n_close] = call("close", close_troves, self, index, price_LUSD_previous)
 
 #adjust troves
-  result_adjustment = adjust_troves(troves2, index)
-  troves2 = result_adjustment[0]
-  issuance_LUSD_adjust = result_adjustment[1]
+    [issuance_LUSD_adjust] = call("adjust", adjust_troves, self, index)
 
 #open troves
-  result_open = open_troves(troves2, index, price_LUSD_previous)
-  troves2 = result_open[0]
-  n_open = result_open[1]  
-  issuance_LUSD_open = result_open[2]
+    [n_open, issuance_LUSD_open] = call("open", open_troves, self, index, price_LUSD_previous)
 
 #Stability Pool
-  stability_pool = stability_update(data2.loc[index-1,'stability'], return_stability, index)[0]
+    [stability_pool] = call("stability", stability_update, self, data.last('stability'), return_stability, index)
 
 #Calculating Price, Liquidity Pool, and Redemption
-  result_price = price_stabilizer(troves2, index, data2, stability_pool, n_open)
-  price_LUSD_current = result_price[0]
-  liquidity_pool = result_price[1]
-  troves2 = result_price[2]
-  issuance_LUSD_stabilizer = result_price[3]
-  redemption_fee = result_price[4]
-  n_redempt = result_price[5]
-  redemption_pool = result_price[6]
-  n_open=result_price[7]
-  if liquidity_pool<0:
-    break
+    [price_LUSD_current, liquidity_pool, issuance_LUSD_stabilizer, redemption_fee, n_redempt, redemption_pool, n_open] = call("price_stabilizer", price_stabilizer, self, index, stability_pool, n_open)
+    self.index = index
+    if liquidity_pool<0:
+      self.stopped = True
+      return False
 
 #LQTY Market
-  result_LQTY = LQTY_market(index, data2)
-  price_LQTY_current = result_LQTY[0]
-  annualized_earning = result_LQTY[1]
-  MC_LQTY_current = result_LQTY[2]
+    [price_LQTY_current, annualized_earning, MC_LQTY_current] = call("LQTY_market", LQTY_market, self, index)
 
 #Summary
-  issuance_fee = price_LUSD_current * (issuance_LUSD_adjust + issuance_LUSD_open + issuance_LUSD_stabilizer)
-  n_troves = troves2.shape[0]
-  supply_LUSD = troves2['Supply'].sum()
-  if index >= month:
-    price_LQTY.append(price_LQTY_current)
-
-  new_row = {"Price_LUSD":float(price_LUSD_current), "Price_Ether":float(price_ether_current), "n_open":float(n_open), "n_close":float(n_close), 
-             "n_liquidate":float(n_liquidate), "n_redempt": float(n_redempt), "n_troves":float(n_troves),
-              "stability":float(stability_pool), "liquidity":float(liquidity_pool), "redemption_pool":float(redemption_pool), "supply_LUSD":float(supply_LUSD),
-             "issuance_fee":float(issuance_fee), "redemption_fee":float(redemption_fee),
-             "airdrop_gain":float(airdrop_gain), "liquidation_gain":float(liquidation_gain), "return_stability":float(return_stability), 
-             "annualized_earning":float(annualized_earning), "MC_LQTY":float(MC_LQTY_current), "price_LQTY":float(price_LQTY_current), 
-             "base_rate":float(base_rate_current)}
-  data2 = data2.append(new_row, ignore_index=True)
-  if price_LUSD_current < 0:
-    break
-
-data2
-
-"""#**Exhibition Part 2**"""
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['Price_LUSD'], name="LUSD Price"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['Price_Ether'], name="Ether Price"),
-    secondary_y=True,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['Price_LUSD'], name="LUSD Price New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Price Dynamics of LUSD and Ether"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="LUSD Price", secondary_y=False)
-fig.update_yaxes(title_text="Ether Price", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_troves'], name="Number of Troves"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['supply_LUSD'], name="LUSD Supply"),
-    secondary_y=True,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['n_troves'], name="Number of Troves New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['supply_LUSD'], name="LUSD Supply New", line = dict(dash='dot')),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Trove Numbers and LUSD Supply"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Number of Troves", secondary_y=False)
-fig.update_yaxes(title_text="LUSD Supply", secondary_y=True)
-fig.show()
-
-fig = make_subplots(rows=2, cols=2)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_open'], name="Number of Troves Opened", mode='markers'),
-    row=1, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_close'], name="Number of Troves Closed", mode='markers'),
-    row=2, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['n_open'], name="Number of Troves Opened New", mode='markers'),
-    row=1, col=2, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['n_close'], name="Number of Troves Closed New", mode='markers'),
-    row=2, col=2, secondary_y=False
-)
-fig.update_layout(
-    title_text="Dynamics of Number of Troves Opened and Closed"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Troves Opened", row=1, col=1)
-fig.update_yaxes(title_text="Troves Closed", row=2, col=1)
-fig.show()
-
-fig = make_subplots(rows=2, cols=1)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_liquidate'], name="Number of Liquidated Troves"),
-    row=1, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['n_redempt'], name="Number of Redempted Troves"),
-    row=2, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['n_liquidate'], name="Number of Liquidated Troves New", line = dict(dash='dot')),
-    row=1, col=1, secondary_y=False
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['n_redempt'], name="Number of Redempted Troves New", line = dict(dash='dot')),
-    row=2, col=1, secondary_y=False
-)
-fig.update_layout(
-    title_text="Dynamics of Number of Liquidated and Redempted Troves"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Troves Liquidated", row=1, col=1)
-fig.update_yaxes(title_text="Troves Redempted", row=2, col=1)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['liquidity'], name="Liquidity Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['stability'], name="Stability Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=100*data['redemption_pool'], name="100*Redemption Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['liquidity'], name="Liquidity Pool New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['stability'], name="Stability Pool New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=100*data2['redemption_pool'], name="100*Redemption Pool New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Size of Pools", secondary_y=False)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['return_stability'], name="Return of Stability Pool"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['return_stability'], name="Return of Stability Pool New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Return", secondary_y=False)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['airdrop_gain'], name="Airdrop Gain"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['liquidation_gain'], name="Liquidation Gain"),
-    secondary_y=True,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['airdrop_gain'], name="Airdrop Gain New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['liquidation_gain'], name="Liquidation Gain New", line = dict(dash='dot')),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of Airdrop and Liquidation Gain"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Airdrop Gain", secondary_y=False)
-fig.update_yaxes(title_text="Liquidation Gain", secondary_y=True)
-fig.show()
-
-fig = make_subplots(rows=2, cols=1)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['issuance_fee'], name="Issuance Fee"),
-    row=1, col=1
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['redemption_fee'], name="Redemption Fee"),
-    row=2, col=1
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['issuance_fee'], name="Issuance Fee New", line = dict(dash='dot')),
-    row=1, col=1
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['redemption_fee'], name="Redemption Fee New", line = dict(dash='dot')),
-    row=2, col=1
-)
-fig.update_layout(
-    title_text="Dynamics of Issuance Fee and Redemption Fee"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Issuance Fee", secondary_y=False, row=1, col=1)
-fig.update_yaxes(title_text="Redemption Fee", secondary_y=False, row=2, col=1)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['annualized_earning'], name="Annualized Earning"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['annualized_earning'], name="Annualized Earning New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Dynamics of Annualized Earning"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Annualized Earning", secondary_y=False)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['price_LQTY'], name="LQTY Price"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=data['MC_LQTY'], name="LQTY Market Cap"),
-    secondary_y=True,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['price_LQTY'], name="LQTY Price New", line = dict(dash='dot')),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['MC_LQTY'], name="LQTY Market Cap New", line = dict(dash='dot')),
-    secondary_y=True,
-)
-fig.update_layout(
-    title_text="Dynamics of the Price and Market Cap of LQTY"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="LQTY Price", secondary_y=False)
-fig.update_yaxes(title_text="LQTY Market Cap", secondary_y=True)
-fig.show()
-
-fig = make_subplots(specs=[[{"secondary_y": True}]])
-fig.add_trace(
-    go.Scatter(x=data.index/720, y=[0.01] * n_sim, name="Base Rate"),
-    secondary_y=False,
-)
-fig.add_trace(
-    go.Scatter(x=data2.index/720, y=data2['base_rate'], name="Base Rate New"),
-    secondary_y=False,
-)
-fig.update_layout(
-    title_text="Dynamics of Issuance Fee and Redemption Fee"
-)
-fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
-fig.update_yaxes(title_text="Issuance Fee", secondary_y=False)
-fig.update_yaxes(title_text="Redemption Fee", secondary_y=True)
-fig.show()
-
-def trove2_histogram(measure):
-  fig = px.histogram(troves2, x=measure, title='Distribution of '+measure, nbins=25)
-  fig.show()
-
-trove2_histogram('Ether_Quantity')
-trove2_histogram('CR_initial')
-trove2_histogram('Supply')
-trove2_histogram('Rational_inattention')
-trove2_histogram('CR_current')
\ No newline at end of file
+    issuance_fee = price_LUSD_current * (issuance_LUSD_adjust + issuance_LUSD_open + issuance_LUSD_stabilizer)
+    n_troves = len(troves)
+    supply_LUSD = troves.total_supply
+
+    new_row = {"Price_LUSD":float(price_LUSD_current), "Price_Ether":float(price_ether_current), "n_open":n_open, "n_close":n_close,
+               "n_liquidate":n_liquidate, "n_redempt":n_redempt, "n_troves":n_troves,
+               "stability":float(stability_pool), "liquidity":float(liquidity_pool), "redemption_pool":float(redemption_pool), "supply_LUSD":float(supply_LUSD),
+               "issuance_fee":float(issuance_fee), "redemption_fee":float(redemption_fee),
+               "airdrop_gain":float(airdrop_gain), "liquidation_gain":float(liquidation_gain), "return_stability":float(return_stability),
+               "annualized_earning":float(annualized_earning), "MC_LQTY":float(MC_LQTY_current), "price_LQTY":float(price_LQTY_current),
+               "base_rate":float(base_rate_current)}
+    call("record", data.record, new_row)
+    if price_LUSD_current < 0:
+      self.stopped = True
+      return False
+    return True
+
+  def branch(self, policy=None, copy=True, **overrides):
+    #a simulation that continues from the current step with some config fields, or the fee policy, changed.
+    #exogenous paths that change are spliced in after the current step, see splice_paths. The branch is a
+    #deep copy that only shares the exogenous paths, the streams and the policy with this simulation; with
+    #copy=False this simulation becomes the branch, e.g. in a process forked after the prefix, whose memory is
+    #already a copy-on-write copy of the parent's
+    if self.data.sink is not None:
+      raise ValueError("runs that stream their steps to a file cannot be branched")
+    parent = self.config
+    config = replace(parent, **overrides)
+    if config.n_sim != parent.n_sim:
+      raise ValueError("a branch records as many steps as its parent")
+    if config.n_depositors != parent.n_depositors:
+      raise ValueError("a branch keeps the depositors of its parent")
+    child = self
+    if copy:
+      #read-only or stateless parts are shared
+      shared = {id(x): x for x in (self.paths, self.price_ether, self.natural_rate, self.streams, self.policy)}
+      shared.update({id(self.profiler): None, id(self.call): call_phase})
+      child = deepcopy(self, shared)
+    child.profiler = None
+    child.call = call_phase
+    child.bounds = None
+
+    if path_key(config) != path_key(parent):
+      child.paths = splice_paths(self.paths, exogenous_paths(config), self.index)
+      child.price_ether = child.paths["price_ether"]
+      child.natural_rate = child.paths["natural_rate"]
+      if self.index + 1 < len(child.paths["price_LQTY"]):
+        child.price_LQTY = list(child.paths["price_LQTY"])
+    if config.seed != parent.seed:
+      child.streams = Streams(config.seed)
+    if watch_width(config) != watch_width(parent):
+      child.watch = BandWatch(watch_width(config))
+    for name in ("rate_issuance", "rate_redemption"):
+      if name in overrides:
+        setattr(child, name, overrides[name])
+    child.config = config
+    if policy is None and config.fee_policy != parent.fee_policy:
+      policy = make_policy(config)
+    if policy is not None:
+      child.policy = policy
+      policy.initial(child)
+    return child
+
+  def run(self, checkpoint_every=None, checkpoint_path=None):
+    #with checkpoint_every, the state is saved to checkpoint_path every that many steps
+    if checkpoint_every:
+      from .checkpoint import save_checkpoint
+    while not self.done:
+      self.step()
+      if checkpoint_every and self.index % checkpoint_every == 0:
+        save_checkpoint(self, checkpoint_path)
+    return self.result()
+
+  def result(self):
+    if self.profiler is not None:
+      self.profiler.stop()
+    if self.data.sink is not None:
+      self.data.close()
+      data = None
+      if hasattr(self.data.sink, "directory"):
+        from .sink import read_spill
+        data = read_spill(self.data.sink.directory)
+        data.pop("step")
+      return SimulationResult(self.config, data, self.troves, self.policy, self.depositors)
+    return SimulationResult(self.config, self.data.to_frame(), self.troves, self.policy, self.depositors)
+
+
+def run(config=None, paths=None, policy=None, checkpoint_every=None, checkpoint_path=None, out=None, profiler=None,
+        precision="float64", spill=None, drop_derived=False):
+  if config is None:
+    config = SimulationConfig()
+  return Simulation(config, paths, policy, out=out, profiler=profiler, precision=precision, spill=spill,
+                    drop_derived=drop_derived).run(checkpoint_every, checkpoint_path)
+
+
+#the config and paths of a run_lockstep, inherited by forked workers
+_lockstep = None
+
+
+def run_variant(policy):
+  #one policy of run_lockstep, in a worker forked once the paths were built
+  config, paths = _lockstep
+  return Simulation(config, paths, policy).run()
+
+
+def run_lockstep(config, policies, paths=None, workers=None):
+  #one simulation per policy over the same exogenous paths and random streams, so that every policy sees the
+  #same prices and shocks. The simulations do not interact: with several workers they run in processes forked
+  #once the paths are built, which share them copy-on-write, otherwise one after another in this process
+  global _lockstep
+  if paths is None:
+    paths = exogenous_paths(config)
+  workers = min(len(policies), workers or os.cpu_count() or 1)
+  if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+    return [Simulation(config, paths, policy).run() for policy in policies]
+  _lockstep = (config, paths)
+  try:
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+      return pool.map(run_variant, policies, chunksize=1)
+  finally:
+    _lockstep = None
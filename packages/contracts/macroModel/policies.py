@@ -0,0 +1,71 @@
+"""Fee policies
+
+A fee policy sets the issuance and redemption fee rates of a simulation at
+the start of every step. initial returns the base rate recorded for step 0
+and update the one recorded for each following step; both may read the
+simulation's recorded history (sim.data) and trove pool (sim.troves), and
+set sim.rate_issuance and sim.rate_redemption. Policies keep no state of
+their own, so one instance can drive any number of simulations.
+"""
+
+from abc import ABC, abstractmethod
+
+
+class FeePolicy(ABC):
+  name = "policy"
+
+  @abstractmethod
+  def initial(self, sim):
+    pass
+
+  @abstractmethod
+  def update(self, sim, index):
+    pass
+
+
+class FixedFee(FeePolicy):
+  #baseline: fees stay at the configured rates
+  name = "fixed"
+
+  def __init__(self, rate_issuance=None, rate_redemption=None):
+    self.rate_issuance = rate_issuance
+    self.rate_redemption = rate_redemption
+
+  def initial(self, sim):
+    if self.rate_issuance is not None:
+      sim.rate_issuance = self.rate_issuance
+    if self.rate_redemption is not None:
+      sim.rate_redemption = self.rate_redemption
+    return sim.rate_issuance
+
+  def update(self, sim, index):
+    return sim.rate_issuance
+
+
+class BaseRate(FeePolicy):
+  #issuance fee = redemption fee = base rate, which decays every step and is pushed up by redemptions
+  name = "base_rate"
+
+  def __init__(self, decay=0.98, redemption_weight=0.5, base_rate_initial=None):
+    self.decay = decay
+    self.redemption_weight = redemption_weight
+    self.base_rate_initial = base_rate_initial
+
+  def initial(self, sim):
+    if self.base_rate_initial is not None:
+      return self.base_rate_initial
+    return sim.config.base_rate_initial
+
+  def update(self, sim, index):
+    data = sim.data
+    base_rate_current = self.decay * data.last('base_rate') + self.redemption_weight*(data.last('redemption_pool')/sim.troves.total_supply)
+    sim.rate_issuance = base_rate_current
+    sim.rate_redemption = base_rate_current
+    return base_rate_current
+
+
+fee_policies = {"fixed": FixedFee, "base_rate": BaseRate}
+
+
+def make_policy(config):
+  return fee_policies[config.fee_policy]()
@@ -0,0 +1,114 @@
+"""Phase profiler
+
+Per-step instrumentation of the phases of Simulation.step: wall time, trove
+rows touched (opened, changed or removed, from TroveStore.touched) and,
+optionally, memory allocated, recorded into preallocated arrays with one row
+per step. summary() aggregates them per phase and write_trace() exports every
+phase of every step in the Chrome trace event format, for chrome://tracing or
+https://ui.perfetto.dev.
+
+    profiler = PhaseProfiler()
+    result = run(SimulationConfig(), profiler=profiler)
+    print(profiler.summary())
+    profiler.write_trace("trace.json")
+
+Without a profiler a simulation calls its phases through call_phase, which
+only forwards the call. Allocation tracking uses tracemalloc and slows the
+run down noticeably, so it is off by default.
+"""
+
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+phases = ("policy", "liquidate", "close", "adjust", "open", "stability", "price_stabilizer", "LQTY_market", "record")
+
+
+def call_phase(name, phase, *args):
+  return phase(*args)
+
+
+class PhaseProfiler:
+  def __init__(self, allocations=False):
+    self.allocations = allocations
+    self.phase_index = {name: i for i, name in enumerate(phases)}
+    self.troves = None
+    self.row = -1
+
+  def attach(self, sim):
+    n = sim.config.n_sim
+    self.troves = sim.troves
+    #nanoseconds since the profiler was attached, -1 for phases that did not run
+    self.start = np.full((n, len(phases)), -1, dtype=np.int64)
+    self.wall = np.zeros((n, len(phases)), dtype=np.int64)
+    self.rows = np.zeros((n, len(phases)), dtype=np.int64)
+    #bytes allocated above the level at the start of the phase, at its peak
+    self.allocated = np.zeros((n, len(phases)), dtype=np.int64)
+    self.origin = time.perf_counter_ns()
+    if self.allocations and not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+  def begin(self, index):
+    self.row = index
+
+  def call(self, name, phase, *args):
+    p = self.phase_index[name]
+    touched = self.troves.touched
+    if self.allocations:
+      tracemalloc.reset_peak()
+      before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter_ns()
+    result = phase(*args)
+    end = time.perf_counter_ns()
+    if self.allocations:
+      self.allocated[self.row, p] = tracemalloc.get_traced_memory()[1] - before
+    self.start[self.row, p] = start - self.origin
+    self.wall[self.row, p] = end - start
+    self.rows[self.row, p] = self.troves.touched - touched
+    return result
+
+  def stop(self):
+    if self.allocations and tracemalloc.is_tracing():
+      tracemalloc.stop()
+
+  def summary(self):
+    import pandas as pd
+    ran = self.start >= 0
+    total = self.wall.sum()
+    table = {}
+    for name, p in self.phase_index.items():
+      steps = np.flatnonzero(ran[:, p])
+      if len(steps) == 0:
+        continue
+      wall = self.wall[steps, p] / 1e3
+      row = {"steps": len(steps), "total_ms": wall.sum() / 1e3, "mean_us": wall.mean(),
+             "p50_us": np.percentile(wall, 50), "p99_us": np.percentile(wall, 99), "max_us": wall.max(),
+             "share": wall.sum() * 1e3 / total if total else 0.0,
+             "rows_total": int(self.rows[steps, p].sum()), "rows_per_step": self.rows[steps, p].mean()}
+      if self.allocations:
+        allocated = self.allocated[steps, p] / 1024
+        row.update({"alloc_kb_mean": allocated.mean(), "alloc_kb_max": allocated.max()})
+      table[name] = row
+    return pd.DataFrame.from_dict(table, orient="index")
+
+  def trace_events(self, pid=0, tid=0):
+    events = []
+    for step in np.flatnonzero((self.start >= 0).any(axis=1)):
+      ran = np.flatnonzero(self.start[step] >= 0)
+      begin = self.start[step, ran].min()
+      end = (self.start[step, ran] + self.wall[step, ran]).max()
+      events.append({"name": "step", "cat": "step", "ph": "X", "ts": begin / 1e3, "dur": (end - begin) / 1e3,
+                     "pid": pid, "tid": tid, "args": {"step": int(step)}})
+      for p in ran:
+        args = {"step": int(step), "rows": int(self.rows[step, p])}
+        if self.allocations:
+          args["allocated"] = int(self.allocated[step, p])
+        events.append({"name": phases[p], "cat": "phase", "ph": "X", "ts": self.start[step, p] / 1e3,
+                       "dur": self.wall[step, p] / 1e3, "pid": pid, "tid": tid, "args": args})
+    return events
+
+  def write_trace(self, path):
+    with open(path, "w") as f:
+      json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,133 @@
+"""Step recorder
+
+Preallocated per-step result buffers for the macro model. One typed array per
+metric is allocated up front for all n_sim steps, and trailing-window sums
+(e.g. the last day or month of liquidation gains) are kept up to date with
+ring buffers so that looking them up costs O(1). The pandas DataFrame is
+only built once, by to_frame, after the simulation has finished.
+
+Given a StepSink or a SpillSink, the recorder instead keeps a single row
+group of steps and hands every full group to the sink, so memory no longer
+grows with n_sim. With precision float32 the float metrics are stored in
+half the space; the last row is then also kept at full precision, so that
+what the model reads back with last() does not depend on the precision.
+"""
+
+import numpy as np
+
+#metrics that are counts of troves
+count_columns = ("n_open", "n_close", "n_liquidate", "n_redempt", "n_troves")
+
+
+class RollingSum:
+  def __init__(self, size):
+    self.size = size
+    self.ring = np.zeros(size)
+    self.pos = 0
+    self.total = 0.0
+
+  def push(self, value):
+    self.total += value - self.ring[self.pos]
+    self.ring[self.pos] = value
+    self.pos += 1
+    if self.pos == self.size:
+      #resum once per lap so that rounding errors do not accumulate
+      self.pos = 0
+      self.total = float(self.ring.sum())
+
+
+def column_dtype(name, precision=np.float64):
+  return np.dtype(np.int64) if name in count_columns else np.dtype(precision)
+
+
+def step_schema(columns, precision=np.float64):
+  #schema of the rows a recorder hands to a sink
+  return {"step": np.int64, **{name: column_dtype(name, precision) for name in columns}}
+
+
+class StepRecorder:
+  def __init__(self, n_sim, columns, windows=(), tracked=(), sink=None, precision=np.float64):
+    self.n_sim = n_sim
+    self.n = 0
+    self.sink = sink
+    #step number of the first buffered row; stays 0 without a sink
+    self.start = 0
+    self.size = n_sim if sink is None else min(n_sim, sink.row_group)
+    self.precision = np.dtype(precision).name
+    self.columns = {name: np.zeros(self.size, dtype=column_dtype(name, precision)) for name in columns}
+    #the last row at full precision, when the columns round it
+    self.full = None if self.precision == "float64" else {name: column_dtype(name).type for name in columns}
+    self.latest = {}
+    self.windows = {(name, size): RollingSum(size) for name in tracked for size in windows}
+
+  def __len__(self):
+    return self.n
+
+  def __getitem__(self, name):
+    #recorded steps, or with a sink those not yet handed to it
+    return self.columns[name][:self.n - self.start]
+
+  def last(self, name):
+    if self.full is not None:
+      return self.latest[name]
+    return self.columns[name][self.n - self.start - 1]
+
+  def record(self, row):
+    i = self.n - self.start
+    if i == self.size:
+      self.flush()
+      i = 0
+    for name, column in self.columns.items():
+      column[i] = row[name]
+    if self.full is not None:
+      self.latest = {name: full(row[name]) for name, full in self.full.items()}
+    for (name, size), window in self.windows.items():
+      window.push(row[name])
+    self.n += 1
+
+  def flush(self):
+    #hand the buffered steps to the sink
+    k = self.n - self.start
+    self.sink.write_columns({"step": np.arange(self.start, self.n), **self.columns}, k)
+    self.start = self.n
+
+  def close(self):
+    self.flush()
+    self.sink.close()
+
+  def seed_window(self, name, value):
+    #pretend every window of name has seen value at each of its steps
+    for (tracked, size), window in self.windows.items():
+      if tracked == name:
+        window.ring[:] = value
+        window.total = value * size
+
+  def window_sum(self, name, size):
+    #sum over the last `size` recorded steps
+    return self.windows[(name, size)].total
+
+  def to_frame(self):
+    import pandas as pd
+    return pd.DataFrame({name: column[:self.n] for name, column in self.columns.items()})
+
+  def state(self):
+    #recorded steps and window rings; the totals are kept as they are rather than resummed
+    arrays = {name: self[name].copy() for name in self.columns}
+    for (name, size), window in self.windows.items():
+      arrays[f"window:{name}:{size}"] = np.append(window.ring, [window.pos, window.total])
+    if self.full is not None:
+      arrays["latest"] = np.array([self.latest[name] for name in self.columns], dtype=np.float64)
+    return arrays
+
+  def restore(self, arrays):
+    n = len(arrays[next(iter(self.columns))])
+    for name, column in self.columns.items():
+      column[:n] = arrays[name]
+    self.n = n
+    for (name, size), window in self.windows.items():
+      saved = arrays[f"window:{name}:{size}"]
+      window.ring[:] = saved[:size]
+      window.pos = int(saved[size])
+      window.total = float(saved[size + 1])
+    if self.full is not None:
+      self.latest = {name: full(value) for (name, full), value in zip(self.full.items(), arrays["latest"])}
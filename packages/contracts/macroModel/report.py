@@ -0,0 +1,209 @@
+"""HTML reports
+
+Renders the exhibits of a stored run, or of two runs side by side, into a
+single self-contained HTML file. Every series is downsampled to at most
+max_points points before it is plotted, with largest-triangle-three-buckets
+for levels and min/max bucketing for trove counts, whose spikes matter more
+than their shape. Trove distributions are binned up front, so the size of
+the file depends neither on the run length nor on the number of troves.
+Figures are rendered in parallel over a process pool.
+
+    from macroModel.report import write_report
+    write_report(result, "run.html", compare=result2)
+
+A run is a SimulationResult, a DataFrame of recorded steps, or the path of a
+.csv, .parquet, .arrow or sweep series .npz file. Plotly is only imported by
+the rendering workers.
+"""
+
+from multiprocessing import Pool
+
+import numpy as np
+
+from .macro_model import month
+from .recorder import count_columns
+from .troves import fields
+
+max_points = 1000
+#columns shared by both runs of a comparison, drawn once
+shared_columns = ("Price_Ether",)
+
+
+def trace(column, name, secondary=False, row=1, scale=1):
+  return {"column": column, "name": name, "secondary": secondary, "row": row, "scale": scale}
+
+
+#the figures of reporting.exhibit and reporting.exhibit_comparison
+exhibits = [
+  {"title": "Price Dynamics of LUSD and Ether", "y": ("LUSD Price", "Ether Price"),
+   "traces": [trace("Price_LUSD", "LUSD Price"), trace("Price_Ether", "Ether Price", secondary=True)]},
+  {"title": "Dynamics of Trove Numbers and LUSD Supply", "y": ("Number of Troves", "LUSD Supply"),
+   "traces": [trace("n_troves", "Number of Troves"), trace("supply_LUSD", "LUSD Supply", secondary=True)]},
+  {"title": "Dynamics of Number of Troves Opened and Closed", "rows": 2, "y": ("Troves Opened", "Troves Closed"),
+   "traces": [trace("n_open", "Number of Troves Opened"), trace("n_close", "Number of Troves Closed", row=2)]},
+  {"title": "Dynamics of Number of Liquidated and Redempted Troves", "rows": 2, "y": ("Troves Liquidated", "Troves Redempted"),
+   "traces": [trace("n_liquidate", "Number of Liquidated Troves"), trace("n_redempt", "Number of Redempted Troves", row=2)]},
+  {"title": "Dynamics of Liquidity, Stability and Redemption Pools", "y": ("Size of Pools",),
+   "traces": [trace("liquidity", "Liquidity Pool"), trace("stability", "Stability Pool"),
+              trace("redemption_pool", "100*Redemption Pool", scale=100)]},
+  {"title": "Dynamics of Return of Stability Pool", "y": ("Return",),
+   "traces": [trace("return_stability", "Return of Stability Pool")]},
+  {"title": "Dynamics of Airdrop and Liquidation Gain", "y": ("Airdrop Gain", "Liquidation Gain"),
+   "traces": [trace("airdrop_gain", "Airdrop Gain"), trace("liquidation_gain", "Liquidation Gain", secondary=True)]},
+  {"title": "Dynamics of Issuance Fee and Redemption Fee", "rows": 2, "y": ("Issuance Fee", "Redemption Fee"),
+   "traces": [trace("issuance_fee", "Issuance Fee"), trace("redemption_fee", "Redemption Fee", row=2)]},
+  {"title": "Dynamics of Annualized Earning", "y": ("Annualized Earning",),
+   "traces": [trace("annualized_earning", "Annualized Earning")]},
+  {"title": "Dynamics of the Price and Market Cap of LQTY", "y": ("LQTY Price", "LQTY Market Cap"),
+   "traces": [trace("price_LQTY", "LQTY Price"), trace("MC_LQTY", "LQTY Market Cap", secondary=True)]},
+  {"title": "Dynamics of the Base Rate", "y": ("Base Rate",),
+   "traces": [trace("base_rate", "Base Rate")]},
+]
+
+
+# Downsampling
+
+def lttb(x, y, n_out):
+  #largest-triangle-three-buckets: keeps the first and last point and, from every bucket in between,
+  #the point spanning the largest triangle with the previous kept point and the mean of the next bucket
+  n = len(x)
+  if n <= n_out or n_out < 3:
+    return x, y
+  edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+  keep = np.empty(n_out, dtype=np.int64)
+  keep[0], keep[-1] = 0, n - 1
+  a = 0
+  for b in range(n_out - 2):
+    lo, hi = edges[b], edges[b + 1]
+    nlo, nhi = (edges[b + 1], edges[b + 2]) if b + 2 < n_out - 1 else (n - 1, n)
+    cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+    area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+    a = lo + int(np.argmax(area))
+    keep[b + 1] = a
+  return x[keep], y[keep]
+
+
+def minmax(x, y, n_out):
+  #the smallest and the largest value of each of n_out/2 equal buckets, in step order
+  n = len(x)
+  if n <= n_out or n_out < 2:
+    return x, y
+  k = n_out // 2
+  bucket = np.arange(n) * k // n
+  order = np.lexsort((y, bucket))
+  starts = np.searchsorted(bucket, np.arange(k))
+  ends = np.append(starts[1:], n) - 1
+  keep = np.unique(np.concatenate((order[starts], order[ends])))
+  return x[keep], y[keep]
+
+
+def downsample(column, x, y, n_out=max_points):
+  y = np.asarray(y, dtype=np.float64)
+  if column in count_columns:
+    return minmax(x, y, n_out)
+  return lttb(x, y, n_out)
+
+
+# Inputs
+
+def load_run(run):
+  #(steps DataFrame, trove DataFrame or None) of a result, frame or stored file
+  import pandas as pd
+  if hasattr(run, "data") and hasattr(run, "troves"):
+    if run.data is None:
+      raise ValueError("the steps of this run were streamed to a file, report on that file instead")
+    return run.data, run.troves.to_frame()
+  if isinstance(run, pd.DataFrame):
+    return run, None
+  path = str(run)
+  if path.endswith(".npz"):
+    with np.load(path) as f:
+      return pd.DataFrame({name: f[name] for name in f.files}), None
+  if path.endswith(".csv"):
+    data = pd.read_csv(path)
+  else:
+    from .sink import read_steps
+    data = read_steps(path).to_pandas()
+  if "step" in data:
+    data = data.set_index("step")
+  return data, None
+
+
+def series(data, spec, n_out):
+  #downsampled x (in months) and y of every trace of a figure
+  x = np.asarray(data.index, dtype=np.float64) / month
+  return [downsample(t["column"], x, t["scale"] * data[t["column"]].to_numpy(), n_out) for t in spec["traces"]]
+
+
+def histograms(frames, bins=25):
+  #one figure per trove field, binned over the combined range of all runs
+  figures = []
+  for measure in fields:
+    values = [frame[measure].to_numpy() for frame in frames]
+    finite = np.concatenate([v[np.isfinite(v)] for v in values])
+    if len(finite) == 0:
+      continue
+    edges = np.histogram_bin_edges(finite, bins=bins)
+    counts = [np.histogram(v, bins=edges)[0] for v in values]
+    figures.append({"title": "Distribution of " + measure, "edges": edges, "counts": counts})
+  return figures
+
+
+# Rendering
+
+def render(task):
+  #one figure as an HTML div; runs in a worker process
+  import plotly.graph_objects as go
+  import plotly.io as pio
+  from plotly.subplots import make_subplots
+  kind, spec, runs = task
+  if kind == "histogram":
+    edges = spec["edges"]
+    fig = go.Figure([go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=name, opacity=0.6)
+                     for name, counts in zip(("Run", "Run New"), spec["counts"])])
+    fig.update_layout(title_text=spec["title"], barmode="overlay")
+  else:
+    rows = spec.get("rows", 1)
+    secondary = rows == 1 and len(spec["y"]) > 1
+    fig = make_subplots(rows=rows, cols=1, specs=[[{"secondary_y": secondary}]] * rows)
+    for i, traces in enumerate(runs):
+      for t, (x, y) in zip(spec["traces"], traces):
+        if i and t["column"] in shared_columns:
+          continue
+        count = t["column"] in count_columns
+        fig.add_trace(go.Scatter(x=x, y=y, name=t["name"] + (" New" if i else ""),
+                                 mode="markers" if count else "lines", line=dict(dash="dot") if i else None),
+                      row=t["row"], col=1, secondary_y=t["secondary"] if secondary else None)
+    fig.update_layout(title_text=spec["title"])
+    fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+    if rows > 1:
+      for row, title in enumerate(spec["y"], 1):
+        fig.update_yaxes(title_text=title, row=row, col=1)
+    else:
+      fig.update_yaxes(title_text=spec["y"][0], secondary_y=False if secondary else None)
+      if secondary:
+        fig.update_yaxes(title_text=spec["y"][1], secondary_y=True)
+  return pio.to_html(fig, full_html=False, include_plotlyjs=False)
+
+
+def write_report(run, path, compare=None, n_out=max_points, workers=None, title="Macro model report"):
+  loaded = [load_run(r) for r in (run, compare) if r is not None]
+  tasks = [("series", spec, [series(data, spec, n_out) for data, _ in loaded])
+           for spec in exhibits if all(t["column"] in data for data, _ in loaded for t in spec["traces"])]
+  frames = [troves for _, troves in loaded if troves is not None]
+  if len(frames) == len(loaded):
+    tasks += [("histogram", spec, None) for spec in histograms(frames)]
+
+  if workers == 1:
+    divs = list(map(render, tasks))
+  else:
+    with Pool(workers) as pool:
+      divs = pool.map(render, tasks)
+
+  from plotly.offline import get_plotlyjs
+  with open(path, "w") as f:
+    f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n")
+    f.write(f"<script type=\"text/javascript\">{get_plotlyjs()}</script>\n</head>\n<body>\n<h1>{title}</h1>\n")
+    for div in divs:
+      f.write(div + "\n")
+    f.write("</body>\n</html>\n")
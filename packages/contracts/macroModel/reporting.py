@@ -0,0 +1,442 @@
+"""Reporting
+
+Figures for macro-model runs (the "Exhibition" sections of the original
+notebook). Plotly and matplotlib are imported at the top of this module only,
+so simulating does not pay for them. macroModel.report renders the same
+figures, downsampled, into a single HTML file.
+"""
+
+import plotly.graph_objects as go
+import plotly.express as px
+import matplotlib.pyplot as plt
+from plotly.subplots import make_subplots
+
+from .macro_model import month
+
+
+def linevis(data, measure):
+  fig = px.line(data, x=data.index/month, y=measure, title= measure+' dynamics')
+  fig.show()
+
+
+def exhibit(result):
+  data = result.data
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['Price_LUSD'], name="LUSD Price"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['Price_Ether'], name="Ether Price"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Price Dynamics of LUSD and Ether"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="LUSD Price", secondary_y=False)
+  fig.update_yaxes(title_text="Ether Price", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_troves'], name="Number of Troves"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['supply_LUSD'], name="LUSD Supply"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Trove Numbers and LUSD Supply"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Number of Troves", secondary_y=False)
+  fig.update_yaxes(title_text="LUSD Supply", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(rows=2, cols=1)
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_open'], name="Number of Troves Opened", mode='markers'),
+      row=1, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_close'], name="Number of Troves Closed", mode='markers'),
+      row=2, col=1, secondary_y=False
+  )
+  fig.update_layout(
+      title_text="Dynamics of Number of Troves Opened and Closed"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Troves Opened", row=1, col=1)
+  fig.update_yaxes(title_text="Troves Closed", row=2, col=1)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_liquidate'], name="Number of Liquidated Troves", mode='markers'),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_redempt'], name="Number of Redempted Troves", mode='markers'),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Number of Liquidated and Redempted Troves"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Number of Liquidated Troves", secondary_y=False)
+  fig.update_yaxes(title_text="Number of Redempted Troves", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['liquidity'], name="Liquidity Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['stability'], name="Stability Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=100*data['redemption_pool'], name="100*Redemption Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['return_stability'], name="Return of Stability Pool"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Size of Pools", secondary_y=False)
+  fig.update_yaxes(title_text="Return", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['airdrop_gain'], name="Airdrop Gain"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['liquidation_gain'], name="Liquidation Gain"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Airdrop and Liquidation Gain"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Airdrop Gain", secondary_y=False)
+  fig.update_yaxes(title_text="Liquidation Gain", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['issuance_fee'], name="Issuance Fee"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['redemption_fee'], name="Redemption Fee"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Issuance Fee and Redemption Fee"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Issuance Fee", secondary_y=False)
+  fig.update_yaxes(title_text="Redemption Fee", secondary_y=True)
+  fig.show()
+
+  #linevis(data, 'annualized_earning')
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['price_LQTY'], name="LQTY Price"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['MC_LQTY'], name="LQTY Market Cap"),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of the Price and Market Cap of LQTY"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="LQTY Price", secondary_y=False)
+  fig.update_yaxes(title_text="LQTY Market Cap", secondary_y=True)
+  fig.show()
+
+
+def trove_histogram(troves, measure):
+  fig = px.histogram(troves.to_frame(), x=measure, title='Distribution of '+measure, nbins=25)
+  fig.show()
+
+
+def exhibit_troves(result):
+  troves = result.troves
+  for measure in ('Ether_Quantity', 'CR_initial', 'Supply', 'Rational_inattention', 'CR_current'):
+    trove_histogram(troves, measure)
+
+  for measure in ('Ether_Quantity', 'CR_initial', 'Supply', 'CR_current'):
+    plt.plot(troves[measure])
+    plt.show()
+
+
+#issuance fee = redemption fee = base rate
+def exhibit_comparison(result, result2):
+  data = result.data
+  data2 = result2.data
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['Price_LUSD'], name="LUSD Price"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['Price_Ether'], name="Ether Price"),
+      secondary_y=True,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['Price_LUSD'], name="LUSD Price New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Price Dynamics of LUSD and Ether"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="LUSD Price", secondary_y=False)
+  fig.update_yaxes(title_text="Ether Price", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_troves'], name="Number of Troves"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['supply_LUSD'], name="LUSD Supply"),
+      secondary_y=True,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['n_troves'], name="Number of Troves New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['supply_LUSD'], name="LUSD Supply New", line = dict(dash='dot')),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Trove Numbers and LUSD Supply"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Number of Troves", secondary_y=False)
+  fig.update_yaxes(title_text="LUSD Supply", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(rows=2, cols=2)
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_open'], name="Number of Troves Opened", mode='markers'),
+      row=1, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_close'], name="Number of Troves Closed", mode='markers'),
+      row=2, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['n_open'], name="Number of Troves Opened New", mode='markers'),
+      row=1, col=2, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['n_close'], name="Number of Troves Closed New", mode='markers'),
+      row=2, col=2, secondary_y=False
+  )
+  fig.update_layout(
+      title_text="Dynamics of Number of Troves Opened and Closed"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Troves Opened", row=1, col=1)
+  fig.update_yaxes(title_text="Troves Closed", row=2, col=1)
+  fig.show()
+
+  fig = make_subplots(rows=2, cols=1)
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_liquidate'], name="Number of Liquidated Troves"),
+      row=1, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['n_redempt'], name="Number of Redempted Troves"),
+      row=2, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['n_liquidate'], name="Number of Liquidated Troves New", line = dict(dash='dot')),
+      row=1, col=1, secondary_y=False
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['n_redempt'], name="Number of Redempted Troves New", line = dict(dash='dot')),
+      row=2, col=1, secondary_y=False
+  )
+  fig.update_layout(
+      title_text="Dynamics of Number of Liquidated and Redempted Troves"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Troves Liquidated", row=1, col=1)
+  fig.update_yaxes(title_text="Troves Redempted", row=2, col=1)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['liquidity'], name="Liquidity Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['stability'], name="Stability Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=100*data['redemption_pool'], name="100*Redemption Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['liquidity'], name="Liquidity Pool New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['stability'], name="Stability Pool New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=100*data2['redemption_pool'], name="100*Redemption Pool New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Size of Pools", secondary_y=False)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['return_stability'], name="Return of Stability Pool"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['return_stability'], name="Return of Stability Pool New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Liquidity, Stability, Redemption Pools and Return of Stability Pool"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Return", secondary_y=False)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['airdrop_gain'], name="Airdrop Gain"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['liquidation_gain'], name="Liquidation Gain"),
+      secondary_y=True,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['airdrop_gain'], name="Airdrop Gain New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['liquidation_gain'], name="Liquidation Gain New", line = dict(dash='dot')),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Airdrop and Liquidation Gain"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Airdrop Gain", secondary_y=False)
+  fig.update_yaxes(title_text="Liquidation Gain", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(rows=2, cols=1)
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['issuance_fee'], name="Issuance Fee"),
+      row=1, col=1
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['redemption_fee'], name="Redemption Fee"),
+      row=2, col=1
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['issuance_fee'], name="Issuance Fee New", line = dict(dash='dot')),
+      row=1, col=1
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['redemption_fee'], name="Redemption Fee New", line = dict(dash='dot')),
+      row=2, col=1
+  )
+  fig.update_layout(
+      title_text="Dynamics of Issuance Fee and Redemption Fee"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Issuance Fee", secondary_y=False, row=1, col=1)
+  fig.update_yaxes(title_text="Redemption Fee", secondary_y=False, row=2, col=1)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['annualized_earning'], name="Annualized Earning"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['annualized_earning'], name="Annualized Earning New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Annualized Earning"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Annualized Earning", secondary_y=False)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['price_LQTY'], name="LQTY Price"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['MC_LQTY'], name="LQTY Market Cap"),
+      secondary_y=True,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['price_LQTY'], name="LQTY Price New", line = dict(dash='dot')),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['MC_LQTY'], name="LQTY Market Cap New", line = dict(dash='dot')),
+      secondary_y=True,
+  )
+  fig.update_layout(
+      title_text="Dynamics of the Price and Market Cap of LQTY"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="LQTY Price", secondary_y=False)
+  fig.update_yaxes(title_text="LQTY Market Cap", secondary_y=True)
+  fig.show()
+
+  fig = make_subplots(specs=[[{"secondary_y": True}]])
+  fig.add_trace(
+      go.Scatter(x=data.index/month, y=data['base_rate'], name="Base Rate"),
+      secondary_y=False,
+  )
+  fig.add_trace(
+      go.Scatter(x=data2.index/month, y=data2['base_rate'], name="Base Rate New"),
+      secondary_y=False,
+  )
+  fig.update_layout(
+      title_text="Dynamics of Issuance Fee and Redemption Fee"
+  )
+  fig.update_xaxes(tick0=0, dtick=1, title_text="Month")
+  fig.update_yaxes(title_text="Issuance Fee", secondary_y=False)
+  fig.update_yaxes(title_text="Redemption Fee", secondary_y=True)
+  fig.show()
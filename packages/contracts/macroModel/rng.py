@@ -0,0 +1,38 @@
+"""Random streams
+
+Counter-based random number streams for the macro model. A run seed is
+turned into a Philox key through SeedSequence, and every (phase, step) pair
+addresses its own block of the Philox counter space. Streams are therefore
+independent of each other and of the order in which they are used: a step can
+be replayed, resumed or run in another process and still draw the same
+numbers, without any global re-seeding.
+"""
+
+import numpy as np
+
+#draws that cover the whole run, generated once per run
+path_phases = ("ether", "natural_rate", "LQTY", "return", "close", "close_uniform", "open", "adjust_ratio",
+               "stability", "liquidity", "redemption", "LQTY_earning")
+#draws whose size depends on the state at a step
+step_phases = ("close_sample", "adjust", "open_troves")
+#draws added later: population sets up a synthetic trove pool, bridge draws the substep ether prices of the
+#steps an adaptive simulation refines, depositors the initial deposits and the flows of every step and
+#snapshot the targets of warm-started troves. New phases go last, so that the streams of the others stay the same
+other_phases = ("population", "bridge", "depositors", "snapshot")
+
+phases = {name: i for i, name in enumerate(path_phases + step_phases + other_phases)}
+
+
+class Streams:
+  def __init__(self, seed):
+    self.seed = seed
+    self.key = np.random.SeedSequence(seed).generate_state(2, dtype=np.uint64)
+
+  def _generator(self, phase, word):
+    return np.random.Generator(np.random.Philox(key=self.key, counter=[0, 0, word, phases[phase]]))
+
+  def path(self, phase):
+    return self._generator(phase, 0)
+
+  def step(self, phase, index):
+    return self._generator(phase, index + 1)
@@ -0,0 +1,150 @@
+"""Price scenarios
+
+A scenario describes the ether price as a sequence of regimes, each with its
+own drift, volatility, jumps, mean reversion or deterministic crash, and is
+compiled into whole paths at once: every draw for every path is made in one
+call and each regime is a cumulative product (or, when mean reverting, a
+blocked linear recurrence) over all paths together.
+
+    initial: 2000
+    sd: 0.02
+    regimes:
+      - {until: 1440, drift: 0.001}               # growth up to step 1440
+      - {steps: 168, crash: 0.3}                   # lose 30% over a week
+      - {steps: 720, revert: {speed: 0.01, level: 0.75}}
+      - {drift: -0.0002, jumps: {rate: 0.001, mean: -0.1, sd: 0.05}}
+
+A regime lasts `steps` steps, or `until` a step; the last one runs to the end
+of the path. Within a regime, P_t = P_{t-1}(1+shock)(1+drift)(1+jump) with
+shock ~ N(0, sd); jumps happen with probability rate per step and have a
+N(mean, sd) size. crash spreads a total relative drop evenly (geometrically)
+over the regime. revert pulls log P towards the log of level times the
+initial price by the fraction speed per step. initial, sd and drift given at
+the top level are the defaults of every regime.
+
+A scenario is a dict, the name of one in `scenarios`, or a .json, .yaml or
+.yml file; PyYAML is only imported for the latter.
+
+    run(SimulationConfig(price_scenario="four_stage"))
+    paths = price_paths("crash.yaml", 8760, np.random.default_rng(0), n_paths=1000)
+"""
+
+import json
+
+import numpy as np
+
+day = 24
+month = 24 * 30
+year = 24 * 365
+
+regime_keys = ("steps", "until", "drift", "sd", "jumps", "crash", "revert")
+
+scenarios = {
+  #the single random walk of SimulationConfig: drift_ether and sd_ether throughout
+  "random_walk": {"regimes": [{}]},
+  #growth, a one-week crash, growth and a slow decline, as in tests/simulation_helpers.py
+  "four_stage": {"initial": 2000, "sd": 0.02,
+                 "regimes": [{"until": 2 * month, "drift": 0.001}, {"until": 2 * month + 7 * day, "drift": -0.02},
+                             {"until": 6 * month, "drift": 0.0013}, {"until": year, "drift": -0.0002}]},
+  #a calm market hit by a 50% crash in a day that then reverts half way back
+  "crash_recovery": {"sd": 0.01,
+                     "regimes": [{"until": 3 * month}, {"steps": day, "crash": 0.5},
+                                 {"steps": 3 * month, "revert": {"speed": 0.002, "level": 0.75}}, {}]},
+}
+
+
+def load_scenario(scenario):
+  #a copy of the scenario as a dict, checked for unknown keys
+  if isinstance(scenario, str):
+    if scenario in scenarios:
+      scenario = scenarios[scenario]
+    elif scenario.endswith((".yaml", ".yml")):
+      import yaml
+      with open(scenario) as f:
+        scenario = yaml.safe_load(f)
+    elif scenario.endswith(".json"):
+      with open(scenario) as f:
+        scenario = json.load(f)
+    else:
+      raise ValueError(f"unknown price scenario {scenario!r}, expected one of {tuple(scenarios)} or a .json/.yaml file")
+  scenario = dict(scenario)
+  scenario["regimes"] = [dict(regime) for regime in scenario.get("regimes") or [{}]]
+  for regime in scenario["regimes"]:
+    unknown = set(regime) - set(regime_keys)
+    if unknown:
+      raise ValueError(f"unknown regime keys {sorted(unknown)}, expected some of {regime_keys}")
+  return scenario
+
+
+def regime_bounds(regimes, n):
+  #[start, end) of every regime over the increments 1..n-1 of a path of n prices
+  bounds, start = [], 1
+  for i, regime in enumerate(regimes):
+    if i == len(regimes) - 1:
+      end = n
+    elif "until" in regime:
+      end = regime["until"]
+    else:
+      end = start + regime.get("steps", 0)
+    end = min(max(end, start), n)
+    bounds.append((start, end))
+    start = end
+  return bounds
+
+
+def reverting(log_price, log_level, growth, speed):
+  #x_t - m = (1-speed)(x_{t-1} - m) + g_t along the last axis, solved in blocks short enough
+  #for the powers of 1/(1-speed) to stay well within float64
+  phi = 1 - speed
+  block = max(1, int(10 / -np.log(phi))) if 0 < phi < 1 else 1
+  out = np.empty_like(growth)
+  deviation = log_price - log_level
+  for lo in range(0, growth.shape[-1], block):
+    g = growth[..., lo:lo + block]
+    powers = phi ** np.arange(1, g.shape[-1] + 1)
+    deviation_t = powers * (deviation[..., None] + np.cumsum(g / powers, axis=-1))
+    out[..., lo:lo + block] = deviation_t
+    deviation = deviation_t[..., -1]
+  return log_level + out
+
+
+def price_paths(scenario, n, rng=None, n_paths=None, shocks=None, initial=1000.0, sd=0.02, drift=0.0):
+  #n prices per path, shape (n,) or (n_paths, n); initial, sd and drift are the defaults the scenario overrides.
+  #shocks are standard normal draws of shape (..., n-1) to use instead of drawing from rng; the jumps of a
+  #regime are still drawn from rng
+  scenario = load_scenario(scenario)
+  if rng is None and (shocks is None or any("jumps" in regime for regime in scenario["regimes"])):
+    raise ValueError("price_paths needs an rng to draw the shocks or the jumps of a regime")
+  initial = scenario.get("initial", initial)
+  sd = scenario.get("sd", sd)
+  drift = scenario.get("drift", drift)
+  shape = () if n_paths is None else (n_paths,)
+  #shocks drawn here are turned into the price factors in place
+  drawn = shocks is None
+  if drawn:
+    shocks = rng.standard_normal(shape + (n-1,))
+  shocks = np.asarray(shocks, dtype=np.float64)
+
+  prices = np.empty(shocks.shape[:-1] + (n,))
+  prices[..., 0] = initial
+  for regime, (start, end) in zip(scenario["regimes"], regime_bounds(scenario["regimes"], n)):
+    if end <= start:
+      continue
+    #in place, the draws dominate the cost of a large batch and the temporaries the rest
+    factor = np.multiply(regime.get("sd", sd), shocks[..., start-1:end-1], out=shocks[..., start-1:end-1] if drawn else None)
+    factor += 1
+    factor *= 1 + regime.get("drift", drift)
+    if "jumps" in regime:
+      jumps = regime["jumps"]
+      hit = rng.random(factor.shape) < jumps.get("rate", 0)
+      factor *= np.where(hit, 1 + rng.normal(jumps.get("mean", 0), jumps.get("sd", 0), factor.shape), 1)
+    if "crash" in regime:
+      factor *= (1 - regime["crash"]) ** (1 / (end - start))
+    if "revert" in regime:
+      revert = regime["revert"]
+      level = np.log(initial * revert.get("level", 1))
+      prices[..., start:end] = np.exp(reverting(np.log(prices[..., start-1]), level, np.log(factor), revert["speed"]))
+    else:
+      np.cumprod(factor, axis=-1, out=prices[..., start:end])
+      prices[..., start:end] *= prices[..., start-1, None]
+  return prices
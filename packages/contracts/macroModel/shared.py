@@ -0,0 +1,77 @@
+"""Shared exogenous inputs
+
+Publishes groups of NumPy arrays, typically the exogenous paths of one or
+more configs, into a single multiprocessing.shared_memory block. Workers
+receive only the small picklable handle and attach() to it, getting read-only
+views of the block instead of regenerating or unpickling their own copies.
+
+    with SharedArrays({key: exogenous_paths(config)}) as shared:
+      pool.map(worker, [(shared.handle, key, ...) for ...])
+
+    #in the worker
+    paths = attach(handle, key)
+
+The publishing process owns the block and unlinks it on close(). A worker
+keeps its attachments open until it exits, so views handed out by attach()
+stay valid for the life of the worker.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+#offset alignment of every array in the block
+alignment = 64
+
+#name -> SharedMemory attached by this process
+_attached = {}
+
+
+class SharedArrays:
+  def __init__(self, groups):
+    #groups: key -> {name: array}; keys must be picklable
+    layout, size = {}, 0
+    for key, arrays in groups.items():
+      entries = layout[key] = {}
+      for name, array in arrays.items():
+        array = np.asarray(array)
+        size = -(-size // alignment) * alignment
+        entries[name] = (size, array.shape, array.dtype.str)
+        size += array.nbytes
+    self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for key, arrays in groups.items():
+      for name, array in arrays.items():
+        offset, shape, dtype = layout[key][name]
+        np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)[...] = array
+    self.layout = layout
+    self.handle = (self.shm.name, layout)
+
+  @property
+  def nbytes(self):
+    return self.shm.size
+
+  def close(self):
+    if self.shm is not None:
+      self.shm.close()
+      self.shm.unlink()
+      self.shm = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def attach(handle, key):
+  #read-only views of the arrays published under key
+  name, layout = handle
+  shm = _attached.get(name)
+  if shm is None:
+    shm = _attached[name] = shared_memory.SharedMemory(name=name)
+  views = {}
+  for array_name, (offset, shape, dtype) in layout[key].items():
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+    view.flags.writeable = False
+    views[array_name] = view
+  return views
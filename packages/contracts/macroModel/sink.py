@@ -0,0 +1,150 @@
+"""Streaming step output
+
+StepSink writes per-step metrics to a Parquet or Arrow IPC file one row
+group at a time, with a fixed typed schema, so a run only ever holds one
+row group in memory however long its horizon. Both formats can be read back
+memory-mapped by read_steps (or any Arrow reader) instead of parsing CSV.
+
+    with StepSink("run.parquet", {"step": np.int64, "price": np.float64}, row_group=1024) as sink:
+        sink.write_row({"step": 1, "price": 0.99})
+
+Needs pyarrow, which is only imported when a sink is opened.
+
+SpillSink needs nothing beyond NumPy: it appends each row group to one raw
+file per column in a directory, and read_spill returns a DataFrame whose
+columns are memory maps of those files, so a finished run can be inspected
+without loading it.
+
+    sim = Simulation(config, spill="run.spill", precision="float32")
+    data = sim.run().data  # backed by run.spill/*.bin
+"""
+
+import json
+import os
+
+import numpy as np
+
+formats = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+
+def file_format(path):
+  for suffix, name in formats.items():
+    if str(path).endswith(suffix):
+      return name
+  raise ValueError(f"cannot tell the format of {path!r}, expected one of {tuple(formats)}")
+
+
+class StepSink:
+  def __init__(self, path, schema, format=None, row_group=4096):
+    #schema maps column names to NumPy dtypes, in output order
+    import pyarrow as pa
+    self.path = str(path)
+    self.format = format or file_format(path)
+    self.row_group = row_group
+    self.dtypes = {name: np.dtype(dtype) for name, dtype in schema.items()}
+    self.schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in self.dtypes.items()])
+    self.buffer = {name: np.zeros(row_group, dtype=dtype) for name, dtype in self.dtypes.items()}
+    self.n_buffered = 0
+    self.n_written = 0
+    if self.format == "parquet":
+      import pyarrow.parquet as pq
+      self.writer = pq.ParquetWriter(self.path, self.schema)
+    elif self.format == "arrow":
+      self.writer = pa.ipc.new_file(self.path, self.schema)
+    else:
+      raise ValueError(f"unknown format {self.format!r}, expected 'parquet' or 'arrow'")
+
+  def __len__(self):
+    return self.n_written + self.n_buffered
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def write_row(self, row):
+    i = self.n_buffered
+    for name, column in self.buffer.items():
+      column[i] = row[name]
+    self.n_buffered = i + 1
+    if self.n_buffered == self.row_group:
+      self.flush()
+
+  def write_columns(self, columns, n):
+    #the first n values of every column, as one row group after the buffered rows
+    self.flush()
+    self._write(columns, n)
+
+  def flush(self):
+    n, self.n_buffered = self.n_buffered, 0
+    self._write(self.buffer, n)
+
+  def _write(self, columns, n):
+    import pyarrow as pa
+    if n:
+      arrays = [pa.array(np.asarray(columns[name][:n], dtype=dtype)) for name, dtype in self.dtypes.items()]
+      self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+      self.n_written += n
+
+  def close(self):
+    if self.writer is not None:
+      self.flush()
+      self.writer.close()
+      self.writer = None
+
+
+def read_steps(path, format=None):
+  #memory-mapped pyarrow Table of a file written by StepSink; .to_pandas() for a DataFrame
+  import pyarrow as pa
+  format = format or file_format(path)
+  if format == "parquet":
+    import pyarrow.parquet as pq
+    return pq.read_table(path, memory_map=True)
+  #the table keeps the mapping alive, so the file is not closed here
+  return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+
+class SpillSink:
+  def __init__(self, directory, schema, row_group=65536):
+    #schema maps column names to NumPy dtypes, in output order
+    self.directory = str(directory)
+    os.makedirs(self.directory, exist_ok=True)
+    self.row_group = row_group
+    self.dtypes = {name: np.dtype(dtype) for name, dtype in schema.items()}
+    self.files = {name: open(os.path.join(self.directory, f"{name}.bin"), "wb") for name in self.dtypes}
+    self.n_written = 0
+
+  def __len__(self):
+    return self.n_written
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def write_columns(self, columns, n):
+    #the first n values of every column, appended to its file
+    for name, dtype in self.dtypes.items():
+      np.asarray(columns[name][:n], dtype=dtype).tofile(self.files[name])
+    self.n_written += n
+
+  def close(self):
+    if self.files is not None:
+      for f in self.files.values():
+        f.close()
+      self.files = None
+      with open(os.path.join(self.directory, "spill.json"), "w") as f:
+        json.dump({"length": self.n_written, "dtypes": {name: dtype.str for name, dtype in self.dtypes.items()}}, f)
+
+
+def read_spill(directory):
+  #DataFrame of a closed SpillSink directory; only the pages that are read are loaded
+  import pandas as pd
+  with open(os.path.join(directory, "spill.json")) as f:
+    meta = json.load(f)
+  n = meta["length"]
+  columns = {name: np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(n,)) if n
+             else np.zeros(0, dtype=dtype) for name, dtype in meta["dtypes"].items()}
+  return pd.DataFrame(columns, copy=False)
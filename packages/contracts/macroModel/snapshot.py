@@ -0,0 +1,111 @@
+"""Trove snapshots
+
+Warm-starts the macro model from the troves of the deployed system instead
+of ten artificial troves and a month of bootstrap. A snapshot is exported
+from TroveManager/SortedTroves, e.g. by walking SortedTroves from the head
+and reading getEntireDebtAndColl of every trove, as either
+
+  - a .json file: the metadata below and "troves", a list of {"coll", "debt"}
+    objects or a dict of columns, or
+  - a .csv file of coll,debt rows (other columns are ignored), with the
+    metadata in a .json file next to it, like macroModel.history.
+
+Metadata, all optional: price (ETH/USD), stability_pool (LUSD deposited),
+base_rate, price_LQTY, timestamp and deployed (unix seconds or dates, from
+which the age of the system follows) and decimals (18 when coll and debt are
+raw wei). The CR target and rational inattention of a trove cannot be read
+on chain; columns CR_initial and Rational_inattention are used when present
+and otherwise imputed, drawing the inattention from the distribution of
+open_troves and the target so that the trove is inside its band.
+
+    config = snapshot_config("troves_2023-06-01.json", n_sim=24*90)
+    run(config)
+"""
+
+import json
+import os
+from dataclasses import replace
+
+import numpy as np
+
+#steps the system must have run for the bootstrap branches of the model to be over, when the snapshot does not say
+default_age = 24*30 + 1
+
+
+def metadata_path(path):
+  return str(path) + ".json"
+
+
+def to_seconds(value):
+  if isinstance(value, (int, float)):
+    return int(value)
+  return int(np.datetime64(value, "s").astype(np.int64))
+
+
+def load_snapshot(path):
+  #(meta, columns) of a snapshot file, coll and debt in ether and LUSD
+  path = str(path)
+  if path.endswith(".json"):
+    with open(path) as f:
+      meta = json.load(f)
+    troves = meta.pop("troves")
+    if isinstance(troves, list):
+      troves = {name: [trove[name] for trove in troves] for name in troves[0]} if troves else {"coll": [], "debt": []}
+  elif path.endswith(".csv"):
+    import pandas as pd
+    meta = {}
+    if os.path.exists(metadata_path(path)):
+      with open(metadata_path(path)) as f:
+        meta = json.load(f)
+    troves = pd.read_csv(path).to_dict("list")
+  else:
+    raise ValueError(f"cannot read trove snapshot {path!r}, expected a .json or .csv file")
+  if "coll" not in troves or "debt" not in troves:
+    raise ValueError(f"trove snapshot {path!r} needs coll and debt columns, got {sorted(troves)}")
+  unit = 10.0 ** meta.get("decimals", 0)
+  columns = {"coll": np.asarray(troves["coll"], dtype=np.float64) / unit,
+             "debt": np.asarray(troves["debt"], dtype=np.float64) / unit}
+  for name in ("CR_initial", "Rational_inattention"):
+    if name in troves:
+      columns[name] = np.asarray(troves[name], dtype=np.float64)
+  #closed troves are kept at zero by the contract
+  active = (columns["coll"] > 0) & (columns["debt"] > 0)
+  return meta, {name: column[active] for name, column in columns.items()}
+
+
+def snapshot_age(meta):
+  #hours the system had been running at the snapshot
+  if "timestamp" in meta and "deployed" in meta:
+    return max(0, (to_seconds(meta["timestamp"]) - to_seconds(meta["deployed"])) // 3600)
+  return default_age
+
+
+def snapshot_config(path, **overrides):
+  #a SimulationConfig starting from the snapshot, at its ether price, base rate and LQTY price
+  from .macro_model import SimulationConfig
+  meta, _ = load_snapshot(path)
+  fields = {"trove_snapshot": str(path)}
+  for name, field in (("price", "price_ether_initial"), ("base_rate", "base_rate_initial"), ("price_LQTY", "price_LQTY_initial")):
+    if name in meta:
+      fields[field] = float(meta[name])
+  return replace(SimulationConfig(**fields), **overrides)
+
+
+def snapshot_population(c, columns, price_ether_current, rng):
+  #the columns of TroveStore.extend for the snapshot troves at the current ether price
+  coll, debt = columns["coll"], columns["debt"]
+  n = len(coll)
+  CR_current = price_ether_current * coll / debt
+  rational_inattention = columns.get("Rational_inattention")
+  if rational_inattention is None:
+    rational_inattention = rng.gamma(c.distribution_parameter1_inattention, c.distribution_parameter2_inattention, n)
+  CR_ratio = columns.get("CR_initial")
+  if CR_ratio is None:
+    #a band position that keeps the target above the lowest one open_troves draws and at most twice the current ratio;
+    #troves already below it get the lowest target and are adjusted or liquidated at the first step
+    lowest = np.maximum(-1, -0.5 / rational_inattention)
+    highest = np.clip((CR_current / c.distribution_parameter1_CR - 1) / rational_inattention, lowest, 2)
+    band = lowest + (highest - lowest) * rng.random(n)
+    CR_ratio = np.maximum(CR_current / (1 + rational_inattention*band), c.distribution_parameter1_CR)
+  return {"Ether_Quantity": coll, "Supply": debt, "CR_initial": CR_ratio,
+          "Rational_inattention": rational_inattention, "CR_current": CR_current}
@@ -0,0 +1,272 @@
+"""Stability pool depositors
+
+Depositor-level accounting of the stability pool with the product-sum
+algorithm of StabilityPool.sol ("Scalable Reward Distribution with
+Compounding Stakes"). A liquidation offset against the pool multiplies a
+running product P by the fraction of every deposit that survives it and adds
+the ETH gain per unit deposited, weighted by P, to a running sum S; LQTY
+issuance adds to a sum G the same way, and a withdrawal shared by every
+depositor in proportion to its deposit to a sum W of the LUSD paid back.
+These are O(1) whatever the number of depositors.
+
+A depositor only stores its deposit and the P and sums of the last time it
+was touched, so its compounded deposit is deposit * P / P_snapshot and its
+ETH gain deposit * (S - S_snapshot) / P_snapshot, computed lazily and
+vectorized over any set of depositors. As in the contract, P is multiplied
+by scale_factor (and the scale increased) whenever it would fall below
+1/scale_factor, and an offset that empties the pool starts a new epoch in
+which the deposits of earlier epochs are worth nothing. A sum is kept per
+(epoch, scale) slot and a gain reads the slot of its snapshot and the next
+one, like epochToScaleToSum.
+
+    pool = DepositorPool()
+    ids = pool.add(initial_deposits(1e6, 100_000, rng))
+    pool.offset(debt=2e5, ether=150)
+    pool.compounded(), pool.eth_gain()   # one value per depositor
+    pool.withdraw(ids[:10], 50.0)
+
+Simulation keeps one when SimulationConfig.n_depositors is set, offsetting
+every liquidation and spreading the net flows of the pool over a few
+depositors per step.
+"""
+
+import numpy as np
+
+#P is rescaled by this factor when it would fall below its inverse
+scale_factor = 1e9
+#deposits that compounded below this fraction of their snapshot are worth nothing, as in the contract
+dust = 1e-9
+
+fields = ("deposit", "P", "S", "G", "W", "paid_ETH", "paid_LQTY", "deposited", "withdrawn")
+
+
+class DepositorPool:
+  def __init__(self, capacity=1024):
+    self.capacity = max(1, int(capacity))
+    self.n = 0
+    #deposit and P, S, G, W as of the last touch, gains paid out at touches and the LUSD moved in and out
+    self.columns = {name: np.zeros(self.capacity) for name in fields}
+    #(epoch, scale) slot of the snapshot
+    self.columns["slot"] = np.zeros(self.capacity, dtype=np.int64)
+    self.total = 0.0
+    self.P = 1.0
+    self.epoch = 0
+    self.scale = 0
+    #sums per (epoch, scale) slot; slot 0 is an empty slot that always holds zero sums
+    self.slot_epoch = np.array([-1, 0], dtype=np.int64)
+    self.slot_scale = np.array([-1, 0], dtype=np.int64)
+    #slot of the same epoch and the next scale, 0 when there is none
+    self.slot_next = np.array([0, 0], dtype=np.int64)
+    self.S = np.zeros(2)
+    self.G = np.zeros(2)
+    self.W = np.zeros(2)
+    self.slot = 1
+    self.offsets = 0
+
+  def __len__(self):
+    return self.n
+
+  def __getitem__(self, name):
+    #view on the live part of a column
+    return self.columns[name][:self.n]
+
+  def _reserve(self, n_new):
+    if n_new > self.capacity:
+      capacity = self.capacity
+      while capacity < n_new:
+        capacity *= 2
+      for name, old in self.columns.items():
+        column = np.zeros(capacity, dtype=old.dtype)
+        column[:self.n] = old[:self.n]
+        self.columns[name] = column
+      self.capacity = capacity
+
+  def _new_slot(self, epoch, scale):
+    slot = len(self.S)
+    if epoch == self.slot_epoch[self.slot]:
+      self.slot_next[self.slot] = slot
+    self.slot_epoch = np.append(self.slot_epoch, epoch)
+    self.slot_scale = np.append(self.slot_scale, scale)
+    self.slot_next = np.append(self.slot_next, 0)
+    self.S = np.append(self.S, 0.0)
+    self.G = np.append(self.G, 0.0)
+    self.W = np.append(self.W, 0.0)
+    self.slot = slot
+
+  def _ids(self, ids):
+    return np.arange(self.n) if ids is None else np.atleast_1d(np.asarray(ids, dtype=np.int64))
+
+  def add(self, amounts):
+    #new depositors with these deposits, returns their ids
+    amounts = np.atleast_1d(np.asarray(amounts, dtype=np.float64))
+    lo, hi = self.n, self.n + len(amounts)
+    self._reserve(hi)
+    columns = self.columns
+    columns["deposit"][lo:hi] = amounts
+    columns["deposited"][lo:hi] = amounts
+    self.n = hi
+    self._snapshot(np.arange(lo, hi))
+    self.total += float(amounts.sum())
+    return np.arange(lo, hi)
+
+  def _snapshot(self, ids):
+    columns = self.columns
+    columns["P"][ids] = self.P
+    columns["S"][ids] = self.S[self.slot]
+    columns["G"][ids] = self.G[self.slot]
+    columns["W"][ids] = self.W[self.slot]
+    columns["slot"][ids] = self.slot
+
+  def compounded(self, ids=None):
+    #current deposit of each depositor, after every offset since its snapshot
+    ids = self._ids(ids)
+    columns = self.columns
+    deposit = columns["deposit"][ids]
+    slot = columns["slot"][ids]
+    value = deposit * self.P / columns["P"][ids]
+    steps = self.scale - self.slot_scale[slot]
+    value[steps == 1] /= scale_factor
+    value[(steps > 1) | (self.slot_epoch[slot] != self.epoch) | (value < dust * deposit)] = 0
+    return value
+
+  def _gain(self, sums, name, ids):
+    columns = self.columns
+    slot = columns["slot"][ids]
+    first = sums[slot] - columns[name][ids]
+    second = sums[self.slot_next[slot]] / scale_factor
+    return columns["deposit"][ids] * (first + second) / columns["P"][ids]
+
+  def eth_gain(self, ids=None):
+    #ETH earned since the last touch and not paid out yet
+    return self._gain(self.S, "S", self._ids(ids))
+
+  def lqty_gain(self, ids=None):
+    return self._gain(self.G, "G", self._ids(ids))
+
+  def shared_withdrawals(self, ids=None):
+    #LUSD paid back by withdraw_share since the last touch and not counted in withdrawn yet
+    return self._gain(self.W, "W", self._ids(ids))
+
+  def offset(self, debt, ether):
+    #cancel debt against the pool and share out the collateral; debt beyond the pool is not offset.
+    #returns the debt and ether actually offset
+    if debt <= 0 or self.total <= 0:
+      return 0.0, 0.0
+    if debt > self.total:
+      ether *= self.total / debt
+      debt = self.total
+    self.S[self.slot] += ether / self.total * self.P
+    self.offsets += 1
+    self._reduce(debt)
+    return debt, ether
+
+  def withdraw_share(self, amount):
+    #withdraw amount from every depositor in proportion to its deposit; returns the amount withdrawn
+    amount = min(amount, self.total)
+    if amount <= 0:
+      return 0.0
+    self.W[self.slot] += amount / self.total * self.P
+    self._reduce(amount)
+    return amount
+
+  def _reduce(self, amount):
+    #every deposit loses the same fraction, amount of the total
+    if amount >= self.total:
+      #the pool is emptied: every deposit so far is worth nothing from the next epoch on
+      self.total = 0.0
+      self.P = 1.0
+      self.epoch += 1
+      self.scale = 0
+      self._new_slot(self.epoch, 0)
+      return
+    self.P *= 1 - amount / self.total
+    self.total -= amount
+    while self.P < 1 / scale_factor:
+      self.P *= scale_factor
+      self.scale += 1
+      self._new_slot(self.epoch, self.scale)
+
+  def issue(self, lqty):
+    #LQTY issued to the pool, shared in proportion to the deposits
+    if lqty > 0 and self.total > 0:
+      self.G[self.slot] += lqty / self.total * self.P
+
+  def _touch(self, ids, amounts):
+    #pay out the gains of depositors, compound their deposits, move amounts in or out and take new snapshots
+    ids, inverse = np.unique(self._ids(ids), return_inverse=True)
+    amounts = np.bincount(inverse.ravel(), np.broadcast_to(amounts, inverse.shape), minlength=len(ids))
+    columns = self.columns
+    columns["paid_ETH"][ids] += self.eth_gain(ids)
+    columns["paid_LQTY"][ids] += self.lqty_gain(ids)
+    columns["withdrawn"][ids] += self.shared_withdrawals(ids)
+    deposit = self.compounded(ids) + amounts
+    columns["deposit"][ids] = deposit
+    self._snapshot(ids)
+    return ids, amounts
+
+  def deposit(self, ids, amounts):
+    ids, amounts = self._touch(ids, amounts)
+    self.columns["deposited"][ids] += amounts
+    self.total += float(amounts.sum())
+
+  def withdraw(self, ids, amounts=np.inf):
+    #up to amounts from each depositor, all of it by default; returns the amounts withdrawn
+    ids = self._ids(ids)
+    wanted = np.minimum(np.broadcast_to(amounts, ids.shape), self.compounded(ids))
+    ids, taken = self._touch(ids, -wanted)
+    self.columns["withdrawn"][ids] -= taken
+    self.total += float(taken.sum())
+    return -taken
+
+  def to_frame(self):
+    import pandas as pd
+    return pd.DataFrame({"deposit": self.compounded(), "ETH_gain": self["paid_ETH"] + self.eth_gain(),
+                         "LQTY_gain": self["paid_LQTY"] + self.lqty_gain(),
+                         "deposited": self["deposited"], "withdrawn": self["withdrawn"] + self.shared_withdrawals()})
+
+  def state(self):
+    #arrays that restore the pool exactly
+    arrays = {name: self[name].copy() for name in self.columns}
+    arrays.update({"slot_epoch": self.slot_epoch, "slot_scale": self.slot_scale, "slot_next": self.slot_next,
+                   "sum_S": self.S, "sum_G": self.G, "sum_W": self.W})
+    arrays["scalars"] = np.array([self.total, self.P, self.epoch, self.scale, self.slot, self.offsets])
+    return arrays
+
+  @classmethod
+  def from_state(cls, arrays):
+    n = len(arrays["deposit"])
+    pool = cls(capacity=max(n, 1024))
+    for name, column in pool.columns.items():
+      column[:n] = arrays[name]
+    pool.n = n
+    pool.slot_epoch = np.array(arrays["slot_epoch"], dtype=np.int64)
+    pool.slot_scale = np.array(arrays["slot_scale"], dtype=np.int64)
+    pool.slot_next = np.array(arrays["slot_next"], dtype=np.int64)
+    pool.S = np.array(arrays["sum_S"], dtype=np.float64)
+    pool.G = np.array(arrays["sum_G"], dtype=np.float64)
+    pool.W = np.array(arrays["sum_W"], dtype=np.float64)
+    total, pool.P, epoch, scale, slot, offsets = (float(x) for x in arrays["scalars"])
+    pool.total = total
+    pool.epoch, pool.scale, pool.slot, pool.offsets = int(epoch), int(scale), int(slot), int(offsets)
+    return pool
+
+
+def initial_deposits(total, n, rng, sigma=1.0):
+  #n lognormal deposits that add up to total
+  weights = rng.lognormal(0, sigma, n)
+  return total * weights / weights.sum()
+
+
+def deposit_flows(pool, target, rng, k=16):
+  #deposit or withdraw the difference between the pool and its target size through k random depositors;
+  #a withdrawal they cannot cover is shared by every depositor, in O(1)
+  flow = target - pool.total
+  if not len(pool) or flow == 0:
+    return
+  ids = np.unique(rng.integers(0, len(pool), k))
+  if flow > 0:
+    pool.deposit(ids, flow / len(ids))
+    return
+  held = pool.compounded(ids)
+  taken = pool.withdraw(ids, held * min(1.0, -flow / held.sum())) if held.sum() > 0 else 0.0
+  pool.withdraw_share(-flow - np.sum(taken))
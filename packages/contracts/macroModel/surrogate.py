@@ -0,0 +1,263 @@
+"""Surrogate models
+
+A cheap emulator of the macro model, trained on stored runs: the summaries
+of a sweep cache (macroModel.sweep) or saved ensembles (EnsembleResult.save).
+It maps the config fields that vary in the training data to summary metrics
+with a small multilayer perceptron fitted in NumPy, reports its error on
+points held out of the fit, and answers a query in well under a millisecond.
+
+A query outside the training domain (a numeric field outside the range seen,
+a string field with a value never seen, or a change to a field that never
+varied) is answered by a real run instead. For a sweep surrogate that run
+goes through the sweep cache, so the next training includes it.
+
+    surrogate = train_on_sweeps(targets=["price_LUSD_p5", "n_liquidate_total"])
+    surrogate.validation                 # RMSE, MAE and R^2 per target
+    surrogate.query(theta=0.004, price_scenario="crash_month3.yaml")
+    surrogate.save("surrogate.npz")
+
+The seed is never a feature: runs that only differ by seed are noise the
+model averages over.
+"""
+
+import glob
+import json
+import os
+import warnings
+from dataclasses import asdict, fields, replace
+
+import numpy as np
+
+from .macro_model import SimulationConfig
+
+#config fields that are never features
+ignored_fields = ("seed",)
+
+
+# Training data
+
+def sweep_rows(cache_dir=None, current=True):
+  #config and summary of every complete entry of a sweep cache; with current, only runs of the current model code
+  from .sweep import default_cache_dir, code_version
+  cache_dir = os.path.expanduser(cache_dir or default_cache_dir)
+  rows = []
+  for path in sorted(glob.glob(os.path.join(cache_dir, "*", "*", "summary.json"))):
+    with open(path) as f:
+      entry = json.load(f)
+    if not current or entry["code"] == code_version():
+      rows.append({**entry["config"], **entry["summary"]})
+  return rows
+
+
+def ensemble_row(result):
+  #config and every quantile of every metric at the last step, e.g. Price_LUSD_p5; runs that stopped early
+  #count with their last values
+  from .ensemble import quantiles
+  row = asdict(result.config)
+  for metric, sketch in result.sketches.items():
+    row.update({f"{metric}_p{round(100*q):g}": float(sketch.quantile(q)[-1]) for q in quantiles})
+  row["n_runs_final"] = int(result.n_runs[-1])
+  return row
+
+
+def ensemble_rows(paths):
+  from .ensemble import EnsembleResult
+  return [ensemble_row(EnsembleResult.load(path)) for path in paths]
+
+
+# Model
+
+class MLP:
+  #tanh hidden layers and a linear output, fitted full batch with Adam on standardized data
+  def __init__(self, sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    self.weights = [rng.normal(0, np.sqrt(1/n_in), (n_in, n_out)) for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+    self.biases = [np.zeros(n_out) for n_out in sizes[1:]]
+
+  def forward(self, x):
+    activations = [x]
+    for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+      x = x @ w + b
+      if i < len(self.weights) - 1:
+        x = np.tanh(x)
+      activations.append(x)
+    return activations
+
+  def __call__(self, x):
+    return self.forward(x)[-1]
+
+  def fit(self, x, y, epochs=1000, rate=0.01, decay=1e-2):
+    params = self.weights + self.biases
+    m = [np.zeros_like(p) for p in params]
+    v = [np.zeros_like(p) for p in params]
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for t in range(1, epochs + 1):
+      activations = self.forward(x)
+      delta = (activations[-1] - y) * (2 / len(x))
+      grads_w, grads_b = [], []
+      for i in range(len(self.weights) - 1, -1, -1):
+        grads_w.append(activations[i].T @ delta + decay * self.weights[i])
+        grads_b.append(delta.sum(axis=0))
+        if i:
+          delta = (delta @ self.weights[i].T) * (1 - activations[i]**2)
+      grads = grads_w[::-1] + grads_b[::-1]
+      for p, g, m_, v_ in zip(params, grads, m, v):
+        m_ *= beta1
+        m_ += (1 - beta1) * g
+        v_ *= beta2
+        v_ += (1 - beta2) * g * g
+        p -= rate * (m_ / (1 - beta1**t)) / (np.sqrt(v_ / (1 - beta2**t)) + eps)
+    return self
+
+
+class Surrogate:
+  def __init__(self, numeric, categorical, constants, targets, source, mlp, scales, domain, validation):
+    #numeric: varying numeric fields; categorical: varying string field -> values seen; constants: field -> value
+    self.numeric = numeric
+    self.categorical = categorical
+    self.constants = constants
+    self.targets = targets
+    #("sweep", cache_dir) or ("ensemble", n_runs)
+    self.source = source
+    self.mlp = mlp
+    #mean and standard deviation of the numeric features and of the targets
+    self.scales = scales
+    #field -> (min, max) over the training data
+    self.domain = domain
+    #target -> {"rmse", "mae", "r2", "n"} on the held-out points
+    self.validation = validation
+
+  def features(self, rows):
+    x_mean, x_sd = self.scales["x"]
+    x = [(np.array([[row[name] for name in self.numeric] for row in rows], dtype=np.float64).reshape(len(rows), -1) - x_mean) / x_sd]
+    for name, values in self.categorical.items():
+      x.append(np.array([[row[name] == value for value in values] for row in rows], dtype=np.float64).reshape(len(rows), -1))
+    return np.hstack(x)
+
+  def evaluate(self, rows):
+    #targets of dicts of config fields, one row each
+    y_mean, y_sd = self.scales["y"]
+    return self.mlp(self.features(rows)) * y_sd + y_mean
+
+  def predict(self, configs):
+    #one row of targets per config, a SimulationConfig or a dict of its fields
+    import pandas as pd
+    rows = [asdict(config) if isinstance(config, SimulationConfig) else config for config in configs]
+    return pd.DataFrame(self.evaluate(rows), columns=self.targets)
+
+  def outside(self, config):
+    #the reasons a config (or a dict of its fields) is outside the training domain, empty when inside
+    row = asdict(config) if isinstance(config, SimulationConfig) else config
+    reasons = [f"{name}={row[name]!r}, trained on {value!r}" for name, value in self.constants.items() if row[name] != value]
+    reasons += [f"{name}={row[name]!r} outside [{lo!r}, {hi!r}]" for name, (lo, hi) in self.domain.items()
+                if not lo <= row[name] <= hi]
+    reasons += [f"{name}={row[name]!r} not among {values!r}" for name, values in self.categorical.items()
+                if row[name] not in values]
+    return reasons
+
+  def config(self, **overrides):
+    #the default config with the fields that never varied in training, then overrides
+    known = {f.name for f in fields(SimulationConfig)}
+    return replace(SimulationConfig(**{name: value for name, value in self.constants.items() if name in known}), **overrides)
+
+  def query(self, config=None, **overrides):
+    #targets of one what-if, from the model inside its domain and from a real run outside it
+    config = replace(config, **overrides) if config is not None else self.config(**overrides)
+    row = asdict(config)
+    reasons = self.outside(row)
+    if not reasons:
+      return {"source": "surrogate", **dict(zip(self.targets, self.evaluate([row])[0].tolist()))}
+    row = self.simulate(config)
+    return {"source": "simulation", "outside": reasons, **{target: row[target] for target in self.targets}}
+
+  def simulate(self, config):
+    kind, value = self.source
+    if kind == "sweep":
+      from .sweep import run_sweep
+      return run_sweep([{}], base=config, workers=1, cache_dir=value).iloc[0].to_dict()
+    from .ensemble import run_ensemble
+    return ensemble_row(run_ensemble(config, n_runs=value, seed=config.seed))
+
+  def save(self, path):
+    arrays = {f"weight{i}": w for i, w in enumerate(self.mlp.weights)}
+    arrays.update({f"bias{i}": b for i, b in enumerate(self.mlp.biases)})
+    arrays.update({f"scale_{name}_{i}": a for name, pair in self.scales.items() for i, a in enumerate(pair)})
+    meta = {"numeric": self.numeric, "categorical": self.categorical, "constants": self.constants,
+            "targets": self.targets, "source": self.source, "domain": self.domain, "validation": self.validation}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+    np.savez(path, **arrays)
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as f:
+      arrays = {name: f[name] for name in f.files}
+    meta = json.loads(arrays.pop("meta").tobytes().decode())
+    mlp = MLP.__new__(MLP)
+    n = sum(name.startswith("weight") for name in arrays)
+    mlp.weights = [arrays[f"weight{i}"] for i in range(n)]
+    mlp.biases = [arrays[f"bias{i}"] for i in range(n)]
+    scales = {name: (arrays[f"scale_{name}_0"], arrays[f"scale_{name}_1"]) for name in ("x", "y")}
+    domain = {name: tuple(bounds) for name, bounds in meta["domain"].items()}
+    return cls(meta["numeric"], meta["categorical"], meta["constants"], meta["targets"], tuple(meta["source"]),
+               mlp, scales, domain, meta["validation"])
+
+
+def fit(rows, source, targets=None, hidden=(32, 32), epochs=1000, decay=1e-2, holdout=0.2, seed=0):
+  #a Surrogate of rows holding every SimulationConfig field and the targets
+  if len(rows) < 2:
+    raise ValueError(f"a surrogate needs at least 2 training runs, got {len(rows)}")
+  config_fields = [f.name for f in fields(SimulationConfig)]
+  if targets is None:
+    targets = [name for name in rows[0] if name not in config_fields and isinstance(rows[0][name], (int, float))]
+  numeric, categorical, constants = [], {}, {}
+  for name in config_fields:
+    if name in ignored_fields:
+      continue
+    values = [row[name] for row in rows]
+    if all(value == values[0] for value in values):
+      constants[name] = values[0]
+    elif isinstance(values[0], str):
+      categorical[name] = sorted(set(values))
+    else:
+      numeric.append(name)
+  domain = {name: (min(row[name] for row in rows), max(row[name] for row in rows)) for name in numeric}
+
+  #the held-out points only measure the error, the model is fitted on the others
+  order = np.random.default_rng(seed).permutation(len(rows))
+  n_holdout = int(round(holdout * len(rows))) if len(rows) >= 5 else 0
+  if holdout > 0 and not n_holdout:
+    warnings.warn(f"{len(rows)} training runs leave none to hold out, the surrogate is not validated", stacklevel=2)
+  held, kept = order[:n_holdout], order[n_holdout:]
+  x_raw = np.array([[row[name] for name in numeric] for row in rows], dtype=np.float64).reshape(len(rows), -1)
+  y_raw = np.array([[row[name] for name in targets] for row in rows], dtype=np.float64)
+  x_scale = (x_raw[kept].mean(axis=0), np.where(x_raw[kept].std(axis=0) > 0, x_raw[kept].std(axis=0), 1.0))
+  y_scale = (y_raw[kept].mean(axis=0), np.where(y_raw[kept].std(axis=0) > 0, y_raw[kept].std(axis=0), 1.0))
+  surrogate = Surrogate(numeric, categorical, constants, list(targets), source, None,
+                        {"x": x_scale, "y": y_scale}, domain, {})
+  x = surrogate.features(rows)
+  y = (y_raw - y_scale[0]) / y_scale[1]
+  surrogate.mlp = MLP([x.shape[1], *hidden, len(targets)], seed).fit(x[kept], y[kept], epochs=epochs, decay=decay)
+
+  if n_holdout:
+    error = surrogate.mlp(x[held]) * y_scale[1] + y_scale[0] - y_raw[held]
+    spread = ((y_raw[held] - y_raw[held].mean(axis=0))**2).sum(axis=0)
+    for j, target in enumerate(targets):
+      surrogate.validation[target] = {"rmse": float(np.sqrt((error[:, j]**2).mean())), "mae": float(np.abs(error[:, j]).mean()),
+                                      "r2": float(1 - (error[:, j]**2).sum() / spread[j]) if spread[j] > 0 else float("nan"),
+                                      "n": int(n_holdout)}
+  else:
+    #n = 0 tells the caller that nothing was held out
+    nan = float("nan")
+    surrogate.validation = {target: {"rmse": nan, "mae": nan, "r2": nan, "n": 0} for target in targets}
+  return surrogate
+
+
+def train_on_sweeps(cache_dir=None, targets=None, current=True, **kwargs):
+  return fit(sweep_rows(cache_dir, current), ("sweep", cache_dir), targets, **kwargs)
+
+
+def train_on_ensembles(paths, targets=None, **kwargs):
+  #every ensemble should have the same number of runs; queries outside the domain run that many
+  from .ensemble import EnsembleResult
+  n_runs = len(EnsembleResult.load(paths[0]).seeds)
+  return fit(ensemble_rows(paths), ("ensemble", n_runs), targets, **kwargs)
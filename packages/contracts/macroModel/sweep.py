@@ -0,0 +1,191 @@
+"""Parameter sweeps
+
+Runs the macro model over a grid of SimulationConfig overrides on a worker
+pool. Every run is stored in a content-addressed cache: the key hashes the
+full config together with the source of every module of the package, so
+rerunning an overlapping grid only computes the new points and any change to
+the model code invalidates old entries. Files a config refers to (a price
+history, a scenario file, a trove snapshot and their metadata) are hashed by
+content, so editing one in place invalidates its entries too. Points that
+share their exogenous paths, because they only differ in parameters the
+paths do not depend on, read them from one shared memory block published
+before the pool starts.
+
+    from macroModel.sweep import grid, run_sweep
+    summary = run_sweep(grid(alpha=[0.1, 0.3], theta=[0.001, 0.002]), workers=4)
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+from dataclasses import asdict, replace, fields
+from multiprocessing import Pool
+
+import numpy as np
+
+from .macro_model import SimulationConfig, Simulation, exogenous_paths, path_key
+from .shared import SharedArrays, attach
+
+default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "macroModel")
+_code_version = None
+#content digests by (path, mtime, size), so large histories are hashed once per process
+_file_digests = {}
+
+
+def code_version():
+  global _code_version
+  if _code_version is None:
+    #every module rather than a list of the ones a run imports, which would go stale as the model grows
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(name for name in os.listdir(here) if name.endswith(".py")):
+      with open(os.path.join(here, name), "rb") as f:
+        digest.update(name.encode() + b"\0" + f.read())
+    _code_version = digest.hexdigest()[:16]
+  return _code_version
+
+
+def file_digest(path):
+  stat = os.stat(path)
+  key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+  if key not in _file_digests:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+      for block in iter(lambda: f.read(1 << 20), b""):
+        digest.update(block)
+    _file_digests[key] = digest.hexdigest()
+  return _file_digests[key]
+
+
+def config_files(config):
+  #files whose content the trajectory of a run depends on, with the metadata files next to them
+  files = []
+  if config.price_history:
+    files.append(config.price_history)
+  if config.price_scenario.endswith((".json", ".yaml", ".yml")):
+    files.append(config.price_scenario)
+  if config.trove_snapshot:
+    files.append(config.trove_snapshot)
+  return files + [path + ".json" for path in files if os.path.exists(path + ".json")]
+
+
+def config_key(config):
+  key = {"config": asdict(config), "code": code_version()}
+  files = config_files(config)
+  if files:
+    key["files"] = {path: file_digest(path) for path in files}
+  payload = json.dumps(key, sort_keys=True)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def grid(**params):
+  #cartesian product of parameter values, e.g. grid(alpha=[0.1, 0.3], beta=[0.2])
+  names = list(params)
+  return [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+
+def summarize(data):
+  price = data["Price_LUSD"]
+  return {"steps": len(price),
+          "price_LUSD_final": float(price[-1]), "price_LUSD_min": float(price.min()),
+          "price_LUSD_max": float(price.max()), "price_LUSD_p5": float(np.percentile(price, 5)),
+          "price_LUSD_p95": float(np.percentile(price, 95)),
+          "n_troves_final": int(data["n_troves"][-1]), "supply_LUSD_final": float(data["supply_LUSD"][-1]),
+          "stability_min": float(data["stability"].min()), "liquidity_min": float(data["liquidity"].min()),
+          "n_liquidate_total": int(data["n_liquidate"].sum()), "n_redempt_total": int(data["n_redempt"].sum()),
+          "issuance_fee_total": float(data["issuance_fee"].sum()), "redemption_fee_total": float(data["redemption_fee"].sum())}
+
+
+class ResultCache:
+  def __init__(self, cache_dir=default_cache_dir):
+    self.cache_dir = cache_dir
+
+  def path(self, key):
+    return os.path.join(self.cache_dir, key[:2], key)
+
+  def summary(self, key):
+    try:
+      with open(os.path.join(self.path(key), "summary.json")) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return None
+
+  def series(self, key):
+    #time series of a cached run, one array per recorded metric
+    with np.load(os.path.join(self.path(key), "series.npz")) as f:
+      return {name: f[name] for name in f.files}
+
+  def store(self, key, config, data, summary):
+    path = self.path(key)
+    os.makedirs(path, exist_ok=True)
+    #series first and summary last, each via rename: an entry with a summary is complete
+    tmp = os.path.join(path, f"series.{os.getpid()}.tmp.npz")
+    np.savez_compressed(tmp, **data)
+    os.replace(tmp, os.path.join(path, "series.npz"))
+    tmp = os.path.join(path, f"summary.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+      json.dump({"config": asdict(config), "code": code_version(), "summary": summary}, f)
+    os.replace(tmp, os.path.join(path, "summary.json"))
+
+
+def sweep_point(args):
+  #args may end with the handle and key of paths published in shared memory
+  config, cache_dir, *shared = args
+  sim = Simulation(config, attach(*shared) if shared else None)
+  while not sim.done:
+    sim.step()
+  data = {name: sim.data[name] for name in sim.data.columns}
+  summary = summarize(data)
+  ResultCache(cache_dir).store(config_key(config), config, data, summary)
+  return summary
+
+
+def parse_value(config, name, text):
+  kind = {f.name: f.type for f in fields(config)}[name]
+  if kind in (bool, "bool"):
+    if text.lower() not in ("true", "false"):
+      raise ValueError(f"{name} takes true or false, got {text!r}")
+    return text.lower() == "true"
+  if kind in (int, "int"):
+    return int(text)
+  if kind in (float, "float"):
+    return float(text)
+  return text
+
+
+def run_sweep(points, base=None, workers=None, cache_dir=None):
+  #points are dicts of SimulationConfig overrides; returns one row per point with its cache key and summary
+  import pandas as pd
+  if base is None:
+    base = SimulationConfig()
+  if cache_dir is None:
+    cache_dir = default_cache_dir
+  cache = ResultCache(cache_dir)
+  configs = [replace(base, **point) for point in points]
+  keys = [config_key(config) for config in configs]
+  summaries = {key: cache.summary(key) for key in set(keys)}
+  missing = {key: config for key, config in zip(keys, configs) if summaries[key] is None}
+
+  tasks = [(config, cache_dir) for config in missing.values()]
+  if workers == 1 or len(tasks) <= 1:
+    computed = list(map(sweep_point, tasks))
+  else:
+    #paths used by more than one point are generated once here; the others by their worker
+    counts = collections.Counter(path_key(config) for config in missing.values())
+    first = {}
+    for config in missing.values():
+      if counts[path_key(config)] > 1:
+        first.setdefault(path_key(config), config)
+    with SharedArrays({key: exogenous_paths(config) for key, config in first.items()}) as shared:
+      tasks = [(config, cache_dir, shared.handle, path_key(config)) if path_key(config) in first else task
+               for config, task in zip(missing.values(), tasks)]
+      with Pool(workers) as pool:
+        computed = pool.map(sweep_point, tasks)
+  for key, summary in zip(missing, computed):
+    summaries[key] = {"summary": summary}
+
+  rows = [{**point, "key": key, "cached": key not in missing, **summaries[key]["summary"]}
+          for point, key in zip(points, keys)]
+  return pd.DataFrame(rows)
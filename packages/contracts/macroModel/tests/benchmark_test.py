@@ -0,0 +1,24 @@
+from macroModel.benchmark import compare
+
+
+def result(steps_per_sec, rss, liquidate, adjust):
+  total = liquidate + adjust
+  return {"steps_per_sec": steps_per_sec, "peak_rss_mb": rss, "phase_ms": {"liquidate": liquidate, "adjust": adjust},
+          "phase_share": {"liquidate": liquidate / total, "adjust": adjust / total}}
+
+
+def test_compare_flags_slower_and_larger_runs():
+  baseline = {"1k": result(1000.0, 100.0, 0.2, 0.8)}
+  rows = compare({"1k": result(1000.0, 100.0, 0.2, 0.8)}, baseline)
+  assert not rows["regression"].any()
+  rows = compare({"1k": result(700.0, 130.0, 0.2, 0.8)}, baseline).set_index("metric")
+  assert rows.loc["steps_per_sec", "regression"] and rows.loc["peak_rss_mb", "regression"]
+  assert compare({"10k": result(1.0, 1.0, 1.0, 1.0)}, baseline).empty
+
+
+def test_compare_flags_phases_only_when_the_step_is_slower():
+  baseline = {"1k": result(1000.0, 100.0, 0.2, 0.8)}
+  rows = compare({"1k": result(1000.0, 100.0, 0.8, 0.2)}, baseline)
+  assert not rows["regression"].any()
+  rows = compare({"1k": result(600.0, 100.0, 0.8, 0.8)}, baseline).set_index("metric")
+  assert rows.loc["liquidate_ms", "regression"] and not rows.loc["adjust_ms", "regression"]
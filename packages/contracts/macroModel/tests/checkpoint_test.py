@@ -0,0 +1,63 @@
+import numpy as np
+
+from macroModel import SimulationConfig, Simulation, run, resume, save_checkpoint, load_checkpoint
+from macroModel.macro_model import month
+
+
+def test_resume_equals_uninterrupted_run(tmp_path):
+  config = SimulationConfig(seed=0, n_sim=900)
+  expected = run(config).data
+  path = str(tmp_path / "run.npz")
+  sim = Simulation(config)
+  while sim.index < 400:
+    sim.step()
+  save_checkpoint(sim, path)
+  del sim
+  assert resume(path).data.equals(expected)
+
+
+def test_checkpoints_past_the_first_month_keep_its_LQTY_prices_only(tmp_path):
+  config = SimulationConfig(seed=1, n_sim=1200)
+  expected = run(config).data
+  path = str(tmp_path / "run.npz")
+  sim = Simulation(config)
+  while sim.index < 1000:
+    sim.step()
+  save_checkpoint(sim, path)
+  sim = load_checkpoint(path)
+  assert len(sim.price_LQTY) == month
+  assert sim.run().data.equals(expected)
+
+
+def test_periodic_checkpoints_resume_from_the_last_one(tmp_path):
+  config = SimulationConfig(seed=2, n_sim=700, n_depositors=500, fee_policy="base_rate")
+  path = str(tmp_path / "run.npz")
+  expected = Simulation(config).run(checkpoint_every=250, checkpoint_path=path)
+  sim = load_checkpoint(path)
+  assert sim.index == 500
+  result = sim.run()
+  assert result.data.equals(expected.data)
+  assert result.troves.to_frame().equals(expected.troves.to_frame())
+  assert result.depositors.to_frame().equals(expected.depositors.to_frame())
+
+
+def test_float32_recording_resumes_exactly(tmp_path):
+  config = SimulationConfig(seed=0, n_sim=600)
+  expected = Simulation(config, precision="float32").run().data
+  sim = Simulation(config, precision="float32")
+  while sim.index < 300:
+    sim.step()
+  path = str(tmp_path / "run.npz")
+  save_checkpoint(sim, path)
+  data = resume(path).data
+  assert data.equals(expected)
+  assert data["Price_LUSD"].dtype == np.float32
+
+
+def test_adaptive_runs_resume_exactly(tmp_path):
+  config = SimulationConfig(seed=0, n_sim=800, initial_troves=1000, time_step="adaptive")
+  path = str(tmp_path / "run.npz")
+  expected = Simulation(config).run(checkpoint_every=300, checkpoint_path=path)
+  result = load_checkpoint(path).run()
+  assert result.data.equals(expected.data)
+  assert result.troves.to_frame().equals(expected.troves.to_frame())
@@ -0,0 +1,72 @@
+import numpy as np
+
+from macroModel import SimulationConfig
+from macroModel.ensemble import QuantileSketch, EnsembleResult, run_ensemble
+
+
+def exact_quantile(values, q):
+  values = np.sort(values)
+  return values[int(np.floor(q * (len(values) - 1)))]
+
+
+def test_quantiles_are_within_relative_accuracy():
+  rng = np.random.default_rng(0)
+  runs = rng.lognormal(0, 2, (300, 5))
+  sketch = QuantileSketch(5, 0.01, buffer=7)
+  for run in runs:
+    sketch.add(run)
+  for q in (0.01, 0.5, 0.99):
+    exact = np.array([exact_quantile(runs[:, step], q) for step in range(5)])
+    assert np.all(np.abs(sketch.quantile(q) - exact) <= 0.01 * exact)
+
+
+def test_values_a_bucket_holds_alone_are_exact():
+  sketch = QuantileSketch(2, 0.005)
+  for value in (10.0, 10.0, 1.0):
+    sketch.add([value, 1.0])
+  assert sketch.quantile(0.5)[0] == 10.0
+  assert sketch.quantile(0.0)[0] == 1.0
+  assert sketch.quantile(0.5)[1] == 1.0
+
+
+def test_nan_is_skipped_and_zero_counted():
+  sketch = QuantileSketch(2, 0.01)
+  sketch.add([np.nan, 0.0])
+  sketch.add([2.0, 2.0])
+  assert list(sketch.n) == [1, 2]
+  assert sketch.quantile(0.0)[0] == 2.0
+  assert sketch.quantile(0.0)[1] == 0.0
+
+
+def test_stopped_runs_are_carried_forward():
+  sketch = QuantileSketch(4, 0.01)
+  sketch.add([1.0, 1.0, 1.0, 1.0])
+  sketch.add([5.0])
+  assert list(sketch.n) == [2, 2, 2, 2]
+  assert list(sketch.stopped) == [0, 1, 1, 1]
+  assert sketch.quantile(1.0)[3] == 5.0
+
+
+def test_merge_order_does_not_matter():
+  rng = np.random.default_rng(1)
+  runs = [rng.normal(1, 0.1, rng.integers(1, 50)) for _ in range(40)]
+  a, b = QuantileSketch(50, 0.001, buffer=3), QuantileSketch(50, 0.001, buffer=64)
+  for run in runs:
+    a.add(run)
+  for run in runs[::-1]:
+    b.add(run)
+  for name, array in a.state().items():
+    assert np.array_equal(array, b.state()[name])
+
+
+def test_ensemble_is_the_same_for_any_worker_count(tmp_path):
+  config = SimulationConfig(n_sim=400)
+  serial = run_ensemble(config, n_runs=6, seed=1, workers=1)
+  parallel = run_ensemble(config, n_runs=6, seed=1, workers=3)
+  assert serial.quantiles().equals(parallel.quantiles())
+  for metric, sketch in serial.sketches.items():
+    for name, array in sketch.state().items():
+      assert np.array_equal(array, parallel.sketches[metric].state()[name])
+  path = str(tmp_path / "ensemble.npz")
+  serial.save(path)
+  assert EnsembleResult.load(path).quantiles().equals(serial.quantiles())
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from macroModel.history import convert, PriceHistory
+
+
+def test_convert_and_resample(tmp_path):
+  csv = tmp_path / "prices.csv"
+  #minute prices with a gap, out of order
+  rows = [(1600000000 + 60*i, 100.0 + i) for i in range(120) if not 30 <= i < 40]
+  rows = rows[::-1]
+  csv.write_text("time,price\n" + "".join(f"{t},{p}\n" for t, p in rows))
+  history = convert(str(csv), str(tmp_path / "prices.npy"), chunk_rows=7)
+  assert len(history) == 120
+  assert history.prices[35] == 129.0
+  again = PriceHistory(str(tmp_path / "prices.npy"))
+  assert list(again.resample(600, 12)) == [100.0 + 10*i if i != 3 else 129.0 for i in range(12)]
+  with pytest.raises(ValueError):
+    again.resample(600, 13)
@@ -0,0 +1,133 @@
+import subprocess
+import sys
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from macroModel import SimulationConfig, Simulation, run, run_lockstep, FixedFee, BaseRate, PhaseProfiler
+from macroModel.macro_model import bridge_prices, derived, derived_columns, exogenous_paths, shock_draws, steady_population
+
+
+def test_runs_are_reproducible():
+  config = SimulationConfig(seed=1, n_sim=500)
+  assert run(config).data.equals(run(config).data)
+  assert not run(config).data.equals(run(SimulationConfig(seed=2, n_sim=500)).data)
+
+
+def test_passing_the_paths_of_the_config_changes_nothing():
+  config = SimulationConfig(seed=0, n_sim=500)
+  assert run(config, paths=exogenous_paths(config)).data.equals(run(config).data)
+
+
+def test_shock_paths_drawn_in_blocks_equal_whole_paths():
+  config = SimulationConfig(seed=0, n_sim=20000)
+  whole, lazy = exogenous_paths(config), exogenous_paths(config, lazy=True)
+  for name in shock_draws(config):
+    path = whole[name]
+    steps = [0, 8191, 8192, 19999, 5, len(path) - 1]
+    assert [lazy[name][i] for i in steps] == [path[i] for i in steps]
+    assert np.array_equal(np.asarray(lazy[name]), path) and np.array_equal(lazy[name][100:200], path[100:200])
+
+
+def test_dropped_columns_are_derived_again():
+  config = SimulationConfig(seed=0, n_sim=800)
+  full = run(config).data
+  data = run(config, drop_derived=True).data
+  assert not set(derived) & set(data.columns)
+  for name, column in derived_columns(config, data).items():
+    assert np.allclose(column, full[name], rtol=1e-12)
+
+
+def test_steady_population_starts_inside_the_bands():
+  config = SimulationConfig()
+  troves = steady_population(config, 10_000, 1000.0, np.random.default_rng(0))
+  CR = 1000.0 * troves["Ether_Quantity"] / troves["Supply"]
+  assert np.allclose(CR, troves["CR_current"])
+  assert np.all(CR >= 1.1)
+  tau = troves["Rational_inattention"]
+  assert np.all(CR >= troves["CR_initial"] * (1 - tau)) and np.all(CR <= troves["CR_initial"] * (1 + 2*tau))
+
+
+def test_totals_follow_the_troves():
+  config = SimulationConfig(seed=0, n_sim=600, initial_troves=2000)
+  sim = Simulation(config)
+  result = sim.run()
+  troves = result.troves.to_frame()
+  assert result.data["n_troves"].iloc[-1] == len(troves)
+  assert np.isclose(sim.troves.total_supply, troves["Supply"].sum())
+  assert np.isclose(sim.troves.total_ether, troves["Ether_Quantity"].sum())
+
+
+def test_steps_leave_the_trove_index_merged():
+  #the phases that change troves merge the index themselves, so a later phase does not pay for it
+  sim = Simulation(SimulationConfig(seed=0, n_sim=300, initial_troves=2000))
+  while not sim.done:
+    sim.step()
+    assert not sim.troves.sorted.queue
+
+
+def test_lockstep_runs_equal_separate_runs():
+  config = SimulationConfig(seed=0, n_sim=500)
+  policies = [FixedFee(), BaseRate(), FixedFee(rate_issuance=0.02)]
+  separate = [run(config, policy=policy).data for policy in policies]
+  for workers in (1, 2):
+    for result, data in zip(run_lockstep(config, policies, workers=workers), separate):
+      assert result.data.equals(data)
+  assert run(config, policy=BaseRate()).data.equals(run(SimulationConfig(seed=0, n_sim=500, fee_policy="base_rate")).data)
+
+
+def test_profiler_does_not_change_the_run(tmp_path):
+  config = SimulationConfig(seed=0, n_sim=300)
+  profiler = PhaseProfiler()
+  assert run(config, profiler=profiler).data.equals(run(config).data)
+  steps = profiler.summary()["steps"]
+  assert steps["liquidate"] == steps["record"] == 299
+  path = tmp_path / "trace.json"
+  profiler.write_trace(str(path))
+  assert path.stat().st_size > 0
+
+
+def test_adaptive_steps_without_substeps_equal_hourly_steps():
+  config = SimulationConfig(seed=0, n_sim=1500, initial_troves=2000, sd_ether=0.005)
+  sim = Simulation(replace(config, time_step="adaptive", substeps=1))
+  adaptive = sim.run()
+  hourly = run(config)
+  assert adaptive.data.equals(hourly.data)
+  troves = adaptive.troves.to_frame().drop(columns="CR_current")
+  assert troves.equals(hourly.troves.to_frame().drop(columns="CR_current"))
+  assert sim.quiet_steps > 1000
+
+
+def test_refined_steps_liquidate_along_the_bridge():
+  config = SimulationConfig(seed=1, n_sim=600, initial_troves=2000, sd_ether=0.03, time_step="adaptive")
+  refined = run(config).data
+  assert refined.equals(run(config).data)
+  hourly = run(replace(config, time_step="hourly")).data
+  moves = np.abs(np.diff(np.log(exogenous_paths(config)["price_ether"][:config.n_sim])))
+  first = np.flatnonzero(moves > config.refine_move)[0] + 1
+  assert refined.iloc[:first].equals(hourly.iloc[:first])
+  assert refined["n_liquidate"].sum() > hourly["n_liquidate"].sum()
+
+
+def test_bridge_ends_at_the_next_price():
+  prices = bridge_prices(100.0, 90.0, 0.02, 60, np.random.default_rng(0))
+  assert len(prices) == 60 and prices[-1] == pytest.approx(90.0)
+  flat = bridge_prices(100.0, 90.0, 0.0, 60, np.random.default_rng(0))
+  assert np.allclose(np.diff(np.log(flat)), np.log(0.9) / 60)
+
+
+def test_unknown_time_step():
+  with pytest.raises(ValueError):
+    SimulationConfig(time_step="daily")
+
+
+def test_import_leaves_the_plotting_libraries_alone():
+  code = "import sys, macroModel; print(sorted({'plotly', 'matplotlib', 'scipy'} & set(sys.modules)))"
+  out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+  assert out.strip() == "[]"
+
+
+def test_unknown_fee_policy():
+  with pytest.raises(ValueError):
+    SimulationConfig(fee_policy="flat")
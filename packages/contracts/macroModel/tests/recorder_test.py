@@ -0,0 +1,43 @@
+import numpy as np
+
+from macroModel.recorder import RollingSum, StepRecorder
+
+
+def test_rolling_sum_covers_the_last_steps():
+  window = RollingSum(4)
+  values = np.arange(1, 12, dtype=np.float64)
+  for i, value in enumerate(values):
+    window.push(value)
+    assert window.total == values[max(0, i - 3):i + 1].sum()
+
+
+def test_recorder_windows_and_state():
+  recorder = StepRecorder(10, ("a", "n_troves"), windows=(3,), tracked=("a",))
+  for i in range(6):
+    recorder.record({"a": float(i), "n_troves": i})
+  assert len(recorder) == 6
+  assert recorder.last("a") == 5.0
+  assert recorder.window_sum("a", 3) == 3 + 4 + 5
+  assert recorder["n_troves"].dtype == np.int64
+  assert list(recorder.to_frame()["a"]) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+  copy = StepRecorder(10, ("a", "n_troves"), windows=(3,), tracked=("a",))
+  copy.restore(recorder.state())
+  copy.record({"a": 6.0, "n_troves": 6})
+  recorder.record({"a": 6.0, "n_troves": 6})
+  assert copy.to_frame().equals(recorder.to_frame())
+  assert copy.window_sum("a", 3) == recorder.window_sum("a", 3)
+
+
+def test_float32_recording_reads_back_full_precision():
+  recorder = StepRecorder(4, ("a",), precision="float32")
+  recorder.record({"a": 1 / 3})
+  assert recorder["a"].dtype == np.float32
+  assert recorder.last("a") == 1 / 3
+
+
+def test_seed_window():
+  recorder = StepRecorder(4, ("a",), windows=(24,), tracked=("a",))
+  recorder.seed_window("a", 2.0)
+  assert recorder.window_sum("a", 24) == 48.0
+  recorder.record({"a": 0.0})
+  assert recorder.window_sum("a", 24) == 46.0
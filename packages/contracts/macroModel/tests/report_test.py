@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from macroModel import SimulationConfig, run
+from macroModel.report import lttb, minmax
+
+
+def test_lttb_keeps_the_ends_and_the_spike():
+  x = np.arange(10_000, dtype=np.float64)
+  y = np.sin(x / 500)
+  y[4321] = 5.0
+  xs, ys = lttb(x, y, 200)
+  assert len(xs) == 200
+  assert xs[0] == 0 and xs[-1] == 9_999
+  assert 5.0 in ys
+  assert np.all(np.diff(xs) > 0)
+
+
+def test_minmax_keeps_the_extremes_of_every_bucket():
+  rng = np.random.default_rng(0)
+  x = np.arange(1000, dtype=np.float64)
+  y = rng.integers(0, 50, 1000).astype(np.float64)
+  xs, ys = minmax(x, y, 100)
+  assert len(xs) <= 100 and np.all(np.diff(xs) > 0)
+  assert ys.max() == y.max() and ys.min() == y.min()
+
+
+def test_report_size_does_not_grow_with_the_run(tmp_path):
+  pytest.importorskip("plotly")
+  from macroModel.report import write_report
+  sizes = []
+  for n_sim in (2000, 6000):
+    path = tmp_path / f"{n_sim}.html"
+    write_report(run(SimulationConfig(n_sim=n_sim)), str(path), n_out=200, workers=1)
+    sizes.append(path.stat().st_size)
+  assert sizes[1] < 1.1 * sizes[0]
@@ -0,0 +1,20 @@
+import numpy as np
+
+from macroModel.rng import Streams
+
+
+def test_streams_do_not_depend_on_the_order_of_draws():
+  a, b = Streams(7), Streams(7)
+  first = a.step("adjust", 10).random(5)
+  a.path("ether").normal(size=100)
+  b.step("open_troves", 3).random(50)
+  assert np.array_equal(b.step("adjust", 10).random(5), first)
+  assert np.array_equal(a.step("adjust", 10).random(5), first)
+
+
+def test_streams_are_distinct():
+  streams = Streams(7)
+  draws = [streams.step("adjust", 0).random(4), streams.step("adjust", 1).random(4),
+           streams.step("close_sample", 0).random(4), streams.path("adjust_ratio").random(4),
+           Streams(8).step("adjust", 0).random(4)]
+  assert len({tuple(d) for d in draws}) == len(draws)
@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+import pytest
+
+from macroModel.scenarios import load_scenario, price_paths, regime_bounds, scenarios
+
+
+def test_regime_bounds():
+  regimes = [{"until": 10}, {"steps": 5}, {"steps": 100}, {}]
+  assert regime_bounds(regimes, 50) == [(1, 10), (10, 15), (15, 50), (50, 50)]
+
+
+def test_crash_and_drift():
+  rng = np.random.default_rng(0)
+  scenario = {"initial": 100, "sd": 0.0, "regimes": [{"until": 11, "drift": 0.01}, {"steps": 10, "crash": 0.5}, {}]}
+  prices = price_paths(scenario, 30, rng)
+  assert np.isclose(prices[10], 100 * 1.01**10)
+  assert np.isclose(prices[20] / prices[10], 0.5)
+  assert np.allclose(prices[20:], prices[20])
+
+
+def test_many_paths_match_single_ones():
+  shocks = np.random.default_rng(1).standard_normal((3, 99))
+  batch = price_paths("crash_recovery", 100, shocks=shocks)
+  for path, shock in zip(batch, shocks):
+    assert np.allclose(path, price_paths("crash_recovery", 100, shocks=shock))
+
+
+def test_reverting_regime_approaches_its_level():
+  scenario = {"initial": 100, "sd": 0.0, "regimes": [{"revert": {"speed": 0.05, "level": 2.0}}]}
+  prices = price_paths(scenario, 2000, np.random.default_rng(0))
+  assert np.isclose(prices[-1], 200)
+
+
+def test_scenario_files(tmp_path):
+  path = tmp_path / "crash.json"
+  path.write_text(json.dumps(scenarios["four_stage"]))
+  assert load_scenario(str(path)) == load_scenario("four_stage")
+  with pytest.raises(ValueError):
+    load_scenario({"regimes": [{"speed": 1}]})
+  with pytest.raises(ValueError):
+    load_scenario("no_such_scenario")
+
+
+def test_jumps_need_an_rng():
+  shocks = np.zeros(99)
+  assert price_paths("random_walk", 100, shocks=shocks)[-1] == 1000.0
+  with pytest.raises(ValueError):
+    price_paths({"regimes": [{"jumps": {"rate": 0.1}}]}, 100, shocks=shocks)
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from macroModel import SimulationConfig
+from macroModel.macro_model import exogenous_paths
+from macroModel.shared import SharedArrays, attach
+
+
+def test_attached_views_are_read_only_copies_of_the_paths():
+  paths = exogenous_paths(SimulationConfig(n_sim=100))
+  with SharedArrays({"a": paths, "b": {"x": np.arange(3, dtype=np.int32)}}) as shared:
+    views = attach(shared.handle, "a")
+    assert set(views) == set(paths)
+    for name, array in paths.items():
+      assert np.array_equal(views[name], array) and views[name].dtype == array.dtype
+    assert list(attach(shared.handle, "b")["x"]) == [0, 1, 2]
+    with pytest.raises(ValueError):
+      views["price_ether"][0] = 1.0
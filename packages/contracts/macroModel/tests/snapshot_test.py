@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+
+from macroModel import Simulation
+from macroModel.snapshot import default_age, load_snapshot, snapshot_age, snapshot_config
+
+
+def write_snapshot(tmp_path, n=200):
+  rng = np.random.default_rng(0)
+  coll = rng.uniform(1, 20, n)
+  debt = coll * 2000 / rng.uniform(1.2, 3, n)
+  troves = [{"coll": c, "debt": d} for c, d in zip(coll, debt)] + [{"coll": 0, "debt": 0}]
+  path = tmp_path / "troves.json"
+  path.write_text(json.dumps({"price": 2000, "stability_pool": 1e6, "timestamp": "2021-06-01",
+                              "deployed": "2021-04-05", "troves": troves}))
+  return str(path), coll, debt
+
+
+def test_load_json_and_csv(tmp_path):
+  path, coll, debt = write_snapshot(tmp_path)
+  meta, columns = load_snapshot(path)
+  assert np.allclose(columns["coll"], coll) and np.allclose(columns["debt"], debt)
+  assert snapshot_age(meta) == 57 * 24
+  assert snapshot_age({}) == default_age
+  csv = tmp_path / "troves.csv"
+  csv.write_text("owner,coll,debt\n" + "".join(f"x,{c*1e18},{d*1e18}\n" for c, d in zip(coll, debt)))
+  (tmp_path / "troves.csv.json").write_text(json.dumps({"decimals": 18}))
+  _, columns = load_snapshot(str(csv))
+  assert np.allclose(columns["coll"], coll) and np.allclose(columns["debt"], debt)
+
+
+def test_simulation_starts_from_the_snapshot(tmp_path):
+  path, coll, debt = write_snapshot(tmp_path)
+  config = snapshot_config(path, n_sim=200)
+  assert config.price_ether_initial == 2000
+  sim = Simulation(config)
+  assert sim.age == 57 * 24
+  assert len(sim.troves) == len(coll)
+  assert np.isclose(sim.troves.total_supply, debt.sum())
+  result = sim.run()
+  assert len(result.data) == 200
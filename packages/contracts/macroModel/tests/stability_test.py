@@ -0,0 +1,133 @@
+import numpy as np
+
+from macroModel.stability import DepositorPool, initial_deposits, deposit_flows
+
+
+class NaivePool:
+  #every deposit and gain updated at every event
+  def __init__(self):
+    self.deposit = np.zeros(0)
+    self.eth = np.zeros(0)
+    self.lqty = np.zeros(0)
+    self.withdrawn = np.zeros(0)
+
+  def add(self, amounts):
+    for name in ("deposit", "eth", "lqty", "withdrawn"):
+      setattr(self, name, np.append(getattr(self, name), np.zeros(len(amounts))))
+    self.deposit[-len(amounts):] = amounts
+
+  def offset(self, debt, ether):
+    total = self.deposit.sum()
+    if debt >= total:
+      self.eth += ether * (total / debt) * self.deposit / total
+      self.deposit[:] = 0
+      return
+    self.eth += ether * self.deposit / total
+    self.deposit -= debt * self.deposit / total
+
+  def issue(self, lqty):
+    self.lqty += lqty * self.deposit / self.deposit.sum()
+
+  def withdraw_share(self, amount):
+    share = amount * self.deposit / self.deposit.sum()
+    self.deposit -= share
+    self.withdrawn += share
+
+  def deposit_to(self, ids, amounts):
+    np.add.at(self.deposit, ids, amounts)
+
+  def withdraw(self, ids, amounts):
+    taken = np.minimum(amounts, self.deposit[ids])
+    self.deposit[ids] -= taken
+    self.withdrawn[ids] += taken
+
+
+def assert_same(pool, naive, atol=1e-9):
+  frame = pool.to_frame()
+  assert np.allclose(frame["deposit"], naive.deposit, rtol=1e-9, atol=1e-6)
+  assert np.allclose(frame["ETH_gain"], naive.eth, rtol=1e-9, atol=atol)
+  assert np.allclose(frame["LQTY_gain"], naive.lqty, rtol=1e-9, atol=atol)
+  assert np.allclose(frame["withdrawn"], naive.withdrawn, rtol=1e-9, atol=1e-6)
+  assert np.isclose(pool.total, naive.deposit.sum(), rtol=1e-9)
+
+
+def test_pool_matches_naive_model():
+  rng = np.random.default_rng(0)
+  pool, naive = DepositorPool(capacity=4), NaivePool()
+  amounts = initial_deposits(1e6, 50, rng)
+  pool.add(amounts)
+  naive.add(amounts)
+  for _ in range(200):
+    event = rng.integers(0, 5)
+    if event == 0:
+      debt = pool.total * rng.uniform(0, 0.3)
+      pool.offset(debt, debt / 1000 * 1.1)
+      naive.offset(debt, debt / 1000 * 1.1)
+    elif event == 1:
+      pool.issue(500.0)
+      naive.issue(500.0)
+    elif event == 2:
+      ids = rng.integers(0, len(pool), 5)
+      pool.deposit(ids, 1000.0)
+      naive.deposit_to(ids, 1000.0)
+    elif event == 3:
+      ids = np.unique(rng.integers(0, len(pool), 5))
+      pool.withdraw(ids, 5000.0)
+      naive.withdraw(ids, 5000.0)
+    else:
+      pool.withdraw_share(pool.total * 0.05)
+      naive.withdraw_share(naive.deposit.sum() * 0.05)
+    assert_same(pool, naive)
+
+
+def test_scale_changes_keep_gains():
+  #offsets that leave a tiny fraction of the pool push P through several scale changes
+  pool, naive = DepositorPool(), NaivePool()
+  pool.add([1e6, 3e6])
+  naive.add(np.array([1e6, 3e6]))
+  for _ in range(6):
+    debt = pool.total * (1 - 1e-4)
+    pool.offset(debt, 10.0)
+    naive.offset(debt, 10.0)
+    pool.issue(1.0)
+    naive.issue(1.0)
+    pool.add([1e6])
+    naive.add(np.array([1e6]))
+  assert pool.scale > 1
+  #as in the contract, gains made more than one scale after the snapshot of a deposit are dropped
+  assert_same(pool, naive, atol=1e-7)
+
+
+def test_emptying_the_pool_starts_a_new_epoch():
+  pool, naive = DepositorPool(), NaivePool()
+  pool.add([100.0, 300.0])
+  naive.add(np.array([100.0, 300.0]))
+  debt, ether = pool.offset(1000.0, 2.0)
+  naive.offset(1000.0, 2.0)
+  assert (debt, ether) == (400.0, 0.8)
+  assert pool.epoch == 1 and pool.total == 0
+  pool.add([50.0])
+  naive.add(np.array([50.0]))
+  pool.offset(25.0, 1.0)
+  naive.offset(25.0, 1.0)
+  assert_same(pool, naive)
+
+
+def test_deposit_flows_track_the_target():
+  rng = np.random.default_rng(1)
+  pool = DepositorPool()
+  pool.add(initial_deposits(1e6, 1000, rng))
+  for target in (1.2e6, 0.9e6, 0.1e6, 0.5e6):
+    deposit_flows(pool, target, rng)
+    assert np.isclose(pool.total, target)
+    assert np.isclose(pool.compounded().sum(), target)
+
+
+def test_state_round_trip():
+  rng = np.random.default_rng(2)
+  pool = DepositorPool()
+  pool.add(initial_deposits(1e5, 100, rng))
+  pool.offset(5e4, 30.0)
+  pool.issue(10.0)
+  copy = DepositorPool.from_state(pool.state())
+  assert copy.to_frame().equals(pool.to_frame())
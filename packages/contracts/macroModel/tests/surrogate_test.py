@@ -0,0 +1,37 @@
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+
+from macroModel import SimulationConfig
+from macroModel.surrogate import Surrogate, fit
+
+
+def rows(n, seed=0):
+  rng = np.random.default_rng(seed)
+  out = []
+  for alpha in rng.uniform(0.1, 0.5, n):
+    row = asdict(SimulationConfig(alpha=float(alpha)))
+    row["target"] = 2 * alpha + 1
+    out.append(row)
+  return out
+
+
+def test_fit_predicts_and_flags_the_domain(tmp_path):
+  surrogate = fit(rows(40), ("sweep", None), epochs=500)
+  assert surrogate.numeric == ["alpha"]
+  predicted = surrogate.predict([SimulationConfig(alpha=0.3)])["target"][0]
+  assert abs(predicted - 1.6) < 0.05
+  assert surrogate.validation["target"]["n"] == 8
+  assert surrogate.outside(SimulationConfig(alpha=0.3)) == []
+  assert surrogate.outside(SimulationConfig(alpha=0.9))
+  assert surrogate.outside(SimulationConfig(alpha=0.3, n_sim=10))
+  path = str(tmp_path / "surrogate.npz")
+  surrogate.save(path)
+  assert Surrogate.load(path).predict([SimulationConfig(alpha=0.3)]).equals(surrogate.predict([SimulationConfig(alpha=0.3)]))
+
+
+def test_too_few_runs_to_hold_out_are_flagged():
+  with pytest.warns(UserWarning):
+    surrogate = fit(rows(4), ("sweep", None), epochs=10)
+  assert surrogate.validation["target"]["n"] == 0 and np.isnan(surrogate.validation["target"]["rmse"])
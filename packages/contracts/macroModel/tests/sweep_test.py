@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from macroModel import SimulationConfig
+from macroModel.sweep import ResultCache, config_key, grid, parse_value, run_sweep
+
+
+def test_grid():
+  assert grid(a=[1, 2], b=["x"]) == [{"a": 1, "b": "x"}, {"a": 2, "b": "x"}]
+
+
+def test_parse_value():
+  config = SimulationConfig()
+  assert parse_value(config, "n_sim", "5") == 5
+  assert parse_value(config, "alpha", "0.5") == 0.5
+  assert parse_value(config, "redistribution", "False") is False
+  assert parse_value(config, "redistribution", "TRUE") is True
+  assert parse_value(config, "fee_policy", "base_rate") == "base_rate"
+  with pytest.raises(ValueError):
+    parse_value(config, "redistribution", "0")
+
+
+def test_config_key_follows_referenced_files(tmp_path):
+  path = tmp_path / "scenario.json"
+  path.write_text('{"regimes": [{}]}')
+  config = SimulationConfig(price_scenario=str(path))
+  key = config_key(config)
+  assert config_key(SimulationConfig(price_scenario=str(path))) == key
+  path.write_text('{"regimes": [{"drift": 0.001}]}')
+  os.utime(path, ns=(0, 10**9))
+  assert config_key(config) != key
+  assert config_key(SimulationConfig(seed=1)) != config_key(SimulationConfig())
+
+
+def test_sweep_caches_its_points(tmp_path):
+  cache_dir = str(tmp_path)
+  points = grid(alpha=[0.1, 0.3])
+  base = SimulationConfig(n_sim=300)
+  first = run_sweep(points, base, workers=1, cache_dir=cache_dir)
+  assert not first["cached"].any()
+  second = run_sweep(points + [{"alpha": 0.5}], base, workers=2, cache_dir=cache_dir)
+  assert list(second["cached"]) == [True, True, False]
+  assert second["price_LUSD_final"][:2].equals(first["price_LUSD_final"])
+  series = ResultCache(cache_dir).series(first["key"][0])
+  assert len(series["Price_LUSD"]) == first["steps"][0]
+  assert np.isclose(series["Price_LUSD"][-1], first["price_LUSD_final"][0])
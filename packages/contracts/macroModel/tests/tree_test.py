@@ -0,0 +1,65 @@
+import numpy as np
+
+from macroModel import SimulationConfig, Simulation
+from macroModel.macro_model import splice_paths, exogenous_paths, month, day
+from macroModel.tree import Split, run_tree
+
+
+def run_to(config, index):
+  sim = Simulation(config)
+  while sim.index < index and not sim.done:
+    sim.step()
+  return sim
+
+
+def test_branch_path_differs_from_parent_after_branch_point():
+  sim = run_to(SimulationConfig(seed=0, n_sim=1500), 1000)
+  child = sim.branch(price_scenario="crash_recovery")
+  assert np.array_equal(child.price_ether[:1001], sim.price_ether[:1001])
+  assert (child.price_ether[1001:1500] != sim.price_ether[1001:1500]).all()
+  child.run()
+  sim.run()
+  parent, branched = sim.result().data, child.result().data
+  assert parent[:1001].equals(branched[:1001])
+  assert not np.allclose(parent["Price_Ether"][1001:], branched["Price_Ether"][1001:])
+
+
+def test_splice_starts_new_paths_at_the_branch_step():
+  parent = exogenous_paths(SimulationConfig(seed=0))
+  new = exogenous_paths(SimulationConfig(seed=0, price_scenario="crash_recovery"))
+  spliced = splice_paths(parent, new, 1000)
+  price = spliced["price_ether"]
+  assert np.array_equal(price[:1001], parent["price_ether"][:1001])
+  #step 0 of the scenario is the branch step, rescaled to the parent's price
+  assert np.allclose(price[1000:1000+3*month] / price[1000], new["price_ether"][:3*month] / new["price_ether"][0])
+  crash = price[1000+3*month+day] / price[1000+3*month]
+  assert abs(crash - 0.5) < 0.05
+  #shocks are re-based too, the LQTY bootstrap month follows the age of the system
+  assert np.array_equal(spliced["shock_return"][1001:2000], new["shock_return"][1:1000])
+  assert np.array_equal(spliced["price_LQTY"], parent["price_LQTY"])
+
+
+def test_branch_without_overrides_continues_like_the_parent():
+  config = SimulationConfig(seed=0, n_sim=800)
+  sim = run_to(config, 400)
+  child = sim.branch()
+  child.run()
+  sim.run()
+  assert sim.result().data.equals(child.result().data)
+
+
+def test_adaptive_branch_without_overrides_continues_like_the_parent():
+  config = SimulationConfig(seed=0, n_sim=800, initial_troves=1000, time_step="adaptive")
+  sim = run_to(config, 400)
+  child = sim.branch()
+  child.run()
+  sim.run()
+  assert sim.result().data.equals(child.result().data)
+
+
+def test_tree_leaves_share_the_prefix():
+  tree = run_tree(SimulationConfig(seed=0, n_sim=600), Split(300, {"calm": {}, "crash": {"price_scenario": "crash_recovery"}}),
+                  workers=1)
+  prices = tree.compare("Price_Ether")
+  assert list(prices.columns) == ["root/calm", "root/crash"]
+  assert np.array_equal(prices["root/calm"][:301], prices["root/crash"][:301])
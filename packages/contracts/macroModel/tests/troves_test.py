@@ -0,0 +1,129 @@
+import numpy as np
+
+from macroModel.troves import SortedTroves, TroveStore
+
+
+def store_with(n, rng, supply=(1000, 5000)):
+  store = TroveStore(capacity=16)
+  ether = rng.uniform(1, 10, n)
+  supply = rng.uniform(*supply, n)
+  store.extend(Ether_Quantity=ether, Supply=supply, CR_initial=np.full(n, 2.0),
+               Rational_inattention=np.full(n, 0.1), CR_current=np.full(n, 2.0))
+  return store
+
+
+def check_index(store):
+  #the index holds every live trove once, in the order of its sort key
+  ids = store.sorted.ids
+  assert sorted(ids) == sorted(store["id"])
+  assert np.all(np.diff(store.sorted.nicr) >= 0)
+  assert np.array_equal(store.sorted.nicr, store.columns["key"][store.position[ids]])
+
+
+def test_store_grows_and_keeps_totals():
+  rng = np.random.default_rng(0)
+  store = store_with(100, rng)
+  assert len(store) == 100 and store.capacity == 128
+  store.append(Ether_Quantity=2.0, Supply=1500.0, CR_initial=2.0, Rational_inattention=0.1, CR_current=2.0)
+  assert store["Supply"][100] == 1500.0
+  assert np.isclose(store.total_supply, store["Supply"].sum())
+  assert np.isclose(store.total_ether, store["Ether_Quantity"].sum())
+
+
+def test_remove_moves_the_last_troves_into_the_freed_slots():
+  rng = np.random.default_rng(1)
+  store = store_with(10, rng)
+  frame = store.to_frame()
+  store.remove([2, 9, 5])
+  assert len(store) == 7
+  kept = frame.drop(index=[2, 9, 5])
+  assert sorted(store["Supply"]) == sorted(kept["Supply"])
+  assert store["Supply"][2] == frame["Supply"][7] and store["Supply"][5] == frame["Supply"][8]
+  assert np.isclose(store.total_supply, kept["Supply"].sum())
+  store.remove(np.arange(7))
+  assert len(store) == 0 and store.total_supply == 0.0
+
+
+def test_update_CR():
+  rng = np.random.default_rng(2)
+  store = store_with(20, rng)
+  CR = store.update_CR(1500.0)
+  assert np.allclose(CR, 1500.0 * store["Ether_Quantity"] / store["Supply"])
+
+
+def test_sorted_troves_merges_queued_changes():
+  index = SortedTroves()
+  index.insert(np.arange(5), np.array([5.0, 1.0, 3.0, 2.0, 4.0]))
+  index.remove(2, 3.0)
+  index.insert(2, 0.5)
+  index.remove(2, 0.5)
+  index.insert(2, 6.0)
+  index.insert(7, 1.0)
+  index.remove(7, 1.0)
+  assert list(index.ids) == [1, 3, 4, 0, 2]
+  assert list(index.nicr) == [1.0, 2.0, 4.0, 5.0, 6.0]
+  assert list(index.below(4.0)) == [1, 3]
+
+
+def test_sorted_troves_tells_equal_nicrs_apart_by_id():
+  index = SortedTroves()
+  index.insert(np.arange(5), np.array([5.0, 1.0, 2.0, 2.0, 4.0]))
+  index.remove(3, 2.0)
+  assert list(index.ids) == [1, 2, 4, 0]
+  assert list(index.below(4.0)) == [1, 2]
+
+
+def test_index_follows_adjustments_and_removals():
+  rng = np.random.default_rng(0)
+  store = store_with(200, rng)
+  for _ in range(20):
+    i = rng.choice(len(store), 10, replace=False)
+    store.set_supply(i, store["Supply"][i] * rng.uniform(0.5, 1.5, 10))
+    store.set_ether(i, store["Ether_Quantity"][i] * rng.uniform(0.5, 1.5, 10))
+    store.remove(rng.choice(len(store), 3, replace=False))
+    store.append(Ether_Quantity=2.0, Supply=1500.0, CR_initial=2.0, Rational_inattention=0.1, CR_current=2.0)
+    check_index(store)
+  assert abs(store.total_supply - store["Supply"].sum()) < 1e-6 * store.total_supply
+
+
+def brute_force_liquidatable(store, price, MCR=1.1):
+  ether, supply = store.entire(slice(0, len(store)))
+  return np.flatnonzero(price * ether / supply < MCR)
+
+
+def test_liquidatable_matches_brute_force():
+  rng = np.random.default_rng(2)
+  store = store_with(500, rng)
+  for price in (300.0, 600.0, 700.0, 900.0, 2000.0):
+    assert sorted(store.liquidatable(price)) == list(brute_force_liquidatable(store, price))
+
+
+def test_liquidatable_matches_brute_force_after_redistributions():
+  rng = np.random.default_rng(3)
+  store = store_with(500, rng, supply=(100, 1000))
+  for _ in range(30):
+    price = rng.uniform(200, 300)
+    liquidated = store.liquidatable(price)
+    assert sorted(liquidated) == list(brute_force_liquidatable(store, price))
+    if len(liquidated):
+      ether, supply = store.entire(liquidated)
+      debt, coll = float(supply.sum()), float(ether.sum())
+      store.remove(liquidated)
+      store.redistribute(debt, coll)
+    i = rng.choice(len(store), 5, replace=False)
+    store.set_supply(i, store.entire(i)[1] * 0.9)
+    check_index(store)
+  assert store.redistributions > 0
+  ether, supply = store.entire(slice(0, len(store)))
+  assert np.isclose(store.total_supply, supply.sum()) and np.isclose(store.total_ether, ether.sum())
+
+
+def test_state_round_trip():
+  rng = np.random.default_rng(4)
+  store = store_with(50, rng)
+  store.remove([3, 7])
+  store.redistribute(1000.0, 1.0)
+  copy = TroveStore.from_state(store.state())
+  assert copy.to_frame().equals(store.to_frame())
+  assert np.array_equal(copy.sorted.ids, store.sorted.ids)
+  assert sorted(copy.liquidatable(800.0)) == sorted(store.liquidatable(800.0))
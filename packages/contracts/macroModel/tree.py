@@ -0,0 +1,132 @@
+"""Scenario trees
+
+Runs what-if questions of the form "same first six months, then ..." without
+recomputing the common prefix. A Split runs its simulation to step `at` once
+and continues one child per variant from that state (see Simulation.branch).
+A variant is a dict of SimulationConfig overrides, optionally with a "policy"
+FeePolicy, or a further Split whose own overrides apply from its branch point.
+
+    tree = run_tree(SimulationConfig(), Split(6*month, {
+      "calm": {},
+      "crash": {"price_scenario": "crash_recovery"},
+      "base_rate": {"fee_policy": "base_rate"},
+      "crash_then_fee": Split(7*month, {"fixed": {}, "base_rate": {"fee_policy": "base_rate"}},
+                              price_scenario="crash_recovery"),
+    }), workers=4)
+    tree.compare("Price_LUSD")  # one column per leaf
+    tree.summary()              # one row per leaf
+
+The paths of a variant start at its split, so "crash" above crashes as far
+after month six as crash_recovery crashes after step 0. With several workers
+the children of the root run in processes forked once the prefix is done, so
+they share its state copy-on-write and only the pages a child changes get
+copied. Without fork, or with workers=1, every child is a full deep copy of
+the state at the split made in this process; only the exogenous paths, the
+random streams and the policy are shared.
+"""
+
+import multiprocessing
+from multiprocessing import get_context
+
+from .macro_model import SimulationConfig, Simulation, exogenous_paths
+
+#the simulation at the root split, inherited by forked workers
+_parent = None
+
+
+class Split:
+  def __init__(self, at, variants, policy=None, **overrides):
+    self.at = at
+    self.variants = variants
+    self.policy = policy
+    self.overrides = overrides
+
+
+def branch_args(variant):
+  #(policy, overrides) of a dict or Split variant
+  if isinstance(variant, Split):
+    return variant.policy, variant.overrides
+  overrides = dict(variant)
+  return overrides.pop("policy", None), overrides
+
+
+class TreeNode:
+  def __init__(self, name, start, result, children=None):
+    #name is the path from the root, e.g. "root/crash/base_rate"
+    self.name = name
+    #step at which this node branched off its parent
+    self.start = start
+    #the run of a leaf, or the state of an inner node at its split
+    self.result = result
+    self.children = children or {}
+
+  def leaves(self):
+    if not self.children:
+      return [self]
+    return [leaf for child in self.children.values() for leaf in child.leaves()]
+
+  def __getitem__(self, path):
+    #node by its path relative to this one, e.g. tree["crash_then_fee/fixed"]
+    node = self
+    for name in path.split("/"):
+      node = node.children[name]
+    return node
+
+  def compare(self, column):
+    #one column per leaf, over the whole run from step 0
+    import pandas as pd
+    return pd.DataFrame({leaf.name: leaf.result.data[column] for leaf in self.leaves()})
+
+  def summary(self):
+    import pandas as pd
+    from .sweep import summarize
+    rows = {leaf.name: {"start": leaf.start, **summarize({name: column.to_numpy() for name, column in leaf.result.data.items()})}
+            for leaf in self.leaves()}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def run_node(sim, name, spec, start):
+  #run sim to the end, or to its split and then each of the variants
+  if not isinstance(spec, Split):
+    while not sim.done:
+      sim.step()
+    return TreeNode(name, start, sim.result())
+  while not sim.done and sim.index < spec.at:
+    sim.step()
+  children = {}
+  for variant_name, variant in spec.variants.items():
+    policy, overrides = branch_args(variant)
+    children[variant_name] = run_node(sim.branch(policy, **overrides), f"{name}/{variant_name}", variant, sim.index)
+  return TreeNode(name, start, sim.result(), children)
+
+
+def run_forked(args):
+  #one variant of the root split, in a worker forked after the prefix
+  name, variant = args
+  policy, overrides = branch_args(variant)
+  return run_node(_parent.branch(policy, copy=False, **overrides), name, variant, _parent.index)
+
+
+def run_tree(config=None, split=None, paths=None, policy=None, workers=None):
+  #returns the root TreeNode
+  global _parent
+  if config is None:
+    config = SimulationConfig()
+  if paths is None:
+    paths = exogenous_paths(config)
+  sim = Simulation(config, paths, policy)
+  if workers == 1 or "fork" not in multiprocessing.get_all_start_methods() or not isinstance(split, Split):
+    return run_node(sim, "root", split, 0)
+
+  while not sim.done and sim.index < split.at:
+    sim.step()
+  names = list(split.variants)
+  tasks = [(f"root/{name}", split.variants[name]) for name in names]
+  _parent = sim
+  try:
+    #a fresh fork for every variant, so each starts from the untouched prefix
+    with get_context("fork").Pool(workers, maxtasksperchild=1) as pool:
+      children = pool.map(run_forked, tasks, chunksize=1)
+  finally:
+    _parent = None
+  return TreeNode("root", 0, sim.result(), dict(zip(names, children)))
@@ -0,0 +1,460 @@
+"""Trove store
+
+Columnar storage for the trove pool of the macro model. Each field lives in
+its own contiguous NumPy array, capacity doubles when the store fills up and
+troves are deleted by moving the last trove into the freed slot, so opening
+and closing a trove is O(1) amortized. The store also keeps running totals
+of debt (Supply) and collateral (Ether_Quantity).
+
+Every trove gets a stable id and is kept in a SortedTroves index ordered by
+its nominal ICR (NICR = Ether_Quantity / Supply), like the SortedTroves
+contract. All troves share the same ether price, so this is also the order
+by collateral ratio and it does not change when the price moves. Changes to
+the index are queued and merged in a single pass, which the phases of the
+model run before they return, so the troves a phase opens, adjusts or closes
+cost one copy of the index rather than a few per trove.
+
+Debt and collateral that a liquidation leaves uncovered are redistributed
+to all troves in proportion to their collateral the way TroveManager does
+it, through two accumulators and a snapshot of them per trove: L_ETH, the
+factor by which a unit of collateral has grown through redistributions, and
+L_LUSDDebt, the debt gained per unit of collateral scaled by L_ETH. A
+redistribution is O(1); the pending rewards of a trove are only applied
+when it is touched, and entire() reads them without applying. Collateral
+and debt grow in the same proportion for every trove, so the sorted index
+keeps a key per trove that redistributions leave valid: it equals the NICR
+as long as nothing has been redistributed.
+
+BandWatch narrows the per-step rational inattention check of adjust_troves
+to the troves whose band ends near the current ether price, and
+quiet_prices bounds the ether prices at which no trove is liquidated or
+adjusted at all.
+"""
+
+import numpy as np
+
+fields = ("Ether_Quantity", "Supply", "CR_initial", "Rational_inattention", "CR_current")
+
+
+class SortedTroves:
+  #trove ids in ascending NICR order, the riskiest trove first. Insertions and removals are queued and merged
+  #into the arrays in one pass by merge(), or when they are next read, so k changes cost one O(n + k log k) merge
+  def __init__(self):
+    self._nicr = np.empty(0)
+    self._ids = np.empty(0, dtype=np.int64)
+    #(ids, keys, inserted) batches in the order they were made
+    self.queue = []
+
+  def __len__(self):
+    return len(self.ids)
+
+  @property
+  def nicr(self):
+    self.merge()
+    return self._nicr
+
+  @nicr.setter
+  def nicr(self, value):
+    self.merge()
+    self._nicr = value
+
+  @property
+  def ids(self):
+    self.merge()
+    return self._ids
+
+  @ids.setter
+  def ids(self, value):
+    self.merge()
+    self._ids = value
+
+  def insert(self, ids, nicr):
+    self.queue.append((np.atleast_1d(ids), np.atleast_1d(nicr), True))
+
+  def remove(self, ids, nicr):
+    self.queue.append((np.atleast_1d(ids), np.atleast_1d(nicr), False))
+
+  def merge(self):
+    if not self.queue:
+      return
+    ids = np.concatenate([batch[0] for batch in self.queue])
+    keys = np.concatenate([batch[1] for batch in self.queue]).astype(np.float64)
+    inserted = np.concatenate([np.full(len(batch[0]), batch[2]) for batch in self.queue])
+    self.queue = []
+    #the changes of an id alternate between removal and insertion: only a removal that comes first applies
+    #to the arrays and only an insertion that comes last survives the batch
+    order = np.argsort(ids, kind='stable')
+    ids, keys, inserted = ids[order], keys[order], inserted[order]
+    first = np.ones(len(ids), dtype=bool)
+    first[1:] = ids[1:] != ids[:-1]
+    last = np.ones(len(ids), dtype=bool)
+    last[:-1] = first[1:]
+    removed = first & ~inserted
+    if removed.any():
+      gone, gone_keys = ids[removed], keys[removed]
+      lo = np.searchsorted(self._nicr, gone_keys, side='left')
+      hi = np.searchsorted(self._nicr, gone_keys, side='right')
+      at = lo.copy()
+      #equal NICRs are told apart by id
+      for j in np.flatnonzero(hi - lo > 1):
+        at[j] = lo[j] + np.flatnonzero(self._ids[lo[j]:hi[j]] == gone[j])[0]
+      keep = np.ones(len(self._ids), dtype=bool)
+      keep[at] = False
+      self._nicr = self._nicr[keep]
+      self._ids = self._ids[keep]
+    added = last & inserted
+    if added.any():
+      new, new_keys = ids[added], keys[added]
+      order = np.argsort(new_keys, kind='stable')
+      new, new_keys = new[order], new_keys[order]
+      at = np.searchsorted(self._nicr, new_keys, side='right')
+      self._nicr = np.insert(self._nicr, at, new_keys)
+      self._ids = np.insert(self._ids, at, new)
+
+  def below(self, nicr):
+    #ids of all troves with a NICR strictly below the given one
+    return self.ids[:np.searchsorted(self.nicr, nicr, side='left')]
+
+
+class TroveStore:
+  def __init__(self, capacity=1024):
+    self.capacity = max(1, int(capacity))
+    self.n = 0
+    #NICR and the accumulator snapshots as of the last time a trove was touched, and its sort key
+    self.columns = {name: np.empty(self.capacity) for name in fields + ("NICR", "snapshot_ETH", "snapshot_LUSDDebt", "key")}
+    self.columns["id"] = np.empty(self.capacity, dtype=np.int64)
+    self.next_id = 0
+    #position in the store of each trove id ever issued, -1 once removed
+    self.position = np.full(self.capacity, -1, dtype=np.int64)
+    self.sorted = SortedTroves()
+    self.total_supply = 0.0
+    self.total_ether = 0.0
+    #trove rows written or removed so far, read by the phase profiler
+    self.touched = 0
+    #ids whose NICR was set since the last take_recent(), drained every step by the BandWatch of a simulation
+    self.recent = []
+    #redistribution accumulators, the L_LUSDDebt that sort keys are relative to, and the count so far
+    self.L_ETH = 1.0
+    self.L_LUSDDebt = 0.0
+    self.key_base = 0.0
+    self.redistributions = 0
+    self.redistributed_debt = 0.0
+
+  def __len__(self):
+    return self.n
+
+  def __getitem__(self, name):
+    #view on the live part of a column
+    return self.columns[name][:self.n]
+
+  @property
+  def shape(self):
+    return (self.n, len(fields))
+
+  def _reserve(self, n_new):
+    if n_new > self.capacity:
+      capacity = self.capacity
+      while capacity < n_new:
+        capacity *= 2
+      for name, old in self.columns.items():
+        column = np.empty(capacity, dtype=old.dtype)
+        column[:self.n] = old[:self.n]
+        self.columns[name] = column
+      self.capacity = capacity
+    n_ids = self.next_id + n_new - self.n
+    if n_ids > len(self.position):
+      position = np.full(max(n_ids, 2*len(self.position)), -1, dtype=np.int64)
+      position[:len(self.position)] = self.position
+      self.position = position
+
+  def _key(self, nicr):
+    #sort key of troves with this NICR and snapshots taken now: 1/(G0/NICR - H0 + key_base) for snapshots (G0, H0),
+    #which redistributions do not change. Keys stay positive by moving key_base up when they would not
+    denominator = self.L_ETH + nicr*(self.key_base - self.L_LUSDDebt)
+    if np.any(denominator <= 0):
+      self._rebase()
+      denominator = self.L_ETH + nicr*(self.key_base - self.L_LUSDDebt)
+    return nicr / denominator
+
+  def _rebase(self):
+    #O(n) and rare: only after redistributions of the order of the debt per unit of collateral of a trove
+    n = self.n
+    self.key_base = self.L_LUSDDebt
+    nicr = self.columns["NICR"][:n]
+    self.columns["key"][:n] = nicr / (self.columns["snapshot_ETH"][:n] + nicr*(self.key_base - self.columns["snapshot_LUSDDebt"][:n]))
+    keys = self.columns["key"][self.position[self.sorted.ids]]
+    order = np.argsort(keys, kind='stable')
+    self.sorted.nicr = keys[order]
+    self.sorted.ids = self.sorted.ids[order]
+
+  def append(self, Ether_Quantity, Supply, CR_initial, Rational_inattention, CR_current):
+    self._reserve(self.n + 1)
+    i = self.n
+    trove_id = self.next_id
+    nicr = Ether_Quantity / Supply
+    key = self._key(nicr)
+    self.columns["Ether_Quantity"][i] = Ether_Quantity
+    self.columns["Supply"][i] = Supply
+    self.columns["CR_initial"][i] = CR_initial
+    self.columns["Rational_inattention"][i] = Rational_inattention
+    self.columns["CR_current"][i] = CR_current
+    self.columns["NICR"][i] = nicr
+    self.columns["snapshot_ETH"][i] = self.L_ETH
+    self.columns["snapshot_LUSDDebt"][i] = self.L_LUSDDebt
+    self.columns["key"][i] = key
+    self.columns["id"][i] = trove_id
+    self.position[trove_id] = i
+    self.sorted.insert(trove_id, key)
+    self.recent.append(np.atleast_1d(trove_id))
+    self.next_id = trove_id + 1
+    self.n = i + 1
+    self.total_supply += Supply
+    self.total_ether += Ether_Quantity
+    self.touched += 1
+    return i
+
+  def extend(self, Ether_Quantity, Supply, CR_initial, Rational_inattention, CR_current):
+    values = {"Ether_Quantity": Ether_Quantity, "Supply": Supply, "CR_initial": CR_initial,
+              "Rational_inattention": Rational_inattention, "CR_current": CR_current}
+    k = len(Supply)
+    self._reserve(self.n + k)
+    new = slice(self.n, self.n + k)
+    for name in fields:
+      self.columns[name][new] = values[name]
+    ids = np.arange(self.next_id, self.next_id + k)
+    nicr = np.asarray(Ether_Quantity) / np.asarray(Supply)
+    key = self._key(nicr)
+    self.columns["NICR"][new] = nicr
+    self.columns["snapshot_ETH"][new] = self.L_ETH
+    self.columns["snapshot_LUSDDebt"][new] = self.L_LUSDDebt
+    self.columns["key"][new] = key
+    self.columns["id"][new] = ids
+    self.position[ids] = np.arange(self.n, self.n + k)
+    self.sorted.insert(ids, key)
+    self.recent.append(ids)
+    self.next_id += k
+    self.n += k
+    self.total_supply += float(np.sum(Supply))
+    self.total_ether += float(np.sum(Ether_Quantity))
+    self.touched += k
+
+  def _reindex(self, i):
+    ids = self.columns["id"][i]
+    self.sorted.remove(ids, self.columns["key"][i])
+    nicr = self.columns["Ether_Quantity"][i] / self.columns["Supply"][i]
+    key = self._key(nicr)
+    self.columns["NICR"][i] = nicr
+    self.columns["key"][i] = key
+    self.sorted.insert(ids, key)
+    self.recent.append(np.atleast_1d(ids))
+
+  #i may be a single position or an array of positions with matching values; pending rewards are applied first
+  def set_supply(self, i, value):
+    self.apply_pending(i)
+    column = self.columns["Supply"]
+    self.total_supply += float(np.sum(value - column[i]))
+    column[i] = value
+    self._reindex(i)
+    self.touched += np.size(i)
+
+  def set_ether(self, i, value):
+    self.apply_pending(i)
+    column = self.columns["Ether_Quantity"]
+    self.total_ether += float(np.sum(value - column[i]))
+    column[i] = value
+    self._reindex(i)
+    self.touched += np.size(i)
+
+  def remove(self, indices):
+    #swap-remove, highest position first so that the trove moved into a freed slot is never one still to be removed
+    indices = np.unique(np.asarray(indices, dtype=np.int64))[::-1]
+    if len(indices) == 0:
+      return
+    self.touched += len(indices)
+    ether, supply = self.entire(indices)
+    self.total_supply -= float(supply.sum())
+    self.total_ether -= float(ether.sum())
+    ids = self.columns["id"][indices]
+    self.sorted.remove(ids, self.columns["key"][indices])
+    self.position[ids] = -1
+    for i in indices:
+      last = self.n - 1
+      if i != last:
+        for column in self.columns.values():
+          column[i] = column[last]
+        self.position[self.columns["id"][i]] = i
+      self.n = last
+    if self.n == 0:
+      self.total_supply = 0.0
+      self.total_ether = 0.0
+
+  def entire(self, i):
+    #collateral and debt of the troves at positions i with their pending rewards
+    ether = self["Ether_Quantity"][i]
+    supply = self["Supply"][i]
+    if not self.redistributions:
+      return ether, supply
+    snapshot = self["snapshot_ETH"][i]
+    return ether*self.L_ETH/snapshot, supply + ether*(self.L_LUSDDebt - self["snapshot_LUSDDebt"][i])/snapshot
+
+  def entire_nicr(self, i):
+    nicr = self["NICR"][i]
+    if not self.redistributions:
+      return nicr
+    return nicr*self.L_ETH/(self["snapshot_ETH"][i] + nicr*(self.L_LUSDDebt - self["snapshot_LUSDDebt"][i]))
+
+  def apply_pending(self, i):
+    #move the pending rewards of the troves at positions i into their columns; the totals already hold them
+    #and the NICR they are sorted by does not change
+    if not self.redistributions:
+      return
+    ether, supply = self.entire(i)
+    self["Ether_Quantity"][i] = ether
+    self["Supply"][i] = supply
+    self["NICR"][i] = ether / supply
+    self["snapshot_ETH"][i] = self.L_ETH
+    self["snapshot_LUSDDebt"][i] = self.L_LUSDDebt
+
+  def redistribute(self, debt, ether):
+    #share debt and collateral out over all troves in proportion to their collateral, pending until each is touched
+    if self.n == 0 or self.total_ether <= 0:
+      return False
+    self.L_LUSDDebt += self.L_ETH * debt / self.total_ether
+    self.L_ETH *= 1 + ether / self.total_ether
+    self.total_supply += debt
+    self.total_ether += ether
+    self.redistributions += 1
+    self.redistributed_debt += debt
+    return True
+
+  def take_recent(self):
+    recent = np.concatenate(self.recent) if self.recent else np.empty(0, dtype=np.int64)
+    self.recent = []
+    return recent
+
+  def riskiest(self):
+    #trove ids from the lowest collateral ratio upwards, map them with position
+    return self.sorted.ids
+
+  def liquidatable(self, price_ether_current, MCR=1.1):
+    #positions of the troves whose collateral ratio, with pending rewards, is below MCR
+    nicr = MCR / price_ether_current
+    if not self.redistributions:
+      return self.position[self.sorted.below(nicr)]
+    #the same bound on the sort key
+    denominator = self.L_ETH + nicr*(self.key_base - self.L_LUSDDebt)
+    if denominator <= 0:
+      return self.position[self.sorted.ids]
+    return self.position[self.sorted.below(nicr / denominator)]
+
+  def update_CR(self, price_ether_current):
+    n = self.n
+    self.touched += n
+    np.multiply(price_ether_current, self.entire_nicr(slice(0, n)), out=self.columns["CR_current"][:n])
+    return self.columns["CR_current"][:n]
+
+  def to_frame(self):
+    import pandas as pd
+    frame = {name: self[name].copy() for name in fields}
+    ether, supply = self.entire(slice(0, self.n))
+    frame["Ether_Quantity"], frame["Supply"] = np.array(ether), np.array(supply)
+    return pd.DataFrame(frame)
+
+  def state(self):
+    #arrays and totals that restore the store exactly, including the index order and the running totals
+    arrays = {name: self[name].copy() for name in self.columns}
+    arrays["position"] = self.position[:self.next_id].copy()
+    arrays["sorted_nicr"] = self.sorted.nicr.copy()
+    arrays["sorted_ids"] = self.sorted.ids.copy()
+    arrays["totals"] = np.array([self.total_supply, self.total_ether])
+    arrays["redistribution"] = np.array([self.L_ETH, self.L_LUSDDebt, self.key_base, self.redistributions, self.redistributed_debt])
+    return arrays
+
+  @classmethod
+  def from_state(cls, arrays):
+    n = len(arrays["id"])
+    store = cls(capacity=max(n, 1024))
+    #checkpoints from before redistribution have no snapshots, and their sort key is the NICR
+    defaults = {"snapshot_ETH": 1.0, "snapshot_LUSDDebt": 0.0, "key": arrays["NICR"]}
+    for name, column in store.columns.items():
+      column[:n] = arrays[name] if name in arrays else defaults[name]
+    store.n = n
+    store.next_id = len(arrays["position"])
+    store.position = np.full(max(store.next_id, store.capacity), -1, dtype=np.int64)
+    store.position[:store.next_id] = arrays["position"]
+    store.sorted.nicr = np.array(arrays["sorted_nicr"], dtype=np.float64)
+    store.sorted.ids = np.array(arrays["sorted_ids"], dtype=np.int64)
+    store.total_supply, store.total_ether = (float(x) for x in arrays["totals"])
+    if "redistribution" in arrays:
+      store.L_ETH, store.L_LUSDDebt, store.key_base, redistributions, store.redistributed_debt = (float(x) for x in arrays["redistribution"])
+      store.redistributions = int(redistributions)
+    return store
+
+
+def quiet_prices(store, positions=slice(None), MCR=1.1):
+  #(floor, low, high) for the troves at positions: none of them is below the MCR while the ether price is
+  #above floor, and none is outside its rational inattention band while it is strictly between low and high
+  nicr = store.entire_nicr(positions)
+  if not len(nicr):
+    return 0.0, 0.0, np.inf
+  CR_initial = store["CR_initial"][positions]
+  tau = store["Rational_inattention"][positions]
+  return float(MCR / nicr.min()), float((CR_initial*(1 - tau)/nicr).max()), float((CR_initial*(1 + 2*tau)/nicr).min())
+
+
+class BandWatch:
+  #A trove is adjusted when the ether price leaves its rational inattention band, i.e. falls below
+  #CR_initial*(1-tau)/NICR or rises above CR_initial*(1+2*tau)/NICR. The watch keeps a price window
+  #[low, high] around a reference price and the ids of the troves with a band end inside it (plus every
+  #trove whose NICR changed since); the others cannot leave their band while the price stays in the
+  #window. Only when the price leaves the window is the whole store scanned again, so calm periods
+  #check a small fraction of the troves and a crash degrades to a full scan per step.
+  margin = 1e-9
+
+  def __init__(self, width):
+    #relative half-width of the window, e.g. a few standard deviations of the hourly price move
+    self.width = width
+    self.low = np.inf
+    self.high = -np.inf
+    self.ids = np.empty(0, dtype=np.int64)
+    #membership by trove id
+    self.watched = np.zeros(0, dtype=bool)
+    self.rebuilds = 0
+    #a redistribution moves the NICR of every trove, so the watch is rebuilt after one
+    self.redistributions = 0
+
+  def outside(self, store, positions):
+    #troves that may leave their band at some price inside the window
+    CR_initial = store["CR_initial"][positions]
+    tau = store["Rational_inattention"][positions]
+    nicr = store.entire_nicr(positions)
+    lower = CR_initial*(1 - tau)/nicr
+    upper = CR_initial*(1 + 2*tau)/nicr
+    return (lower >= self.low*(1 - self.margin)) | (upper <= self.high*(1 + self.margin))
+
+  def candidates(self, store, price):
+    #positions, ascending, of every trove that can be out of band at this price
+    recent = store.take_recent()
+    if len(self.watched) < store.next_id:
+      watched = np.zeros(max(store.next_id, 2*len(self.watched)), dtype=bool)
+      watched[:len(self.watched)] = self.watched
+      self.watched = watched
+    if not self.low <= price <= self.high or self.redistributions != store.redistributions:
+      self.redistributions = store.redistributions
+      self.low, self.high = price/(1 + self.width), price*(1 + self.width)
+      self.watched[self.ids] = False
+      self.ids = store["id"][self.outside(store, slice(None))]
+      self.watched[self.ids] = True
+      self.rebuilds += 1
+    elif len(recent):
+      recent = np.unique(recent[~self.watched[recent] & (store.position[recent] >= 0)])
+      recent = recent[self.outside(store, store.position[recent])]
+      self.watched[recent] = True
+      self.ids = np.concatenate((self.ids, recent))
+    positions = store.position[self.ids]
+    alive = positions >= 0
+    if not alive.all():
+      self.watched[self.ids[~alive]] = False
+      self.ids = self.ids[alive]
+      positions = positions[alive]
+    return np.sort(positions)
@@ -1,4 +1,5 @@
 from brownie import *
+import os
 import random
 import numpy as np
 from bisect import bisect_left
@@ -299,34 +300,60 @@ Ether Price
 """
 
 #ether price
-for i in range(1, period1):
-    random.seed(2019375+10000*i)
-    shock_ether = random.normalvariate(0, sd_ether)
-    price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether1))
-print(" - ETH period 1 -")
-print(f"Min ETH price: {min(price_ether[1:period1])}")
-print(f"Max ETH price: {max(price_ether[1:period1])}")
-for i in range(period1, period2):
-    random.seed(2019375+10000*i)
-    shock_ether = random.normalvariate(0, sd_ether)
-    price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether2))
-print(" - ETH period 2 -")
-print(f"Min ETH price: {min(price_ether[period1:period2])}")
-print(f"Max ETH price: {max(price_ether[period1:period2])}")
-for i in range(period2, period3):
-    random.seed(2019375+10000*i)
-    shock_ether = random.normalvariate(0, sd_ether)
-    price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether3))
-print(" - ETH period 3 -")
-print(f"Min ETH price: {min(price_ether[period2:period3])}")
-print(f"Max ETH price: {max(price_ether[period2:period3])}")
-for i in range(period3, period4):
-    random.seed(2019375+10000*i)
-    shock_ether = random.normalvariate(0, sd_ether)
-    price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether4))
-print(" - ETH period 4 -")
-print(f"Min ETH price: {min(price_ether[period3:period4])}")
-print(f"Max ETH price: {max(price_ether[period3:period4])}")
+#set ETH_PRICE_HISTORY to a file converted with `python -m macroModel history` (and optionally
+#ETH_PRICE_HISTORY_START to a date) to replay recorded prices, or ETH_PRICE_SCENARIO to a scenario name
+#or a .json/.yaml file of macroModel.scenarios, instead of the four stages
+price_history = os.environ.get('ETH_PRICE_HISTORY')
+price_scenario = os.environ.get('ETH_PRICE_SCENARIO')
+if price_history:
+    from macroModel.history import PriceHistory
+    history = PriceHistory(price_history).resample(3600, period, os.environ.get('ETH_PRICE_HISTORY_START') or None)
+    price_ether = [float(price) for price in history]
+    print(f"Replaying {price_history}: min ETH price {min(price_ether)}, max ETH price {max(price_ether)}")
+elif price_scenario:
+    from macroModel.scenarios import load_scenario, price_paths, regime_bounds
+    scenario = load_scenario(price_scenario)
+    #the standard normal shock of every hour keeps the seed of the four stages
+    shocks = []
+    for i in range(1, period):
+        random.seed(2019375+10000*i)
+        shocks.append(random.normalvariate(0, 1))
+    price_ether = [float(price) for price in price_paths(scenario, period, np.random.default_rng(2019375), shocks=shocks,
+                                                         initial=price_ether_initial, sd=sd_ether)]
+    for stage, (start, end) in enumerate(regime_bounds(scenario["regimes"], period), 1):
+        if end > start:
+            print(f" - ETH period {stage} -")
+            print(f"Min ETH price: {min(price_ether[start:end])}")
+            print(f"Max ETH price: {max(price_ether[start:end])}")
+else:
+    for i in range(1, period1):
+        random.seed(2019375+10000*i)
+        shock_ether = random.normalvariate(0, sd_ether)
+        price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether1))
+    print(" - ETH period 1 -")
+    print(f"Min ETH price: {min(price_ether[1:period1])}")
+    print(f"Max ETH price: {max(price_ether[1:period1])}")
+    for i in range(period1, period2):
+        random.seed(2019375+10000*i)
+        shock_ether = random.normalvariate(0, sd_ether)
+        price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether2))
+    print(" - ETH period 2 -")
+    print(f"Min ETH price: {min(price_ether[period1:period2])}")
+    print(f"Max ETH price: {max(price_ether[period1:period2])}")
+    for i in range(period2, period3):
+        random.seed(2019375+10000*i)
+        shock_ether = random.normalvariate(0, sd_ether)
+        price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether3))
+    print(" - ETH period 3 -")
+    print(f"Min ETH price: {min(price_ether[period2:period3])}")
+    print(f"Max ETH price: {max(price_ether[period2:period3])}")
+    for i in range(period3, period4):
+        random.seed(2019375+10000*i)
+        shock_ether = random.normalvariate(0, sd_ether)
+        price_ether.append(price_ether[i-1] * (1 + shock_ether) * (1 + drift_ether4))
+    print(" - ETH period 4 -")
+    print(f"Min ETH price: {min(price_ether[period3:period4])}")
+    print(f"Max ETH price: {max(price_ether[period3:period4])}")
 
 """Natural Rate"""
 
@@ -1,6 +1,7 @@
 import pytest
 
 import csv
+import numpy as np
 
 from brownie import *
 from accounts import *
@@ -10,6 +11,34 @@ from simulation_helpers import *
 class Contracts: pass
 
 
+class CsvSteps:
+    # the csv file of StepSink's rows, for environments without pyarrow
+    def __init__(self, path, schema):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file, delimiter=',')
+        self.writer.writerow(list(schema))
+
+    def write_row(self, row):
+        self.writer.writerow(list(row.values()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def open_steps(schema):
+    # Parquet through macroModel.sink when pyarrow is installed, otherwise tests/simulation.csv as before
+    try:
+        import pyarrow
+        from macroModel.sink import StepSink
+    except ImportError:
+        return CsvSteps('tests/simulation.csv', schema)
+    # one row group per simulated day, readable memory-mapped with macroModel.sink.read_steps
+    return StepSink('tests/simulation.parquet', schema, row_group=24)
+
+
 def setAddresses(contracts):
     contracts.sortedTroves.setParams(
         MAX_BYTES_32,
@@ -215,9 +244,12 @@ def test_run_simulation(add_accounts, contracts, print_expectations):
 
     logGlobalState(contracts)
 
-    with open('tests/simulation.csv', 'w', newline='') as csvfile:
-        datawriter = csv.writer(csvfile, delimiter=',')
-        datawriter.writerow(['iteration', 'ETH_price', 'price_LUSD', 'price_LQTY', 'num_troves', 'total_coll', 'total_debt', 'TCR', 'recovery_mode', 'last_ICR', 'SP_LUSD', 'SP_ETH', 'total_coll_added', 'total_coll_liquidated', 'total_lusd_redempted'])
+    schema = {'iteration': np.int64, 'ETH_price': np.float64, 'price_LUSD': np.float64, 'price_LQTY': np.float64,
+              'num_troves': np.int64, 'total_coll': np.float64, 'total_debt': np.float64, 'TCR': np.float64,
+              'recovery_mode': np.bool_, 'last_ICR': np.float64, 'SP_LUSD': np.float64, 'SP_ETH': np.float64,
+              'total_coll_added': np.float64, 'total_coll_liquidated': np.float64, 'total_lusd_redempted': np.float64}
+
+    with open_steps(schema) as datawriter:
 
         #Simulation Process
         for index in range(1, n_sim):
@@ -269,6 +301,6 @@ def test_run_simulation(add_accounts, contracts, print_expectations):
             print(f'Ratio ETH liquid {100 * total_coll_liquidated / total_coll_added}%')
             print(' ----------------------\n')
 
-            datawriter.writerow([index, ETH_price, price_LUSD, price_LQTY_current, num_troves, total_coll, total_debt, TCR, recovery_mode, last_ICR, SP_LUSD, SP_ETH, total_coll_added, total_coll_liquidated, total_lusd_redempted])
+            datawriter.write_row(dict(zip(schema, [index, ETH_price, price_LUSD, price_LQTY_current, num_troves, total_coll, total_debt, TCR, recovery_mode, last_ICR, SP_LUSD, SP_ETH, total_coll_added, total_coll_liquidated, total_lusd_redempted])))
 
             assert price_LUSD > 0